@@ -0,0 +1,78 @@
+"""
+CACHES configuration from a single CACHE_URL.
+
+    locmem://                  memory of one process (development default)
+    file:///var/tmp/deptapp    files shared by every worker on one box
+    db://cache_table           table in the default database (run createcachetable)
+    redis://host:6379/0        Redis or any Redis-protocol server (requires redis)
+    rediss://host:6380/0       same over TLS
+
+Every tier gets the same KEY_PREFIX, VERSION and default TIMEOUT, so a key and
+its TTL mean the same thing whichever backend is configured.
+
+Only db:// and redis:// are shared between containers and hosts. Processes that
+write cache state for others to read (the job worker and the scheduler bump
+response cache versions and revoke tokens) call require_shared() at startup.
+"""
+from urllib.parse import urlsplit
+
+from django.core.exceptions import ImproperlyConfigured
+
+
+BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'file': 'django.core.cache.backends.filebased.FileBasedCache',
+    'db': 'django.core.cache.backends.db.DatabaseCache',
+    'redis': 'django.core.cache.backends.redis.RedisCache',
+    'rediss': 'django.core.cache.backends.redis.RedisCache',
+}
+
+
+# Tiers every process reaches, whichever container or host it runs on
+SHARED_SCHEMES = ('db', 'redis', 'rediss')
+
+
+def cache_config(url, key_prefix='deptapp', version=1, timeout=300, max_entries=1000):
+    """
+    Build one CACHES entry from a cache URL.
+
+    Args:
+        url: Cache URL, see the module docstring for the schemes
+        key_prefix: Namespace prepended to every key
+        version: Default key version, bump it to orphan every existing key
+        timeout: Default TTL in seconds for keys set without one
+        max_entries: Entry bound for the locmem, file and db tiers
+    """
+    parts = urlsplit(url)
+    if parts.scheme not in BACKENDS:
+        raise ImproperlyConfigured(f"Unsupported CACHE_URL scheme {parts.scheme!r}, expected one of {sorted(BACKENDS)}")
+
+    config = {
+        'BACKEND': BACKENDS[parts.scheme],
+        'KEY_PREFIX': key_prefix,
+        'VERSION': version,
+        'TIMEOUT': timeout,
+    }
+    if parts.scheme in ('redis', 'rediss'):
+        config['LOCATION'] = url
+        return config
+
+    if parts.scheme == 'locmem':
+        config['LOCATION'] = parts.netloc or 'unique-snowflake'
+    elif parts.scheme == 'file':
+        if not parts.path:
+            raise ImproperlyConfigured("file:// CACHE_URL needs an absolute directory, e.g. file:///var/tmp/deptapp")
+        config['LOCATION'] = parts.path
+    else:
+        config['LOCATION'] = parts.netloc or parts.path.strip('/') or 'cache_table'
+    config['OPTIONS'] = {'MAX_ENTRIES': max_entries}
+    return config
+
+
+def require_shared(url, process):
+    """Raise ImproperlyConfigured unless `url` names a cache tier shared by every process."""
+    scheme = urlsplit(url).scheme
+    if scheme not in SHARED_SCHEMES:
+        raise ImproperlyConfigured(
+            f"{process} needs a CACHE_URL shared with the web processes (db:// or redis://), "
+            f"got {scheme}:// whose entries the web processes never see")
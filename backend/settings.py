@@ -12,6 +12,8 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 from pathlib import Path
 
+from .cache import cache_config
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -178,6 +180,7 @@ CORS_EXPOSE_HEADERS = [
 ]
 
 REST_FRAMEWORK = {
+    # Ledger viewsets set core.pagination.KeysetPagination themselves
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 50,
     'DEFAULT_AUTHENTICATION_CLASSES': [
@@ -206,6 +209,9 @@ REST_FRAMEWORK = {
     ],
 }
 
+# Payment planner allocation engine: 'fixed', 'decimal' or 'numpy' (requires numpy)
+PAYMENT_PLANNER_ENGINE = os.environ.get('PAYMENT_PLANNER_ENGINE', 'fixed')
+
 # Security Settings
 SECURE_BROWSER_XSS_FILTER = True
 SECURE_CONTENT_TYPE_NOSNIFF = True
@@ -253,17 +259,33 @@ REST_FRAMEWORK_THROTTLE_RATES = {
 }
 
 # Cache Configuration for Security
+# Holds the login lockout counters; set CACHE_URL to a shared file://,
+# db:// or redis:// tier when running more than one worker (see backend/cache.py)
 CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-        'LOCATION': 'unique-snowflake',
-        'TIMEOUT': 300,  # 5 minutes default
-        'OPTIONS': {
-            'MAX_ENTRIES': 1000,
-        }
-    }
+    'default': cache_config(
+        os.environ.get('CACHE_URL', 'locmem://'),
+        key_prefix=os.environ.get('CACHE_KEY_PREFIX', 'deptapp'),
+        version=int(os.environ.get('CACHE_VERSION', 1)),
+        timeout=300,  # 5 minutes default
+    )
 }
 
+# Lifetime of orphaned response cache entries - freshness comes from data versions
+RESPONSE_CACHE_TIMEOUT = 86400  # seconds
+
+# In-process token -> user cache used by ExpiringTokenAuthentication; revocations
+# reach every worker through the shared cache tier above
+TOKEN_CACHE_SIZE = 1000
+TOKEN_CACHE_TTL = 60  # seconds
+
+# XLSX exports are built whole before streaming; larger ones continue from X-Export-Cursor
+EXPORT_XLSX_MAX_ROWS = 50000
+
+# Background jobs (core/jobs.py) are run by `manage.py run_worker`; hosts without
+# a worker process set JOBS_RUN_INLINE=1 to run them inside the request instead
+JOBS_RUN_INLINE = os.environ.get('JOBS_RUN_INLINE', '0') == '1'
+JOB_MAX_ATTEMPTS = 3  # runs of a job whose worker keeps dying before it is marked failed
+
 # Logging Configuration
 LOGGING = {
     'version': 1,
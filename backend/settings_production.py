@@ -2,21 +2,48 @@
 Production settings for Railway deployment
 """
 import os
-import dj_database_url
+import sys
+import tempfile
 from .settings import *
+from .cache import require_shared
+from .database import database_config
 
 # Override settings for production
 DEBUG = False
 SECRET_KEY = os.environ.get('SECRET_KEY')
-ALLOWED_HOSTS = ['donnmero.pythonanywhere.com', 'localhost', '127.0.0.1']
+ALLOWED_HOSTS = ['donnmero.pythonanywhere.com', 'localhost', '127.0.0.1'] + [
+    host for host in os.environ.get('ALLOWED_HOSTS', '').split(',') if host]
 
-# Database configuration for Railway PostgreSQL
+# Database configuration for Railway PostgreSQL - persistent, health-checked connections,
+# or a psycopg connection pool per worker with DATABASE_POOL=1
 DATABASES = {
-    'default': dj_database_url.parse(
-        os.environ.get('DATABASE_URL', 'sqlite:///db.sqlite3')
+    'default': database_config(
+        os.environ.get('DATABASE_URL', 'sqlite:///db.sqlite3'),
+        conn_max_age=int(os.environ.get('DATABASE_CONN_MAX_AGE', 600)),
+        health_checks=os.environ.get('DATABASE_HEALTH_CHECKS', '1') == '1',
+        pool=os.environ.get('DATABASE_POOL', '0') == '1',
+        pool_min_size=int(os.environ.get('DATABASE_POOL_MIN_SIZE', 2)),
+        pool_max_size=int(os.environ.get('DATABASE_POOL_MAX_SIZE', 10)),
+        pool_timeout=float(os.environ.get('DATABASE_POOL_TIMEOUT', 10)),
     )
 }
 
+# Cache shared by all gunicorn workers - files on this box unless CACHE_URL names another tier
+CACHE_URL = os.environ.get('CACHE_URL', f"file://{os.path.join(tempfile.gettempdir(), 'deptapp-cache')}")
+CACHES = {
+    'default': cache_config(
+        CACHE_URL,
+        key_prefix=os.environ.get('CACHE_KEY_PREFIX', 'deptapp'),
+        version=int(os.environ.get('CACHE_VERSION', 1)),
+    )
+}
+
+# The worker and the scheduler invalidate cached responses and tokens for the web
+# processes, which usually run in other containers - refuse to start them on a
+# cache the web processes cannot read
+if sys.argv[1:2] in (['run_worker'], ['run_scheduler']):
+    require_shared(CACHE_URL, sys.argv[1])
+
 # CORS settings
 CORS_ALLOWED_ORIGINS = os.environ.get('CORS_ALLOWED_ORIGINS', '').split(',')
 
@@ -46,6 +73,9 @@ CSRF_COOKIE_SAMESITE = 'Strict'
 
 # Rate limiting for production
 REST_FRAMEWORK = {
+    # Ledger viewsets set core.pagination.KeysetPagination themselves
+    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    'PAGE_SIZE': 50,
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework.authentication.TokenAuthentication',
     ],
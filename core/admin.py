@@ -1,7 +1,7 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 from django.contrib.auth.models import User
-from .models import UserProfile, Customer, Company, Debt, AuditLog, PaymentPlan, PaymentSchedule, DailyBalance, ShopMoney, Currency
+from .models import UserProfile, Customer, Company, Debt, Event, PaymentPlan, PaymentSchedule, DailyBalance, ShopMoney, Currency, DashboardSummary
 
 
 # User Profile Admin
@@ -38,7 +38,8 @@ class CustomerAdmin(admin.ModelAdmin):
     list_display = ("id", "name", "user", "phone", "address", "total_debt", "reputation", "created_at")
     list_filter = ("user", "reputation", "created_at")
     search_fields = ("name", "phone", "user__username", "user__email")
-    readonly_fields = ("total_debt", "reputation_score", "last_payment_date", "total_paid_30_days", "payment_streak_days")
+    readonly_fields = ("total_debt", "reputation_score", "last_payment_date", "total_paid_30_days", "payment_streak_days",
+                       "unsettled_debt", "oldest_unsettled_at", "min_due_date", "paid_window_at")
 
 
 @admin.register(Company)
@@ -46,7 +47,7 @@ class CompanyAdmin(admin.ModelAdmin):
     list_display = ("id", "name", "user", "phone", "address", "total_debt", "created_at")
     list_filter = ("user", "created_at")
     search_fields = ("name", "phone", "user__username", "user__email")
-    readonly_fields = ("total_debt",)
+    readonly_fields = ("total_debt", "unsettled_debt", "oldest_unsettled_at", "min_due_date")
 
 
 @admin.register(Currency)
@@ -63,10 +64,10 @@ class DebtAdmin(admin.ModelAdmin):
     list_filter = ("is_settled", "currency")
 
 
-@admin.register(AuditLog)
-class AuditLogAdmin(admin.ModelAdmin):
-    list_display = ("id", "action", "entity_type", "entity_id", "amount", "created_at")
-    list_filter = ("action", "entity_type")
+@admin.register(Event)
+class EventAdmin(admin.ModelAdmin):
+    list_display = ("id", "kind", "entity_type", "entity_id", "amount", "created_at")
+    list_filter = ("kind", "entity_type")
 
 
 @admin.register(PaymentPlan)
@@ -96,3 +97,10 @@ class ShopMoneyAdmin(admin.ModelAdmin):
     list_filter = ('created_at', 'updated_at')
     search_fields = ('user__username', 'user__email')
     readonly_fields = ('created_at', 'updated_at')
+
+
+@admin.register(DashboardSummary)
+class DashboardSummaryAdmin(admin.ModelAdmin):
+    list_display = ('user', 'total_receivables', 'total_payables', 'customer_count', 'company_count', 'updated_at')
+    search_fields = ('user__username',)
+    readonly_fields = ('created_at', 'updated_at')
@@ -1,6 +1,26 @@
 from django.apps import AppConfig
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save
 
 
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        from rest_framework.authtoken.models import Token
+        from . import tasks  # noqa: F401  registers the background job handlers
+        from .models import Company, Currency, Customer, DailyBalance, Debt, PaymentPlan, PaymentSchedule
+        from .response_cache import bump_global, bump_owner
+        from .token_cache import evict_token, evict_user
+
+        post_delete.connect(evict_token, sender=Token, dispatch_uid='core.token_cache.token')
+        post_save.connect(evict_user, sender=settings.AUTH_USER_MODEL, dispatch_uid='core.token_cache.user_save')
+        post_delete.connect(evict_user, sender=settings.AUTH_USER_MODEL, dispatch_uid='core.token_cache.user_delete')
+
+        for model in (Debt, Customer, Company, PaymentPlan, PaymentSchedule):
+            post_save.connect(bump_owner, sender=model, dispatch_uid=f'core.response_cache.{model.__name__}_save')
+            post_delete.connect(bump_owner, sender=model, dispatch_uid=f'core.response_cache.{model.__name__}_delete')
+        for model in (DailyBalance, Currency):
+            post_save.connect(bump_global, sender=model, dispatch_uid=f'core.response_cache.{model.__name__}_save')
+            post_delete.connect(bump_global, sender=model, dispatch_uid=f'core.response_cache.{model.__name__}_delete')
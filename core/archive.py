@@ -0,0 +1,247 @@
+"""
+Archival of cold rows.
+
+`manage.py archive --older-than DAYS` moves journal events and paid payment
+schedules past the cutoff into EventArchive and PaymentScheduleArchive, in
+batches, keeping their ids. The hot tables and their indexes then hold only
+recent rows.
+
+Listings read the hot table alone unless the request passes
+?include_archived=1; `scope` then returns a WithArchive, which applies the
+same filters to both tables and merges their rows in ordering order, so
+keyset cursors, page numbers and exports work unchanged.
+"""
+import heapq
+import itertools
+
+from django.db import connections, transaction
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from .models import Event, EventArchive, PaymentPlan, PaymentSchedule, PaymentScheduleArchive
+from .pagination import _resolve
+
+
+ARCHIVES = {
+    Event: EventArchive,
+    PaymentSchedule: PaymentScheduleArchive,
+}
+
+INCLUDE_ARCHIVED_PARAM = 'include_archived'
+
+
+def include_archived(request):
+    return request.query_params.get(INCLUDE_ARCHIVED_PARAM) in ('1', 'true')
+
+
+def scope(model, request):
+    """All rows of `model` the request asks for: the hot table, plus its archive with ?include_archived=1."""
+    if include_archived(request):
+        return WithArchive([model.objects.all(), ARCHIVES[model].objects.all()])
+    return model.objects.all()
+
+
+def parts(queryset):
+    """The plain querysets behind `queryset`, for aggregates that are combined by hand."""
+    return queryset.parts if isinstance(queryset, WithArchive) else [queryset]
+
+
+def aggregate(queryset, **aggregates):
+    """
+    queryset.aggregate() that also works on a WithArchive.
+
+    Sums and counts of the parts add up; a distinct Count counts the distinct
+    values of the UNION of the parts.
+    """
+    if not isinstance(queryset, WithArchive):
+        return queryset.aggregate(**aggregates)
+
+    results = {}
+    for name, expression in aggregates.items():
+        if isinstance(expression, Count) and expression.distinct:
+            field = expression.source_expressions[0].name
+            values = [part.filter(expression.filter) if expression.filter else part for part in queryset.parts]
+            values = [part.order_by().values(field) for part in values]
+            results[name] = values[0].union(*values[1:]).count()
+        elif isinstance(expression, (Count, Sum)):
+            totals = [part.aggregate(value=expression)['value'] for part in queryset.parts]
+            totals = [total for total in totals if total is not None]
+            results[name] = sum(totals) if totals else None
+        else:
+            raise TypeError(f"Cannot combine {type(expression).__name__} across the archive")
+    return results
+
+
+def grouped(queryset, key, **aggregates):
+    """
+    Rows of queryset.values(key).annotate(**aggregates) as {key value: row}.
+
+    The sums and counts of a WithArchive's parts are added up per key.
+    """
+    rows = {}
+    for part in parts(queryset):
+        for row in part.order_by().values(key).annotate(**aggregates):
+            merged = rows.setdefault(row[key], {key: row[key]})
+            for name in aggregates:
+                if row[name] is not None:
+                    merged[name] = (merged.get(name) or 0) + row[name]
+                else:
+                    merged.setdefault(name, None)
+    return rows
+
+
+def cold_rows(model, older_than, now=None):
+    """
+    Rows of `model` that `archive` moves: events past the cutoff and paid schedules due before it.
+
+    Ordered along the index that serves the range, oldest first.
+    """
+    cutoff = (now or timezone.now()) - older_than
+    if model is PaymentSchedule:
+        return PaymentSchedule.objects.filter(is_paid=True, scheduled_date__lt=cutoff.date()) \
+            .order_by('scheduled_date', 'id')
+    return model.objects.filter(created_at__lt=cutoff).order_by('created_at', 'id')
+
+
+def move(queryset, batch_size=1000):
+    """
+    Move the rows of an ordered hot queryset to its archive table, one transaction per batch.
+
+    Returns:
+        Tuple of (rows moved, ids of the users whose rows moved)
+    """
+    model = queryset.model
+    archive = ARCHIVES[model]
+    fields = [field.attname for field in archive._meta.concrete_fields]
+    moved = 0
+    users = set()
+    while True:
+        with transaction.atomic():
+            rows = list(queryset[:batch_size])
+            if not rows:
+                break
+            archive.objects.bulk_create([archive(**{name: getattr(row, name) for name in fields}) for row in rows])
+            _delete(model, [row.pk for row in rows], queryset.db)
+        moved += len(rows)
+        users.update(_owners(model, rows))
+    return moved, users
+
+
+def _delete(model, pks, using):
+    """
+    DELETE rows by primary key in plain SQL.
+
+    Nothing cascades from archived rows, and the per-row post_delete cache
+    bumps would cost two owner lookups per schedule; callers invalidate the
+    cached responses once per user instead.
+    """
+    connection = connections[using]
+    table = connection.ops.quote_name(model._meta.db_table)
+    column = connection.ops.quote_name(model._meta.pk.column)
+    size = connection.ops.bulk_batch_size([model._meta.pk], pks)
+    with connection.cursor() as cursor:
+        for start in range(0, len(pks), size):
+            chunk = pks[start:start + size]
+            cursor.execute(f"DELETE FROM {table} WHERE {column} IN ({', '.join(['%s'] * len(chunk))})", chunk)
+
+
+def _owners(model, rows):
+    if model is PaymentSchedule:
+        plans = PaymentPlan.objects.filter(pk__in={row.payment_plan_id for row in rows}) \
+            .values_list('customer__user_id', 'company__user_id')
+        return {customer_user or company_user for customer_user, company_user in plans} - {None}
+    return {row.user_id for row in rows} - {None}
+
+
+class WithArchive:
+    """
+    Read-only view over a hot queryset and its archive counterpart.
+
+    filter/exclude/order_by/select_related/values_list are applied to every
+    part; slicing and iteration merge the parts by the current ordering, whose
+    fields must all share one direction.
+    """
+
+    def __init__(self, parts, ordering=(), fields=None):
+        self.parts = parts
+        self.ordering = tuple(ordering)
+        self.fields = fields
+
+    @property
+    def model(self):
+        return self.parts[0].model
+
+    @property
+    def db(self):
+        return self.parts[0].db
+
+    @property
+    def ordered(self):
+        return bool(self.ordering)
+
+    def _apply(self, method, *args, ordering=None, fields=None, **kwargs):
+        return WithArchive([getattr(part, method)(*args, **kwargs) for part in self.parts],
+                           self.ordering if ordering is None else ordering,
+                           self.fields if fields is None else fields)
+
+    def all(self):
+        return self._apply('all')
+
+    def filter(self, *args, **kwargs):
+        return self._apply('filter', *args, **kwargs)
+
+    def exclude(self, *args, **kwargs):
+        return self._apply('exclude', *args, **kwargs)
+
+    def select_related(self, *fields):
+        return self._apply('select_related', *fields)
+
+    def order_by(self, *ordering):
+        return self._apply('order_by', *ordering, ordering=ordering)
+
+    def values_list(self, *fields):
+        return self._apply('values_list', *fields, fields=fields)
+
+    def count(self):
+        return sum(part.count() for part in self.parts)
+
+    def exists(self):
+        return any(part.exists() for part in self.parts)
+
+    def get(self, *args, **kwargs):
+        rows = list(itertools.islice(self.filter(*args, **kwargs).iterator(), 2))
+        if not rows:
+            raise self.model.DoesNotExist(f"{self.model._meta.object_name} matching query does not exist.")
+        if len(rows) > 1:
+            raise self.model.MultipleObjectsReturned(f"get() returned more than one {self.model._meta.object_name}")
+        return rows[0]
+
+    def iterator(self, chunk_size=None):
+        return self._merge([part.iterator(chunk_size=chunk_size) for part in self.parts])
+
+    def __iter__(self):
+        return self._merge([iter(part) for part in self.parts])
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            if index.step is not None or index.stop is None:
+                raise TypeError('WithArchive only supports slices with a stop')
+            # The first `stop` merged rows come from the first `stop` rows of each part
+            merged = self._merge([iter(part[:index.stop]) for part in self.parts])
+            return list(itertools.islice(merged, index.start or 0, index.stop))
+        return self[index:index + 1][0]
+
+    def _merge(self, iterators):
+        if not self.ordering:
+            return itertools.chain(*iterators)
+        descending = self.ordering[0].startswith('-')
+        names = [field.lstrip('-') for field in self.ordering]
+        if self.fields is not None:
+            positions = [self.fields.index(name) for name in names]
+            key = lambda row: tuple(row[position] for position in positions)
+        else:
+            key = lambda row: tuple(_resolve(row, name) for name in names)
+        return heapq.merge(*iterators, key=key, reverse=descending)
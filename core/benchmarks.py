@@ -0,0 +1,251 @@
+"""
+Benchmark scenarios run by `manage.py benchmark <scenario>`.
+
+Every scenario seeds its own data inside a transaction that is rolled back
+afterwards, so it can be pointed at any database without leaving rows behind.
+Scenarios registered with rollback=False (connection handling, which a
+surrounding transaction would hide) delete their rows themselves.
+"""
+import random
+import statistics
+import tempfile
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.commands.createcachetable import Command as CreateCacheTable
+from django.db import close_old_connections, connection
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from rest_framework.test import APIClient
+
+from backend.cache import cache_config
+from backend.database import with_pool
+
+from . import credit
+from .models import Company, Customer, Debt, PaymentPlan
+from .payment_algorithm import PaymentPlanner
+
+
+SCENARIOS = {}
+
+
+def scenario(name, rollback=True):
+    """Register a benchmark scenario under `name`, run inside a rolled back transaction unless rollback=False."""
+    def register(func):
+        func.rollback = rollback
+        SCENARIOS[name] = func
+        return func
+    return register
+
+
+def report(stdout, label, timings):
+    """Write count, mean, p50, p99 and throughput for a list of durations in seconds."""
+    ordered = sorted(timings)
+    p99 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+    total = sum(ordered)
+    stdout.write(
+        f"{label}: n={len(ordered)} mean={statistics.mean(ordered) * 1000:.2f}ms "
+        f"p50={statistics.median(ordered) * 1000:.2f}ms p99={p99 * 1000:.2f}ms "
+        f"rate={len(ordered) / total if total else 0:.1f}/s"
+    )
+
+
+def timed(func, repeat):
+    """Call `func` `repeat` times and return the individual durations."""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+def benchmark_user(username='benchmark'):
+    user, _ = User.objects.get_or_create(username=username)
+    client = APIClient()
+    client.force_authenticate(user)
+    return user, client
+
+
+def plan_payload(user, suppliers, days, start=date(2030, 1, 1)):
+    """Build a generate-plan request for `suppliers` companies over `days` days."""
+    rng = random.Random(42)
+    debts = []
+    for index in range(suppliers):
+        company = Company.objects.create(user=user, name=f'Benchmark supplier {suppliers}-{index}', phone='0770')
+        total = rng.randint(500, 50000)
+        debts.append({
+            'company': company.name,
+            'totalDebt': total,
+            'paid': rng.randint(0, total // 2),
+            'manualPriority': rng.choice([1, 2, 3]),
+        })
+    balances = {
+        (start + timedelta(days=offset)).isoformat(): Decimal(rng.randint(1000, 20000))
+        for offset in range(days)
+    }
+    return {'daily_balances': balances, 'debts': debts}
+
+
+@scenario('generate-plan')
+def generate_plan(stdout, repeat, suppliers, days, **options):
+    """Requests/sec of POST /api/generate-plan/ for realistic plan sizes."""
+    days = days or 60
+    user, client = benchmark_user()
+    for size in sorted({max(1, suppliers // 4), suppliers}):
+        payload = plan_payload(user, size, days)
+
+        def post():
+            response = client.post('/api/generate-plan/', payload, format='json')
+            assert response.status_code == 201, response.content
+
+        report(stdout, f"generate-plan suppliers={size} days={days}", timed(post, repeat))
+
+
+def random_plans(count, seed=7):
+    """Unsaved payment plans with a realistic spread of debts and priorities."""
+    rng = random.Random(seed)
+    plans = []
+    for _ in range(count):
+        total = Decimal(rng.randint(50000, 10000000)) / 100
+        paid = (total * Decimal(rng.random() / 2)).quantize(Decimal('0.01'))
+        plans.append(PaymentPlan(total_debt=total, paid_amount=paid, remaining_debt=total - paid,
+                                 manual_priority=rng.choice([1, 2, 3])))
+    return plans
+
+
+def random_balances(days, seed=11, start=date(2030, 1, 1)):
+    rng = random.Random(seed)
+    return {
+        (start + timedelta(days=offset)).isoformat(): Decimal(rng.randint(100000, 5000000)) / 100
+        for offset in range(days)
+    }
+
+
+@scenario('planner')
+def planner(stdout, repeat, debts, days, **options):
+    """PaymentPlanner.schedule_payments per engine, default 1k debts x 365 days."""
+    days = days or 365
+    balances = random_balances(days)
+    days_available = [(date.fromisoformat(day), amount) for day, amount in sorted(balances.items())]
+    results = {}
+    for engine, method in PaymentPlanner().engines.items():
+        # Plans are advanced in place, so every iteration gets a fresh copy
+        plan_sets = [random_plans(debts) for _ in range(repeat * 2)]
+
+        def run():
+            results[engine] = PaymentPlanner().schedule_payments(plan_sets.pop(), balances, engine)
+
+        try:
+            report(stdout, f"planner engine={engine} debts={debts} days={days}", timed(run, repeat))
+        except ImproperlyConfigured as exc:
+            stdout.write(f"planner engine={engine} skipped: {exc}")
+            continue
+
+        # Allocation core alone, without building the PaymentSchedule instances
+        allocate = getattr(PaymentPlanner(), method)
+        report(stdout, f"planner core engine={engine}", timed(lambda: allocate(plan_sets.pop(), days_available), repeat))
+
+    reference = results.pop('decimal')
+    for engine, result in results.items():
+        identical = [(s.scheduled_date, s.scheduled_amount) for s in result['schedules']] == \
+            [(s.scheduled_date, s.scheduled_amount) for s in reference['schedules']]
+        stdout.write(f"planner engine={engine} identical to decimal: {identical} "
+                     f"total_scheduled difference: {result['total_scheduled'] - reference['total_scheduled']}")
+
+
+@scenario('credit')
+def credit_check(stdout, repeat, rows, **options):
+    """Credit decision and POST /api/debts/ latency for a customer with `rows` ledger rows."""
+    user, client = benchmark_user()
+    customer = Customer.objects.create(user=user, name=f'Benchmark customer {rows}', phone='0750')
+    now = timezone.now()
+    rng = random.Random(5)
+    # Old unsettled debts paid down over time, with recent payments so new debt is allowed
+    Debt.objects.bulk_create([
+        Debt(customer=customer, amount=Decimal(rng.randint(-5000, 20000)) / 100,
+             due_date=(now + timedelta(days=rng.randint(1, 90))).date())
+        for _ in range(rows)
+    ], batch_size=1000)
+    Debt.objects.filter(customer=customer).update(created_at=now - timedelta(days=15))
+    Customer.objects.filter(pk=customer.pk).update(created_at=now - timedelta(days=365))
+    customer.refresh_from_db()
+
+    report(stdout, f"credit decide rows={rows}", timed(lambda: credit.decide(customer), repeat))
+
+    def post():
+        response = client.post('/api/debts/', {'customer': customer.pk, 'amount': '10.00'}, format='json')
+        assert response.status_code == 201, response.content
+
+    report(stdout, f"credit POST /api/debts/ rows={rows}", timed(post, repeat))
+
+
+@scenario('cache')
+def cache_tiers(stdout, repeat, cache_urls, **options):
+    """Hit and set latency of each cache tier for a dashboard-sized value."""
+    value = {'top_customers': [{'id': index, 'name': f'Customer {index}', 'total_debt': '1250.00'}
+                               for index in range(10)]}
+    with tempfile.TemporaryDirectory() as directory:
+        for url in ['locmem://benchmark', f'file://{directory}', 'db://benchmark_cache', *cache_urls]:
+            try:
+                config = cache_config(url, key_prefix='benchmark')
+                backend = import_string(config['BACKEND'])(config['LOCATION'], config)
+                if url.startswith('db://'):
+                    # Created inside the scenario transaction, so it is rolled back too
+                    command = CreateCacheTable()
+                    command.verbosity = 0
+                    command.create_table('default', config['LOCATION'], dry_run=False)
+                backend.set('probe', value, 60)
+            except Exception as exc:
+                stdout.write(f"cache {url} skipped: {exc}")
+                continue
+
+            report(stdout, f"cache set {url}", timed(lambda: backend.set('probe', value, 60), repeat))
+            report(stdout, f"cache hit {url}", timed(lambda: backend.get('probe'), repeat))
+            backend.close()
+
+
+@scenario('db-pool', rollback=False)
+def connection_reuse(stdout, repeat, **options):
+    """
+    Latency of an API request when its database connection is opened per
+    request, kept open between requests, or taken from a psycopg pool.
+
+    Each request ends with close_old_connections(), as the request_finished
+    signal does in production. The pool mode needs PostgreSQL with
+    psycopg_pool installed and is skipped otherwise.
+    """
+    user, client = benchmark_user('benchmark-db-pool')
+    Customer.objects.bulk_create([Customer(user=user, name=f'Benchmark customer {index}', phone='0770')
+                                  for index in range(50)])
+    original = connection.settings_dict.copy()
+    modes = [
+        ('per request', {**original, 'CONN_MAX_AGE': 0}),
+        ('persistent', {**original, 'CONN_MAX_AGE': 600, 'CONN_HEALTH_CHECKS': False}),
+        ('persistent + health checks', {**original, 'CONN_MAX_AGE': 600, 'CONN_HEALTH_CHECKS': True}),
+    ]
+    try:
+        modes.append(('pool', with_pool(original)))
+    except ImproperlyConfigured as exc:
+        stdout.write(f"db pool skipped: {exc}")
+
+    def request():
+        client.get('/api/customers/')
+        close_old_connections()
+
+    try:
+        for label, settings_dict in modes:
+            connection.close()
+            connection.settings_dict = settings_dict
+            request()
+            report(stdout, f"db {label}", timed(request, repeat))
+            if hasattr(connection, 'close_pool'):
+                connection.close_pool()
+    finally:
+        connection.close()
+        connection.settings_dict = original
+        Customer.objects.filter(user=user).delete()
+        user.delete()
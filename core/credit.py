@@ -0,0 +1,76 @@
+"""
+Credit decisions for new customer debt.
+
+Every input of the decision (unsettled sum, overdue count, payments in the
+last 30 days) comes from one conditional aggregate over the customer's
+ledger, shared by DebtSerializer.validate and the check-customer-credit
+endpoint.
+"""
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from typing import NamedTuple, Optional
+
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+
+# Customers younger than this are only held back by overdue debt
+GRACE_PERIOD = timedelta(days=30)
+
+# Payments inside this window keep an established customer's credit open
+PAYMENT_WINDOW = timedelta(days=30)
+
+
+class CreditDecision(NamedTuple):
+    """Outcome of a credit check together with the figures it was based on."""
+    allowed: bool
+    reason: str
+    current_debt: Decimal
+    overdue_count: int
+    recent_payments: int
+    paid_30_days: Decimal
+
+
+def decide(customer, now: Optional[datetime] = None, today: Optional[date] = None) -> CreditDecision:
+    """
+    Decide whether a customer may receive new (positive) debt.
+
+    Overpaid or debt-free customers always may. Otherwise overdue unsettled
+    debt blocks them, customers inside the grace period are allowed, and
+    established customers need at least one payment in the last 30 days.
+    """
+    now = now or timezone.now()
+    today = today or date.today()
+    window_start = now - PAYMENT_WINDOW
+
+    unsettled = Q(is_settled=False)
+    overdue = unsettled & Q(due_date__isnull=False, due_date__lt=today)
+    recent_payments = Q(amount__lt=0, created_at__gte=window_start)
+    totals = customer.debts.order_by().aggregate(
+        current_debt=Sum('amount', filter=unsettled),
+        overdue_count=Count('id', filter=overdue),
+        recent_payments=Count('id', filter=recent_payments),
+        paid=Sum('amount', filter=recent_payments),
+    )
+    current_debt = totals['current_debt'] or Decimal('0')
+    overdue_count = totals['overdue_count']
+    paid = abs(totals['paid'] or Decimal('0'))
+
+    def decision(allowed, reason):
+        return CreditDecision(allowed, reason, current_debt, overdue_count, totals['recent_payments'], paid)
+
+    if current_debt < 0:
+        return decision(True, f"Customer is overpaid by ${abs(current_debt)} - can receive new debt")
+    if current_debt == 0:
+        return decision(True, "Customer has no debt")
+
+    if overdue_count:
+        return decision(False, f"Customer has {overdue_count} overdue payment(s) - must pay before receiving new debt")
+
+    # New customers get a grace period before payment requirements kick in
+    if customer.created_at and customer.created_at > now - GRACE_PERIOD:
+        return decision(True, "New customer - can receive new debt")
+
+    if totals['recent_payments']:
+        return decision(True, f"Customer paid ${paid} in last 30 days")
+    return decision(False, "Customer has not made any payments in the last 30 days")
@@ -0,0 +1,148 @@
+"""
+Materialized per-user dashboard summary.
+
+The summary row is built from grouped queries on first read, patched
+incrementally by the ledger on every debt write, and dropped (to be rebuilt on
+the next read) when customers or companies are created, edited or deleted, so
+/api/dashboard/ answers from a single read of one row.
+
+Overdue counts depend on the current date, so instead of a count the row
+keeps a histogram of the entities' earliest due dates; the overdue count is
+the sum of the buckets before today.
+"""
+from datetime import date
+from decimal import Decimal
+
+from django.db.models import Count, Sum
+
+from .models import Company, Customer, DashboardSummary, ShopMoney
+
+
+# Debtors kept per list - the endpoint serves up to this many
+TOP_DEBTORS = 10
+
+
+def rebuild(user):
+    """Recompute the user's summary from the customer/company aggregates."""
+    customers = Customer.objects.filter(user=user)
+    companies = Company.objects.filter(user=user)
+    shop_money = ShopMoney.objects.filter(user=user).values_list('current_money', flat=True).first()
+
+    customer_totals = customers.aggregate(total=Sum('total_debt'), count=Count('id'))
+    company_totals = companies.aggregate(total=Sum('total_debt'), count=Count('id'))
+
+    summary, _ = DashboardSummary.objects.update_or_create(user=user, defaults={
+        'total_receivables': customer_totals['total'] or Decimal('0'),
+        'total_payables': company_totals['total'] or Decimal('0'),
+        'customer_count': customer_totals['count'],
+        'company_count': company_totals['count'],
+        'shop_money': shop_money or Decimal('0'),
+        'reputation_counts': dict(
+            customers.order_by().values('reputation').annotate(count=Count('id')).values_list('reputation', 'count')
+        ),
+        'top_customers': _top(customers),
+        'top_companies': _top(companies),
+        'customer_due_dates': _due_dates(customers),
+        'company_due_dates': _due_dates(companies),
+    })
+    return summary
+
+
+def summary_for(user):
+    """Return the user's summary, building it on first use."""
+    summary = DashboardSummary.objects.filter(user=user).first()
+    return summary or rebuild(user)
+
+
+def snapshot(entity):
+    """Values of an entity that feed the summary, taken before a ledger change."""
+    return (entity.total_debt, getattr(entity, 'reputation', None), entity.min_due_date)
+
+
+def apply_entity_change(entity, before):
+    """
+    Patch the owner's summary after the ledger changed one customer/company.
+
+    Must run inside the ledger transaction, with `before` from snapshot().
+    """
+    summary = DashboardSummary.objects.select_for_update().filter(user_id=entity.user_id).first()
+    if summary is None:
+        # Not materialized yet - the next read builds it from scratch
+        return
+
+    old_total, old_reputation, old_due_date = before
+    delta = Decimal(str(entity.total_debt)) - Decimal(str(old_total))
+    fields = ['updated_at']
+
+    if isinstance(entity, Customer):
+        summary.total_receivables += delta
+        if old_reputation != entity.reputation:
+            counts = summary.reputation_counts
+            counts[old_reputation] = counts.get(old_reputation, 0) - 1
+            if counts[old_reputation] <= 0:
+                del counts[old_reputation]
+            counts[entity.reputation] = counts.get(entity.reputation, 0) + 1
+            fields.append('reputation_counts')
+        fields.append('total_receivables')
+        top_field, due_field = 'top_customers', 'customer_due_dates'
+    else:
+        summary.total_payables += delta
+        fields.append('total_payables')
+        top_field, due_field = 'top_companies', 'company_due_dates'
+
+    if old_due_date != entity.min_due_date:
+        _move_due_date(getattr(summary, due_field), old_due_date, entity.min_due_date)
+        fields.append(due_field)
+
+    if delta and _may_change_top(getattr(summary, top_field), entity):
+        setattr(summary, top_field, _top(type(entity).objects.filter(user_id=entity.user_id)))
+        fields.append(top_field)
+
+    summary.save(update_fields=fields)
+
+
+def invalidate(user):
+    """Drop the user's summary after a change the ledger does not track."""
+    DashboardSummary.objects.filter(user=user).delete()
+
+
+def record_shop_money(user, amount):
+    """Keep the summary's shop money in step with ShopMoney writes."""
+    DashboardSummary.objects.filter(user=user).update(shop_money=amount)
+
+
+def overdue_count(due_dates, today=None):
+    """Number of entities whose earliest due date is before today."""
+    today = (today or date.today()).isoformat()
+    return sum(count for due_date, count in due_dates.items() if due_date < today)
+
+
+def _top(queryset):
+    return [
+        {'id': row['id'], 'name': row['name'], 'total_debt': str(row['total_debt'])}
+        for row in queryset.order_by('-total_debt', 'pk').values('id', 'name', 'total_debt')[:TOP_DEBTORS]
+    ]
+
+
+def _due_dates(queryset):
+    rows = queryset.filter(min_due_date__isnull=False).order_by() \
+        .values('min_due_date').annotate(count=Count('id')).values_list('min_due_date', 'count')
+    return {due_date.isoformat(): count for due_date, count in rows}
+
+
+def _move_due_date(due_dates, old, new):
+    if old is not None:
+        key = old.isoformat()
+        due_dates[key] = due_dates.get(key, 0) - 1
+        if due_dates[key] <= 0:
+            del due_dates[key]
+    if new is not None:
+        key = new.isoformat()
+        due_dates[key] = due_dates.get(key, 0) + 1
+
+
+def _may_change_top(top, entity):
+    """Whether a new total for entity can reorder or enter the top list."""
+    if len(top) < TOP_DEBTORS or any(row['id'] == entity.pk for row in top):
+        return True
+    return Decimal(str(entity.total_debt)) > Decimal(top[-1]['total_debt'])
@@ -0,0 +1,37 @@
+"""
+Unit of work for debt mutations made through the API.
+
+Each operation writes the debt row once, which folds the change into the
+owner's ledger aggregates (see core.ledger), then appends one event to the
+journal (see core.journal), all in a single transaction.
+"""
+from django.db import transaction
+
+from . import journal
+
+
+def create(user, serializer):
+    """Save a new debt from a validated DebtSerializer and record it."""
+    with transaction.atomic():
+        debt = serializer.save()
+        _record(user, debt, 'debt_created', 'Debt added')
+    return debt
+
+
+def update(user, serializer):
+    """Save changes to a debt from a validated DebtSerializer and record them."""
+    with transaction.atomic():
+        debt = serializer.save()
+        _record(user, debt, 'debt_updated', 'Debt updated')
+    return debt
+
+
+def delete(user, debt):
+    """Record a debt's deletion and delete it."""
+    with transaction.atomic():
+        _record(user, debt, 'debt_deleted', 'Debt deleted')
+        debt.delete()
+
+
+def _record(user, debt, kind, verb):
+    journal.record(user, kind, debt, f"{verb}: {debt.note or 'No description'}", debt.amount)
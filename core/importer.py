@@ -0,0 +1,211 @@
+"""
+Bulk import of historical debts.
+
+Rows are validated in batches, owners and currencies are resolved with one
+query per batch, and Debt rows and their journal events are written with
+bulk_create. The per-row ledger updates of Debt.save() are skipped; instead the
+aggregates of every affected customer and company are recomputed once at the
+end, in the same transaction. Invalid rows are reported and skipped.
+
+Used by POST /api/debts/bulk/ and `manage.py import_ledger`.
+"""
+import codecs
+import csv
+import json
+from typing import Dict, Iterable, List, NamedTuple
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import dashboard, journal, response_cache
+from .ledger import recompute_aggregates
+from .models import Company, Currency, Customer, Debt
+from .serializers import DebtImportRowSerializer
+
+
+FORMATS = ('csv', 'ndjson')
+
+
+class ImportReport(NamedTuple):
+    """Number of debts created and the errors of the rejected rows."""
+    created: int
+    errors: List[Dict]
+
+
+class MalformedFile(ValueError):
+    """The input cannot be decoded or parsed; `row` is the 1-based row being read."""
+
+    def __init__(self, row, reason):
+        super().__init__(f"Row {row}: cannot read the file ({reason})")
+        self.row = row
+
+
+def read_rows(stream, fmt):
+    """
+    Yield row dicts from a text stream of CSV (with header) or NDJSON.
+
+    Empty CSV cells are dropped so optional columns fall back to their defaults.
+    Bytes that are not UTF-8 and CSV syntax errors raise MalformedFile.
+    """
+    number = 0
+    try:
+        for number, row in enumerate(_parse_rows(stream, fmt), start=1):
+            yield row
+    except (UnicodeDecodeError, csv.Error) as exc:
+        raise MalformedFile(number + 1, exc) from exc
+
+
+def _parse_rows(stream, fmt):
+    if fmt == 'csv':
+        for row in csv.DictReader(stream):
+            yield {key: value for key, value in row.items() if key and value not in ('', None)}
+    elif fmt == 'ndjson':
+        for line in stream:
+            if line.strip():
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    # Reported by the validation step as a row error
+                    yield None
+    else:
+        raise ValueError(f"Unsupported import format {fmt!r}, expected one of {FORMATS}")
+
+
+def decode_lines(binary, encoding='utf-8-sig'):
+    """Text lines of a binary stream, decoded line by line so a bad byte fails on its own row."""
+    decoder = codecs.getincrementaldecoder(encoding)()
+    for line in binary:
+        yield decoder.decode(line)
+    decoder.decode(b'', final=True)
+
+
+def read_upload(upload, fmt=None):
+    """Rows of an uploaded file, the format taken from its extension unless given."""
+    fmt = fmt or ('ndjson' if upload.name.endswith(('.ndjson', '.jsonl')) else 'csv')
+    return read_rows(decode_lines(upload.file), fmt)
+
+
+def import_debts(user, rows: Iterable, batch_size=1000) -> ImportReport:
+    """
+    Import debt rows for a user's customers and companies.
+
+    Args:
+        user: Owner of the referenced customers and companies
+        rows: Iterable of row dicts (see DebtImportRowSerializer)
+        batch_size: Rows validated and inserted per batch
+
+    Returns:
+        ImportReport; errors hold {'row': 1-based row number, 'errors': ...}
+    """
+    currencies = dict(Currency.objects.values_list('code', 'pk'))
+    created = 0
+    errors = []
+    touched = {Customer: set(), Company: set()}
+
+    with transaction.atomic():
+        batch = []
+        for number, row in enumerate(rows, start=1):
+            batch.append((number, row))
+            if len(batch) >= batch_size:
+                created += _import_batch(user, batch, currencies, touched, errors)
+                batch = []
+        if batch:
+            created += _import_batch(user, batch, currencies, touched, errors)
+
+        _recompute(touched)
+
+    if created:
+        dashboard.invalidate(user)
+        # Bulk inserts send no signals
+        response_cache.bump(user.pk)
+    return ImportReport(created, sorted(errors, key=lambda error: error['row']))
+
+
+def _import_batch(user, batch, currencies, touched, errors):
+    valid = []
+    for number, row in batch:
+        serializer = DebtImportRowSerializer(data=row if isinstance(row, dict) else None)
+        if serializer.is_valid():
+            valid.append((number, serializer.validated_data))
+        else:
+            errors.append({'row': number, 'errors': serializer.errors})
+
+    owners = _resolve_owners(user, [data for _, data in valid])
+
+    debts = []
+    for number, data in valid:
+        row_errors = {}
+        owner = _owner(owners, data)
+        if owner is None:
+            row_errors['owner'] = ['No such customer or company']
+        currency_id = currencies.get(data['currency'].upper()) if data.get('currency') else None
+        if data.get('currency') and currency_id is None:
+            row_errors['currency'] = [f"Unknown currency {data['currency']!r}"]
+        if row_errors:
+            errors.append({'row': number, 'errors': row_errors})
+            continue
+
+        debt = Debt(amount=data['amount'], note=data['note'], is_settled=data['is_settled'], due_date=data['due_date'])
+        if isinstance(owner, Customer):
+            debt.customer = owner
+        else:
+            debt.company = owner
+        if currency_id is not None:
+            debt.currency_id = currency_id
+        debts.append((debt, data.get('created_at')))
+        touched[type(owner)].add(owner.pk)
+
+    if not debts:
+        return 0
+
+    Debt.objects.bulk_create([debt for debt, _ in debts])
+    # auto_now_add overwrote the entry dates on insert; restore the historical ones
+    backdated = []
+    for debt, created_at in debts:
+        if created_at is not None:
+            debt.created_at = created_at
+            backdated.append(debt)
+    if backdated:
+        Debt.objects.bulk_update(backdated, ['created_at'])
+
+    journal.append([
+        journal.event(user, 'debt_created', debt, f"Debt imported: {debt.note or 'No description'}", debt.amount)
+        for debt, _ in debts
+    ])
+    return len(debts)
+
+
+def _resolve_owners(user, rows):
+    """Map ('customer'|'company', id or name) to the user's entities, one query per kind and key."""
+    owners = {}
+    for model, kind in ((Customer, 'customer'), (Company, 'company')):
+        ids = {data[kind] for data in rows if data.get(kind)}
+        names = {data[f'{kind}_name'] for data in rows if data.get(f'{kind}_name')}
+        if ids:
+            for entity in model.objects.filter(user=user, pk__in=ids):
+                owners[(kind, entity.pk)] = entity
+        if names:
+            # Oldest entity wins when names repeat
+            for entity in model.objects.filter(user=user, name__in=names).order_by('-pk'):
+                owners[(kind, entity.name)] = entity
+    return owners
+
+
+def _owner(owners, data):
+    for kind in ('customer', 'company'):
+        if data.get(kind):
+            return owners.get((kind, data[kind]))
+        if data.get(f'{kind}_name'):
+            return owners.get((kind, data[f'{kind}_name']))
+    return None
+
+
+def _recompute(touched):
+    """Rebuild the ledger aggregates of every affected entity from its full ledger."""
+    now = timezone.now()
+    for model, pks in touched.items():
+        for entity in model.objects.select_for_update().filter(pk__in=pks).order_by('pk'):
+            values = recompute_aggregates(entity, now)
+            for field, value in values.items():
+                setattr(entity, field, value)
+            entity.save(update_fields=list(values))
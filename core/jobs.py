@@ -0,0 +1,139 @@
+"""
+Database-backed background jobs.
+
+Views enqueue a Job row and answer 202 with its id; `manage.py run_worker`
+claims queued jobs and runs the handler registered for their kind. Claiming
+is a conditional UPDATE (status queued -> running), so any number of worker
+processes can share the table without a broker or row locks, on SQLite as
+well as Postgres.
+
+Handlers take (user, payload) and return a JSON-serialisable result; they
+are registered with @handler in core.tasks.
+
+Jobs left running by a worker that died are put back in the queue by every
+worker once a minute, up to JOB_MAX_ATTEMPTS runs; a job that keeps killing
+its worker is then marked failed. Deployments without a worker process set
+JOBS_RUN_INLINE, which runs each job inside the request that enqueues it.
+"""
+import os
+import socket
+import time
+import traceback
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Job
+
+
+HANDLERS = {}
+
+# Seconds between two sweeps for stale jobs in a worker
+REQUEUE_INTERVAL = 60
+
+
+def handler(kind):
+    """Register a job handler under `kind`."""
+    def register(func):
+        HANDLERS[kind] = func
+        return func
+    return register
+
+
+def enqueue(user, kind, payload=None):
+    """Queue a job for the worker and return it."""
+    if kind not in HANDLERS:
+        raise ValueError(f"No job handler registered for {kind!r}")
+    job = Job.objects.create(user=user, kind=kind, payload=payload or {})
+    if getattr(settings, 'JOBS_RUN_INLINE', False) and _claim(job.pk, worker_name()):
+        job.refresh_from_db()
+        run(job)
+    return job
+
+
+def worker_name():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def claim(worker=None, scan=10):
+    """
+    Take the oldest queued job, or return None when the queue is empty.
+
+    The first of the `scan` oldest candidates whose conditional UPDATE still
+    matches is ours; the others were taken by concurrent workers.
+    """
+    worker = worker or worker_name()
+    candidates = Job.objects.filter(status='queued').order_by('created_at', 'id').values_list('pk', flat=True)[:scan]
+    for pk in candidates:
+        if _claim(pk, worker):
+            return Job.objects.select_related('user').get(pk=pk)
+    return None
+
+
+def _claim(pk, worker):
+    return Job.objects.filter(pk=pk, status='queued').update(
+        status='running', worker=worker, started_at=timezone.now(), attempts=F('attempts') + 1,
+    )
+
+
+def run(job):
+    """Run a claimed job and record its result or the error."""
+    try:
+        job.result = HANDLERS[job.kind](job.user, job.payload)
+        job.status = 'done'
+    except Exception:
+        job.status = 'failed'
+        job.error = traceback.format_exc()
+    job.finished_at = timezone.now()
+    job.save(update_fields=['result', 'status', 'error', 'finished_at', 'updated_at'])
+    return job
+
+
+def work(worker=None, once=False, poll_interval=1.0, stop=None, stale_after=None):
+    """
+    Claim and run jobs until `stop()` is true, or until the queue is empty with once=True.
+
+    With `stale_after` (a timedelta), jobs left running longer than that are
+    swept back into the queue every REQUEUE_INTERVAL seconds.
+
+    Returns the number of jobs run.
+    """
+    done = 0
+    swept_at = time.monotonic()
+    while not (stop and stop()):
+        close_old_connections()
+        if stale_after is not None and time.monotonic() - swept_at >= REQUEUE_INTERVAL:
+            requeue_stale(stale_after)
+            swept_at = time.monotonic()
+        job = claim(worker)
+        if job is None:
+            if once:
+                break
+            time.sleep(poll_interval)
+            continue
+        run(job)
+        done += 1
+    return done
+
+
+def requeue_stale(older_than, max_attempts=None):
+    """
+    Put back jobs left running by a worker that died, started before now - `older_than`.
+
+    Jobs that already ran `max_attempts` times (JOB_MAX_ATTEMPTS) are marked
+    failed instead.
+
+    Returns:
+        Tuple of (jobs requeued, jobs given up)
+    """
+    max_attempts = max_attempts or getattr(settings, 'JOB_MAX_ATTEMPTS', 3)
+    now = timezone.now()
+    stale = Job.objects.filter(status='running', started_at__lt=now - older_than)
+    failed = stale.filter(attempts__gte=max_attempts).update(
+        status='failed', finished_at=now,
+        error=f'Gave up after {max_attempts} attempts: the worker running it stopped before it finished',
+    )
+    requeued = stale.filter(attempts__lt=max_attempts).update(status='queued', worker='')
+    return requeued, failed
@@ -0,0 +1,66 @@
+"""
+Append-only event journal.
+
+Every change to a customer, company, debt or payment schedule is recorded as
+one Event row. The audit log (/api/audit/) and the entity activity feed
+(/api/entity-activities/) are both read from it, so a mutation costs a single
+insert. Events are never updated; `append` writes many at once.
+"""
+from .models import Company, Customer, Debt, Event, PaymentSchedule
+
+
+def event(user, kind, entity, description='', amount=None):
+    """
+    Build an unsaved Event.
+
+    Args:
+        user: Owner of the changed entity
+        kind: One of Event.KIND_CHOICES
+        entity: The Customer, Company, Debt or PaymentSchedule that changed
+        description: Human readable summary shown in the audit log and activity feed
+        amount: Amount involved, if any
+    """
+    if isinstance(entity, Customer):
+        entity_type, customer_id, company_id = 'customer', entity.pk, None
+    elif isinstance(entity, Company):
+        entity_type, customer_id, company_id = 'company', None, entity.pk
+    elif isinstance(entity, Debt):
+        entity_type, customer_id, company_id = 'debt', entity.customer_id, entity.company_id
+    elif isinstance(entity, PaymentSchedule):
+        plan = entity.payment_plan
+        entity_type, customer_id, company_id = 'payment', plan.customer_id, plan.company_id
+    else:
+        raise TypeError(f"Cannot journal changes to {type(entity).__name__}")
+
+    return Event(
+        user=user,
+        action=action_of(kind),
+        kind=kind,
+        entity_type=entity_type,
+        entity_id=entity.pk,
+        customer_id=customer_id,
+        company_id=company_id,
+        description=description[:255],
+        amount=amount,
+    )
+
+
+def record(user, kind, entity, description='', amount=None):
+    """Append a single event and return it."""
+    entry = event(user, kind, entity, description, amount)
+    entry.save(force_insert=True)
+    return entry
+
+
+def append(events, batch_size=1000):
+    """Append many events with batched inserts."""
+    return Event.objects.bulk_create(events, batch_size=batch_size)
+
+
+def action_of(kind):
+    """Audit log action of an event kind ('debt_updated' -> 'update')."""
+    if kind.endswith('_updated'):
+        return 'update'
+    if kind.endswith('_deleted'):
+        return 'delete'
+    return 'create'
@@ -0,0 +1,282 @@
+"""
+Incremental ledger aggregates for customers and companies.
+
+Every Debt write is folded into the running aggregates stored on its owner
+(total debt, unsettled sum, 30 day paid window, oldest unsettled date and
+earliest due date) inside the same transaction, instead of recomputing them
+from the full ledger. `recompute_aggregates` is the full recompute used by the
+`reconcile` management command to verify and repair the running values.
+"""
+from decimal import Decimal
+from typing import NamedTuple, Optional
+from datetime import date, datetime
+
+from django.db import transaction
+from django.db.models import Min, Q, Sum
+from django.utils import timezone
+
+from . import dashboard
+from .models import Company, Customer, Debt
+from .reputation import REPUTATION_WINDOW, last_payment, score_reputation
+
+
+ZERO = Decimal('0')
+
+# Aggregate fields maintained on both customers and companies
+ENTITY_FIELDS = ['total_debt', 'unsettled_debt', 'oldest_unsettled_at', 'min_due_date']
+
+# Additional aggregate fields maintained on customers only
+CUSTOMER_FIELDS = ENTITY_FIELDS + ['total_paid_30_days', 'paid_window_at', 'last_payment_date',
+                                   'reputation', 'reputation_score']
+
+
+class LedgerEntry(NamedTuple):
+    """Snapshot of the Debt columns that feed the entity aggregates."""
+    customer_id: Optional[int]
+    company_id: Optional[int]
+    amount: Decimal
+    is_settled: bool
+    created_at: Optional[datetime]
+    due_date: Optional[date]
+
+    @classmethod
+    def from_debt(cls, debt):
+        return cls(
+            customer_id=debt.customer_id,
+            company_id=debt.company_id,
+            amount=Decimal(str(debt.amount or 0)),
+            is_settled=debt.is_settled,
+            created_at=debt.created_at,
+            due_date=debt.due_date,
+        )
+
+    @classmethod
+    def for_pk(cls, pk):
+        """Load the stored snapshot of a debt, or None if it does not exist."""
+        row = Debt.objects.filter(pk=pk).values_list(*cls._fields).first()
+        return cls(*row) if row else None
+
+    @property
+    def owner(self):
+        if self.customer_id:
+            return (Customer, self.customer_id)
+        if self.company_id:
+            return (Company, self.company_id)
+        return None
+
+    @property
+    def unsettled_amount(self):
+        return ZERO if self.is_settled else self.amount
+
+    @property
+    def is_payment(self):
+        # Negative amounts indicate payments
+        return self.amount < 0
+
+
+def post(previous, debt, write):
+    """
+    Run `write` and fold the resulting ledger change into the owner aggregates.
+
+    Args:
+        previous: LedgerEntry of the row before the write (None when creating)
+        debt: The Debt instance after the write (None when deleting)
+        write: Callable performing the actual row write
+
+    Returns:
+        Whatever `write` returns
+    """
+    now = timezone.now()
+    owners = set()
+    if previous is not None and previous.owner:
+        owners.add(previous.owner)
+    if debt is not None:
+        if debt.customer_id:
+            owners.add((Customer, debt.customer_id))
+        elif debt.company_id:
+            owners.add((Company, debt.company_id))
+
+    with transaction.atomic():
+        # Lock the owners first so concurrent writes apply their deltas serially
+        entities = []
+        for model, pk in sorted(owners, key=lambda owner: (owner[0].__name__, owner[1])):
+            entity = model.objects.select_for_update().filter(pk=pk).first()
+            if entity is None:
+                continue
+            if isinstance(entity, Customer):
+                _slide_paid_window(entity, now)
+            entities.append(entity)
+
+        result = write()
+
+        current = LedgerEntry.from_debt(debt) if debt is not None else None
+        for entity in entities:
+            before = previous if _owned_by(previous, entity) else None
+            after = current if _owned_by(current, entity) else None
+            summary_before = dashboard.snapshot(entity)
+            _apply(entity, before, after, now)
+            fields = CUSTOMER_FIELDS if isinstance(entity, Customer) else ENTITY_FIELDS
+            entity.save(update_fields=fields)
+            dashboard.apply_entity_change(entity, summary_before)
+            if debt is not None:
+                _refresh_cached(debt, entity, fields)
+
+    return result
+
+
+def recompute_aggregates(entity, now=None):
+    """
+    Compute the aggregates of a customer or company from its full ledger.
+
+    Returns a dict of field -> value matching the fields that `post` maintains.
+    """
+    now = now or timezone.now()
+    window_start = now - REPUTATION_WINDOW
+    unsettled = Q(is_settled=False)
+    payments = Q(amount__lt=0)
+
+    aggregates = {
+        'total_debt': Sum('amount'),
+        'unsettled_debt': Sum('amount', filter=unsettled),
+        'oldest_unsettled_at': Min('created_at', filter=unsettled),
+        'min_due_date': Min('due_date'),
+    }
+    if isinstance(entity, Customer):
+        aggregates['total_paid'] = Sum('amount', filter=payments & Q(created_at__gte=window_start))
+        aggregates['last_payment_date'] = last_payment()
+
+    values = Debt.objects.filter(**{_owner_field(entity): entity.pk}).aggregate(**aggregates)
+    values['total_debt'] = values['total_debt'] or ZERO
+    values['unsettled_debt'] = values['unsettled_debt'] or ZERO
+
+    if isinstance(entity, Customer):
+        values['total_paid_30_days'] = abs(values.pop('total_paid') or ZERO)
+        values['paid_window_at'] = now
+        values['reputation_score'], values['reputation'] = score_reputation(
+            values['unsettled_debt'], values['total_paid_30_days'],
+            values['oldest_unsettled_at'], window_start,
+        )
+    return values
+
+
+def reconcile(queryset, repair=False, now=None):
+    """
+    Compare stored aggregates with a full recompute.
+
+    Yields (entity, drift) for every entity whose stored values differ, where
+    drift maps field -> (stored, expected). With repair=True the expected
+    values are written back.
+    """
+    now = now or timezone.now()
+    for entity in queryset.iterator(chunk_size=500):
+        expected = recompute_aggregates(entity, now)
+        drift = {}
+        for field, value in expected.items():
+            if field == 'paid_window_at':
+                continue
+            stored = getattr(entity, field)
+            if stored != value:
+                drift[field] = (stored, value)
+        if not drift:
+            continue
+        if repair:
+            for field, value in expected.items():
+                setattr(entity, field, value)
+            entity.save(update_fields=list(expected))
+        yield entity, drift
+
+
+def _owner_field(entity):
+    return 'customer' if isinstance(entity, Customer) else 'company'
+
+
+def _owned_by(entry, entity):
+    return entry is not None and entry.owner == (type(entity), entity.pk)
+
+
+def _slide_paid_window(customer, now):
+    """Drop payments that aged out of the 30 day window since it was last moved."""
+    window_start = now - REPUTATION_WINDOW
+    payments = Debt.objects.filter(customer=customer, amount__lt=0)
+
+    if customer.paid_window_at is None:
+        paid = payments.filter(created_at__gte=window_start).aggregate(total=Sum('amount'))['total']
+        customer.total_paid_30_days = abs(paid or ZERO)
+    elif customer.total_paid_30_days and customer.paid_window_at < now:
+        expired = payments.filter(
+            created_at__gte=customer.paid_window_at - REPUTATION_WINDOW,
+            created_at__lt=window_start,
+        ).aggregate(total=Sum('amount'))['total']
+        customer.total_paid_30_days -= abs(expired or ZERO)
+
+    customer.paid_window_at = now
+
+
+def _apply(entity, before, after, now):
+    """Apply the difference between two ledger entries to an entity's aggregates."""
+    owner_filter = {_owner_field(entity): entity.pk}
+    old_amount = before.amount if before else ZERO
+    new_amount = after.amount if after else ZERO
+    old_unsettled = before.unsettled_amount if before else ZERO
+    new_unsettled = after.unsettled_amount if after else ZERO
+
+    entity.total_debt = Decimal(str(entity.total_debt)) + new_amount - old_amount
+    entity.unsettled_debt = Decimal(str(entity.unsettled_debt)) + new_unsettled - old_unsettled
+
+    # Oldest unsettled debt - only rescan when the current minimum left the set
+    removed = (before is not None and not before.is_settled
+               and before.created_at == entity.oldest_unsettled_at
+               and (after is None or after.is_settled))
+    if removed:
+        entity.oldest_unsettled_at = Debt.objects.filter(is_settled=False, **owner_filter) \
+            .aggregate(oldest=Min('created_at'))['oldest']
+    elif after is not None and not after.is_settled and (
+            entity.oldest_unsettled_at is None or after.created_at < entity.oldest_unsettled_at):
+        entity.oldest_unsettled_at = after.created_at
+
+    # Earliest due date across the ledger
+    removed = (before is not None and before.due_date is not None
+               and before.due_date == entity.min_due_date
+               and (after is None or after.due_date != before.due_date))
+    if removed:
+        entity.min_due_date = Debt.objects.filter(**owner_filter) \
+            .aggregate(earliest=Min('due_date'))['earliest']
+    elif after is not None and after.due_date is not None and (
+            entity.min_due_date is None or after.due_date < entity.min_due_date):
+        entity.min_due_date = after.due_date
+
+    if not isinstance(entity, Customer):
+        return
+
+    window_start = now - REPUTATION_WINDOW
+    paid = Decimal(str(entity.total_paid_30_days))
+    if before is not None and before.is_payment and before.created_at >= window_start:
+        paid += before.amount
+    if after is not None and after.is_payment and after.created_at >= window_start:
+        paid -= after.amount
+    entity.total_paid_30_days = paid
+
+    # Latest payment date - rescan only when the latest payment went away
+    removed = (before is not None and before.is_payment
+               and before.created_at == entity.last_payment_date
+               and (after is None or not after.is_payment))
+    if removed:
+        entity.last_payment_date = Debt.objects.filter(**owner_filter).aggregate(latest=last_payment())['latest']
+    elif after is not None and after.is_payment and (
+            entity.last_payment_date is None or after.created_at > entity.last_payment_date):
+        entity.last_payment_date = after.created_at
+
+    entity.reputation_score, entity.reputation = score_reputation(
+        entity.unsettled_debt, entity.total_paid_30_days, entity.oldest_unsettled_at, window_start,
+    )
+
+
+def _refresh_cached(debt, entity, fields):
+    """Copy the new aggregates onto the debt's cached owner instance, if any."""
+    descriptor = Debt.customer if isinstance(entity, Customer) else Debt.company
+    if not descriptor.is_cached(debt):
+        return
+    cached = getattr(debt, descriptor.field.name)
+    if cached is not None and cached.pk == entity.pk and cached is not entity:
+        for field in fields:
+            setattr(cached, field, getattr(entity, field))
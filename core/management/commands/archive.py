@@ -0,0 +1,40 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import archive, response_cache
+from core.models import Event, PaymentSchedule
+
+
+class Command(BaseCommand):
+    help = ("Move journal events and paid payment schedules older than the cutoff into the archive tables. "
+            "Listings read them again with ?include_archived=1")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than', type=int, required=True,
+                            help='Archive events created, and paid schedules due, more than this many days ago')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows moved per transaction')
+        parser.add_argument('--dry-run', action='store_true', help='Only report how many rows would move')
+
+    def handle(self, *args, **options):
+        if options['older_than'] < 1:
+            raise CommandError('--older-than must be at least 1 day')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+
+        older_than = timedelta(days=options['older_than'])
+        users = set()
+        for model, label in ((Event, 'events'), (PaymentSchedule, 'paid schedules')):
+            rows = archive.cold_rows(model, older_than)
+            if options['dry_run']:
+                self.stdout.write(f'{rows.count()} {label} would be archived')
+                continue
+            moved, owners = archive.move(rows, options['batch_size'])
+            users |= owners
+            self.stdout.write(f'Archived {moved} {label}')
+
+        # Hot listings and analytics of these users changed
+        for user_id in users:
+            response_cache.bump(user_id)
+        if not options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(f'Archive complete for {len(users)} users'))
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test.utils import setup_test_environment
+
+from core.benchmarks import SCENARIOS
+
+
+class Command(BaseCommand):
+    help = "Run a benchmark scenario against seeded data that is rolled back afterwards"
+
+    def add_arguments(self, parser):
+        parser.add_argument('scenario', choices=sorted(SCENARIOS))
+        parser.add_argument('--repeat', type=int, default=20, help='Timed iterations per measurement')
+        parser.add_argument('--suppliers', type=int, default=40, help='Companies/debts in generated plans')
+        parser.add_argument('--debts', type=int, default=1000, help='Debts scheduled by the planner scenarios')
+        parser.add_argument('--days', type=int, help='Days of balances (scenario specific default)')
+        parser.add_argument('--rows', type=int, default=10000, help='Ledger rows of the credit scenario customer')
+        parser.add_argument('--cache-url', action='append', dest='cache_urls', default=[],
+                            help='Extra cache tier for the cache scenario, e.g. redis://localhost:6379/0 (repeatable)')
+
+    def handle(self, *args, **options):
+        # Lets the scenarios drive the API through the Django test client
+        setup_test_environment()
+        run = SCENARIOS[options['scenario']]
+        if not run.rollback:
+            run(self.stdout, **options)
+            return
+        with transaction.atomic():
+            run(self.stdout, **options)
+            transaction.set_rollback(True)
@@ -0,0 +1,44 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth.models import User
+
+from core.importer import FORMATS, MalformedFile, decode_lines, import_debts, read_rows
+
+
+class Command(BaseCommand):
+    help = "Bulk import historical debts for a user's customers and companies from CSV or NDJSON"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="CSV (with header) or NDJSON file, '-' for stdin")
+        parser.add_argument('--user', required=True, help='Username owning the customers and companies')
+        parser.add_argument('--format', choices=FORMATS,
+                            help='Input format (default: from the file extension, csv otherwise)')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows validated and inserted per batch')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+        try:
+            user = User.objects.get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(f"User '{options['user']}' does not exist")
+
+        path = options['path']
+        fmt = options['format'] or ('ndjson' if path.endswith(('.ndjson', '.jsonl')) else 'csv')
+        try:
+            if path == '-':
+                rows = read_rows(decode_lines(sys.stdin.buffer), fmt)
+                report = import_debts(user, rows, batch_size=options['batch_size'])
+            else:
+                with open(path, 'rb') as stream:
+                    report = import_debts(user, read_rows(decode_lines(stream), fmt), batch_size=options['batch_size'])
+        except OSError as exc:
+            raise CommandError(f"Cannot read {path}: {exc}")
+        except MalformedFile as exc:
+            raise CommandError(f"Nothing imported from {path}: {exc}")
+
+        for error in report.errors:
+            self.stdout.write(f"row {error['row']}: {error['errors']}")
+        message = f"Imported {report.created} debts, rejected {len(report.errors)} rows"
+        self.stdout.write(self.style.WARNING(message) if report.errors else self.style.SUCCESS(message))
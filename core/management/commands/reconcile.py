@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth.models import User
+
+from core.ledger import reconcile
+from core.models import Company, Customer, DashboardSummary
+
+
+class Command(BaseCommand):
+    help = "Verify the running ledger aggregates against a full recompute and optionally repair them"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repair', action='store_true',
+                            help='Write the recomputed values back for every entity that drifted')
+        parser.add_argument('--user', help='Only reconcile customers and companies of this username')
+
+    def handle(self, *args, **options):
+        customers = Customer.objects.order_by('pk')
+        companies = Company.objects.order_by('pk')
+
+        if options['user']:
+            try:
+                user = User.objects.get(username=options['user'])
+            except User.DoesNotExist:
+                raise CommandError(f"User '{options['user']}' does not exist")
+            customers = customers.filter(user=user)
+            companies = companies.filter(user=user)
+
+        drifted = 0
+        repaired_users = set()
+        for queryset in (customers, companies):
+            for entity, drift in reconcile(queryset, repair=options['repair']):
+                drifted += 1
+                repaired_users.add(entity.user_id)
+                label = type(entity).__name__.lower()
+                for field, (stored, expected) in drift.items():
+                    self.stdout.write(f"{label} {entity.pk} ({entity.name}): {field} stored={stored} expected={expected}")
+
+        if options['repair']:
+            # Repaired aggregates bypass the ledger - rebuild those dashboards on next read
+            DashboardSummary.objects.filter(user_id__in=repaired_users).delete()
+
+        if not drifted:
+            self.stdout.write(self.style.SUCCESS('All ledger aggregates are consistent'))
+        elif options['repair']:
+            self.stdout.write(self.style.SUCCESS(f'Repaired {drifted} entities'))
+        else:
+            self.stdout.write(self.style.WARNING(f'{drifted} entities drifted - run with --repair to fix them'))
@@ -0,0 +1,74 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from core import response_cache
+from core.models import Customer, DashboardSummary, SchedulerRun
+from core.reputation import refresh_reputations, window_rollovers
+
+
+TASK = 'reputation-rollover'
+
+
+class Command(BaseCommand):
+    help = ("Refresh the reputation of customers whose 30 day window rolled over since the last run. "
+            "Meant to be run nightly from cron, or as a long-running process with --every; "
+            "the first run refreshes everyone")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', help='Look for rollovers after this ISO datetime instead of the last run')
+        parser.add_argument('--full', action='store_true', help='Refresh every customer')
+        parser.add_argument('--chunk-size', type=int, default=500,
+                            help='Number of customers aggregated and written per batch')
+        parser.add_argument('--every', type=int,
+                            help='Keep running and repeat every this many seconds (e.g. 86400) instead of cron')
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be at least 1')
+        if options['every'] is not None and options['every'] < 1:
+            raise CommandError('--every must be at least 1 second')
+
+        while True:
+            self._run(options)
+            if options['every'] is None:
+                return
+            # --since only applies to the first run, the next ones continue from it
+            options['since'] = None
+            options['full'] = False
+            time.sleep(options['every'])
+
+    def _run(self, options):
+        now = timezone.now()
+        since = self._since(options, SchedulerRun.objects.filter(name=TASK).first())
+        if since is None or options['full']:
+            customers = Customer.objects.all()
+        else:
+            customers = window_rollovers(since, now)
+
+        user_ids = set(customers.values_list('user_id', flat=True).distinct())
+        # Commits batch by batch, so debt writes are never held up for the whole run;
+        # the run is only recorded once every batch is in, and a crash repeats it
+        updated = refresh_reputations(customers, now=now, batch_size=options['chunk_size'])
+
+        with transaction.atomic():
+            # Reputations changed outside the ledger - rebuild those dashboards on next read
+            DashboardSummary.objects.filter(user_id__in=user_ids).delete()
+            for user_id in user_ids:
+                response_cache.bump(user_id)
+
+            SchedulerRun.objects.update_or_create(name=TASK, defaults={'last_run_at': now})
+
+        window = f'since {since:%Y-%m-%d %H:%M}' if since and not options['full'] else 'full refresh'
+        self.stdout.write(self.style.SUCCESS(f'Updated reputation for {updated} customers ({window})'))
+
+    def _since(self, options, run):
+        if options['since']:
+            since = parse_datetime(options['since'])
+            if since is None:
+                raise CommandError(f"--since {options['since']!r} is not an ISO datetime")
+            return since if timezone.is_aware(since) else timezone.make_aware(since)
+        return run.last_run_at if run else None
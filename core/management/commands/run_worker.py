@@ -0,0 +1,71 @@
+import multiprocessing
+import os
+import signal
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from core import jobs
+
+
+class Command(BaseCommand):
+    help = "Run queued background jobs (reputation updates, async plan generation) in a pool of processes"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=2, help='Worker processes claiming jobs in parallel')
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help='Seconds to wait before looking again when the queue is empty')
+        parser.add_argument('--stale-after', type=int, default=3600,
+                            help='Requeue jobs left running for this many seconds by a worker that died '
+                                 '(checked at startup and every minute)')
+        parser.add_argument('--once', action='store_true', help='Exit once the queue is empty')
+
+    def handle(self, *args, **options):
+        if options['processes'] < 1:
+            raise CommandError('--processes must be at least 1')
+
+        stale_after = timedelta(seconds=options['stale_after'])
+        requeued, failed = jobs.requeue_stale(stale_after)
+        if requeued or failed:
+            self.stdout.write(f'Requeued {requeued} stale jobs, gave up on {failed}')
+
+        if options['processes'] == 1:
+            done = _work(options['once'], options['poll_interval'], stale_after)
+            self.stdout.write(self.style.SUCCESS(f'Ran {done} jobs'))
+            return
+
+        # Children must not inherit the parent's database connections, pooled ones included
+        connections.close_all()
+        for connection in connections.all():
+            if hasattr(connection, 'close_pool'):
+                connection.close_pool()
+        context = multiprocessing.get_context('fork')
+        workers = [context.Process(target=_work, args=(options['once'], options['poll_interval'], stale_after, True))
+                   for _ in range(options['processes'])]
+        for worker in workers:
+            worker.start()
+
+        def stop(signum, frame):
+            # Let every worker finish its current job, then exit
+            for worker in workers:
+                if worker.is_alive():
+                    os.kill(worker.pid, signal.SIGTERM)
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+        for worker in workers:
+            worker.join()
+        self.stdout.write(self.style.SUCCESS(f'{len(workers)} workers stopped'))
+
+
+def _work(once, poll_interval, stale_after, child=False):
+    stopping = []
+    signal.signal(signal.SIGTERM, lambda *args: stopping.append(True))
+    if child:
+        # Ctrl-C reaches the whole process group; the parent turns it into SIGTERM
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+    try:
+        return jobs.work(once=once, poll_interval=poll_interval, stop=lambda: bool(stopping), stale_after=stale_after)
+    finally:
+        connections.close_all()
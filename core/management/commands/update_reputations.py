@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth.models import User
+
+from core import dashboard
+from core.models import Customer
+from core.reputation import refresh_reputations
+
+
+class Command(BaseCommand):
+    help = "Recompute customer reputations for every user using grouped aggregate queries"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Only refresh customers of this username')
+        parser.add_argument('--chunk-size', type=int, default=500,
+                            help='Number of customers aggregated and written per batch')
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be at least 1')
+
+        users = User.objects.order_by('pk')
+        if options['user']:
+            users = users.filter(username=options['user'])
+            if not users.exists():
+                raise CommandError(f"User '{options['user']}' does not exist")
+
+        total = 0
+        for user in users.iterator():
+            updated = refresh_reputations(Customer.objects.filter(user=user), batch_size=options['chunk_size'])
+            # Reputation counts changed outside the ledger - rebuild the dashboard on next read
+            dashboard.invalidate(user)
+            if updated:
+                self.stdout.write(f"{user.username}: updated {updated} customers")
+            total += updated
+
+        self.stdout.write(self.style.SUCCESS(f'Updated reputation for {total} customers'))
@@ -3,12 +3,18 @@ from django.core.cache import cache
 from rest_framework.authentication import TokenAuthentication
 from rest_framework.exceptions import AuthenticationFailed
 
+from .token_cache import auth_version, token_cache
+
 
 class ExpiringTokenAuthentication(TokenAuthentication):
     """Custom token authentication with expiration"""
     
     def authenticate_credentials(self, key):
         """Authenticate token and check expiration"""
+        cached = token_cache.get(key)
+        if cached is not None:
+            return cached
+
         try:
             token = self.get_model().objects.select_related('user').get(key=key)
         except self.get_model().DoesNotExist:
@@ -16,6 +22,7 @@ class ExpiringTokenAuthentication(TokenAuthentication):
         
         if not token.user.is_active:
             raise AuthenticationFailed('User inactive or deleted')
+        token_cache.set(key, token.user, token, auth_version(token.user_id))
         
         # No token expiration check - tokens are permanent
         # token_expiry = cache.get(f"token_expiry_{key}")
@@ -0,0 +1,90 @@
+# Generated by Django 5.2.7 on 2026-10-16 20:42
+
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Max, Min, Q, Sum
+from django.utils import timezone
+
+
+def backfill_ledger_aggregates(apps, schema_editor):
+    Customer = apps.get_model('core', 'Customer')
+    Company = apps.get_model('core', 'Company')
+    Debt = apps.get_model('core', 'Debt')
+
+    now = timezone.now()
+    unsettled = Q(is_settled=False)
+    aggregates = {
+        'unsettled_debt': Sum('amount', filter=unsettled),
+        'oldest_unsettled_at': Min('created_at', filter=unsettled),
+        'min_due_date': Min('due_date'),
+    }
+
+    for customer in Customer.objects.all().iterator():
+        values = Debt.objects.filter(customer=customer).aggregate(
+            paid=Sum('amount', filter=Q(amount__lt=0, created_at__gte=now - timedelta(days=30))),
+            last_payment=Max('created_at', filter=Q(amount__lt=0)),
+            **aggregates
+        )
+        customer.unsettled_debt = values['unsettled_debt'] or Decimal('0')
+        customer.oldest_unsettled_at = values['oldest_unsettled_at']
+        customer.min_due_date = values['min_due_date']
+        customer.total_paid_30_days = abs(values['paid'] or Decimal('0'))
+        customer.last_payment_date = values['last_payment'] or customer.last_payment_date
+        customer.paid_window_at = now
+        customer.save(update_fields=['unsettled_debt', 'oldest_unsettled_at', 'min_due_date',
+                                     'total_paid_30_days', 'last_payment_date', 'paid_window_at'])
+
+    for company in Company.objects.all().iterator():
+        values = Debt.objects.filter(company=company).aggregate(**aggregates)
+        company.unsettled_debt = values['unsettled_debt'] or Decimal('0')
+        company.oldest_unsettled_at = values['oldest_unsettled_at']
+        company.min_due_date = values['min_due_date']
+        company.save(update_fields=['unsettled_debt', 'oldest_unsettled_at', 'min_due_date'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0020_currency_debt_currency'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='company',
+            name='min_due_date',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='company',
+            name='oldest_unsettled_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='company',
+            name='unsettled_debt',
+            field=models.DecimalField(decimal_places=3, default=0, max_digits=15),
+        ),
+        migrations.AddField(
+            model_name='customer',
+            name='min_due_date',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='customer',
+            name='oldest_unsettled_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='customer',
+            name='paid_window_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='customer',
+            name='unsettled_debt',
+            field=models.DecimalField(decimal_places=3, default=0, max_digits=15),
+        ),
+        migrations.RunPython(backfill_ledger_aggregates, migrations.RunPython.noop),
+    ]
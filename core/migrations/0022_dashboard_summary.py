@@ -0,0 +1,38 @@
+# Generated by Django 5.2.7 on 2026-10-16 20:56
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0021_ledger_aggregates'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DashboardSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('total_receivables', models.DecimalField(decimal_places=3, default=0, max_digits=15)),
+                ('total_payables', models.DecimalField(decimal_places=3, default=0, max_digits=15)),
+                ('shop_money', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('customer_count', models.IntegerField(default=0)),
+                ('company_count', models.IntegerField(default=0)),
+                ('reputation_counts', models.JSONField(default=dict)),
+                ('top_customers', models.JSONField(default=list)),
+                ('top_companies', models.JSONField(default=list)),
+                ('customer_due_dates', models.JSONField(default=dict)),
+                ('company_due_dates', models.JSONField(default=dict)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='dashboard_summary', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+    ]
@@ -0,0 +1,75 @@
+# Generated by Django 5.2.7 on 2026-10-16 20:58
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0022_dashboard_summary'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='auditlog',
+            index=models.Index(fields=['entity_type', 'entity_id', '-created_at'], name='auditlog_entity_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='company',
+            index=models.Index(fields=['user', '-total_debt'], name='company_user_debt_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(fields=['user', '-total_debt'], name='customer_user_debt_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='debt',
+            index=models.Index(fields=['customer', '-created_at'], name='debt_customer_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='debt',
+            index=models.Index(fields=['company', '-created_at'], name='debt_company_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='debt',
+            index=models.Index(fields=['customer', 'due_date'], name='debt_customer_due_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='debt',
+            index=models.Index(fields=['company', 'due_date'], name='debt_company_due_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='debt',
+            index=models.Index(condition=models.Q(('is_settled', False)), fields=['customer', 'due_date'], name='debt_cust_unsettled_due_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='debt',
+            index=models.Index(condition=models.Q(('is_settled', False)), fields=['customer', 'created_at'], name='debt_cust_unsettled_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='debt',
+            index=models.Index(condition=models.Q(('is_settled', False)), fields=['company', 'created_at'], name='debt_comp_unsettled_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='debt',
+            index=models.Index(condition=models.Q(('amount__lt', 0)), fields=['customer', 'created_at'], name='debt_cust_payment_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='entityactivity',
+            index=models.Index(fields=['customer', '-created_at'], name='activity_customer_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='entityactivity',
+            index=models.Index(fields=['company', '-created_at'], name='activity_company_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='paymentschedule',
+            index=models.Index(fields=['payment_plan', 'scheduled_date'], name='schedule_plan_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='paymentschedule',
+            index=models.Index(fields=['scheduled_date', 'id'], name='schedule_date_idx'),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.7 on 2026-10-16 20:59
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_audit_log_owner(apps, schema_editor):
+    AuditLog = apps.get_model('core', 'AuditLog')
+    Customer = apps.get_model('core', 'Customer')
+    Company = apps.get_model('core', 'Company')
+    Debt = apps.get_model('core', 'Debt')
+    PaymentSchedule = apps.get_model('core', 'PaymentSchedule')
+
+    def owner(queryset, *paths):
+        # One correlated subquery per path to the user, first non-null wins
+        columns = [Subquery(queryset.filter(pk=OuterRef('entity_id')).values(path)[:1]) for path in paths]
+        return Coalesce(*columns) if len(columns) > 1 else columns[0]
+
+    # Set-based UPDATEs; entries whose entity was deleted keep user NULL
+    missing = AuditLog.objects.filter(user__isnull=True)
+    missing.filter(entity_type='customer').update(user_id=owner(Customer.objects, 'user_id'))
+    missing.filter(entity_type='company').update(user_id=owner(Company.objects, 'user_id'))
+    missing.filter(entity_type='debt').update(
+        user_id=owner(Debt.objects, 'customer__user_id', 'company__user_id'))
+    missing.filter(entity_type='payment').update(
+        user_id=owner(PaymentSchedule.objects, 'payment_plan__customer__user_id', 'payment_plan__company__user_id'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0023_hot_query_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='auditlog',
+            name='user',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='audit_logs', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='auditlog',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='auditlog_user_created_idx'),
+        ),
+        migrations.RunPython(backfill_audit_log_owner, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,141 @@
+# Generated by Django 5.2.7 on 2026-10-16 22:54
+
+import datetime
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Exists, OuterRef
+from django.db.models.functions import Coalesce
+
+
+# Kinds of the audit entries that have no activity row to fold with
+AUDIT_KINDS = {
+    ('debt', 'create'): 'debt_created',
+    ('debt', 'update'): 'debt_updated',
+    ('debt', 'delete'): 'debt_deleted',
+    ('payment', 'create'): 'payment_made',
+    ('customer', 'create'): 'profile_created',
+    ('customer', 'update'): 'profile_updated',
+    ('customer', 'delete'): 'profile_deleted',
+    ('company', 'create'): 'profile_created',
+    ('company', 'update'): 'profile_updated',
+    ('company', 'delete'): 'profile_deleted',
+}
+
+
+def action_of(kind):
+    if kind.endswith('_updated'):
+        return 'update'
+    if kind.endswith('_deleted'):
+        return 'delete'
+    return 'create'
+
+
+def fold_logs_into_journal(apps, schema_editor):
+    AuditLog = apps.get_model('core', 'AuditLog')
+    EntityActivity = apps.get_model('core', 'EntityActivity')
+    Event = apps.get_model('core', 'Event')
+
+    def append(rows, build):
+        batch = []
+        for row in rows.iterator(chunk_size=2000):
+            batch.append(build(row))
+            if len(batch) >= 2000:
+                Event.objects.bulk_create(batch)
+                batch = []
+        Event.objects.bulk_create(batch)
+
+    # Every activity becomes an event, owned by its customer's or company's user
+    def from_activity(row):
+        if row['related_object_type']:
+            entity_type, entity_id = row['related_object_type'], row['related_object_id']
+        else:
+            entity_type = 'customer' if row['customer_id'] else 'company'
+            entity_id = row['customer_id'] or row['company_id']
+        return Event(user_id=row['owner'], action=action_of(row['activity_type']), kind=row['activity_type'],
+                     entity_type=entity_type, entity_id=entity_id or 0, customer_id=row['customer_id'],
+                     company_id=row['company_id'], description=row['description'], amount=row['amount'],
+                     created_at=row['created_at'])
+
+    activities = EntityActivity.objects.order_by('created_at', 'pk') \
+        .annotate(owner=Coalesce('customer__user_id', 'company__user_id')) \
+        .values('owner', 'activity_type', 'customer_id', 'company_id', 'related_object_type', 'related_object_id',
+                'description', 'amount', 'created_at')
+    append(activities, from_activity)
+
+    # Audit entries were written next to their activity; keep only those without one
+    window = datetime.timedelta(seconds=1)
+    near = {'created_at__gte': OuterRef('created_at') - window, 'created_at__lte': OuterRef('created_at') + window}
+    paired = {
+        'debt': EntityActivity.objects.filter(related_object_type='debt', related_object_id=OuterRef('entity_id'), **near),
+        'customer': EntityActivity.objects.filter(related_object_type='', customer_id=OuterRef('entity_id'), **near),
+        'company': EntityActivity.objects.filter(related_object_type='', company_id=OuterRef('entity_id'), **near),
+    }
+
+    def from_audit(row):
+        kind = AUDIT_KINDS.get((row['entity_type'], row['action']), 'debt_created')
+        return Event(user_id=row['user_id'], action=row['action'], kind=kind, entity_type=row['entity_type'],
+                     entity_id=row['entity_id'], description=row['description'], amount=row['amount'],
+                     created_at=row['created_at'])
+
+    fields = ('user_id', 'action', 'entity_type', 'entity_id', 'description', 'amount', 'created_at')
+    for entity_type, activity in paired.items():
+        unpaired = AuditLog.objects.filter(entity_type=entity_type).exclude(Exists(activity))
+        append(unpaired.order_by('created_at', 'pk').values(*fields), from_audit)
+    others = AuditLog.objects.exclude(entity_type__in=list(paired))
+    append(others.order_by('created_at', 'pk').values(*fields), from_audit)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0026_scheduler_run'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Event',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('action', models.CharField(choices=[('create', 'Create'), ('update', 'Update'), ('delete', 'Delete')], max_length=16)),
+                ('kind', models.CharField(choices=[('debt_created', 'Debt Created'), ('debt_updated', 'Debt Updated'), ('debt_deleted', 'Debt Deleted'), ('payment_made', 'Payment Made'), ('profile_created', 'Profile Created'), ('profile_updated', 'Profile Updated'), ('profile_deleted', 'Profile Deleted')], max_length=20)),
+                ('entity_type', models.CharField(max_length=32)),
+                ('entity_id', models.IntegerField()),
+                ('description', models.CharField(blank=True, max_length=255)),
+                ('amount', models.DecimalField(blank=True, decimal_places=3, max_digits=15, null=True)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('company', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='events', to='core.company')),
+                ('customer', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='events', to='core.customer')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='events', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='event_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['entity_type', 'entity_id', '-created_at'], name='event_entity_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['customer', '-created_at'], name='event_customer_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['company', '-created_at'], name='event_company_created_idx'),
+        ),
+        migrations.RunPython(fold_logs_into_journal, migrations.RunPython.noop),
+        migrations.DeleteModel(
+            name='AuditLog',
+        ),
+        migrations.DeleteModel(
+            name='EntityActivity',
+        ),
+    ]
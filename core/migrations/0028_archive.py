@@ -0,0 +1,99 @@
+# Generated by Django 5.2.7 on 2026-10-16 22:59
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0027_event_journal'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventArchive',
+            fields=[
+                ('action', models.CharField(choices=[('create', 'Create'), ('update', 'Update'), ('delete', 'Delete')], max_length=16)),
+                ('kind', models.CharField(choices=[('debt_created', 'Debt Created'), ('debt_updated', 'Debt Updated'), ('debt_deleted', 'Debt Deleted'), ('payment_made', 'Payment Made'), ('profile_created', 'Profile Created'), ('profile_updated', 'Profile Updated'), ('profile_deleted', 'Profile Deleted')], max_length=20)),
+                ('entity_type', models.CharField(max_length=32)),
+                ('entity_id', models.IntegerField()),
+                ('description', models.CharField(blank=True, max_length=255)),
+                ('amount', models.DecimalField(blank=True, decimal_places=3, max_digits=15, null=True)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='PaymentScheduleArchive',
+            fields=[
+                ('scheduled_date', models.DateField()),
+                ('scheduled_amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('actual_amount', models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True)),
+                ('is_paid', models.BooleanField(default=False)),
+                ('paid_at', models.DateTimeField(blank=True, null=True)),
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+            ],
+            options={
+                'ordering': ['scheduled_date'],
+                'abstract': False,
+            },
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['created_at', 'id'], name='event_created_idx'),
+        ),
+        migrations.AddField(
+            model_name='eventarchive',
+            name='company',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='core.company'),
+        ),
+        migrations.AddField(
+            model_name='eventarchive',
+            name='customer',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='core.customer'),
+        ),
+        migrations.AddField(
+            model_name='eventarchive',
+            name='user',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='archived_events', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='paymentschedulearchive',
+            name='payment_plan',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_schedules', to='core.paymentplan'),
+        ),
+        migrations.AddIndex(
+            model_name='eventarchive',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='event_arch_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='eventarchive',
+            index=models.Index(fields=['entity_type', 'entity_id', '-created_at'], name='event_arch_entity_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='eventarchive',
+            index=models.Index(fields=['customer', '-created_at'], name='event_arch_customer_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='eventarchive',
+            index=models.Index(fields=['company', '-created_at'], name='event_arch_company_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='paymentschedulearchive',
+            index=models.Index(fields=['payment_plan', 'scheduled_date'], name='schedule_arch_plan_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='paymentschedulearchive',
+            index=models.Index(fields=['scheduled_date', 'id'], name='schedule_arch_date_idx'),
+        ),
+    ]
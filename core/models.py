@@ -1,5 +1,8 @@
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth.models import AbstractUser
+from .reputation import REPUTATION_FIELDS, last_payment, score_reputation
 
 
 class UserProfile(models.Model):
@@ -71,6 +74,12 @@ class Customer(TimestampedModel):
     total_paid_30_days = models.DecimalField(max_digits=15, decimal_places=3, default=0)
     payment_streak_days = models.IntegerField(default=0)  # Consecutive days with payments
 
+    # Running ledger aggregates maintained by core.ledger on every debt write
+    unsettled_debt = models.DecimalField(max_digits=15, decimal_places=3, default=0)
+    oldest_unsettled_at = models.DateTimeField(null=True, blank=True)
+    min_due_date = models.DateField(null=True, blank=True)
+    paid_window_at = models.DateTimeField(null=True, blank=True)  # When total_paid_30_days was last slid
+
     def __str__(self) -> str:
         return self.name
 
@@ -80,7 +89,8 @@ class Customer(TimestampedModel):
         from datetime import timedelta
 
         # 30 days period for production
-        thirty_days_ago = timezone.now() - timedelta(days=30)
+        now = timezone.now()
+        thirty_days_ago = now - timedelta(days=30)
 
         # Get all debt payments in last 30 days
         recent_payments = self.debts.filter(
@@ -97,104 +107,28 @@ class Customer(TimestampedModel):
         # Get the oldest unpaid debt to check if it's been 30+ days
         oldest_debt = self.debts.filter(is_settled=False).order_by('created_at').first()
 
+        # Refresh the running ledger aggregates from the full recompute
+        self.unsettled_debt = current_debt
+        self.oldest_unsettled_at = oldest_debt.created_at if oldest_debt else None
+        self.paid_window_at = now
+
         # Calculate reputation score (0-100)
-        if current_debt == 0:
-            # No debt = excellent
-            self.reputation_score = 100
-            self.reputation = 'excellent'
-        elif oldest_debt and oldest_debt.created_at < thirty_days_ago:
-            # Has debt older than 30 days - check payment behavior
-            if total_paid > 0:
-                # Has made payments - calculate based on payment ratio
-                payment_ratio = float(total_paid) / float(current_debt + total_paid)
-                if payment_ratio >= 0.5:  # Paid at least 50% of total debt
-                    self.reputation_score = 80
-                    self.reputation = 'good'
-                elif payment_ratio >= 0.25:  # Paid at least 25%
-                    self.reputation_score = 60
-                    self.reputation = 'fair'
-                else:  # Paid less than 25%
-                    self.reputation_score = 30
-                    self.reputation = 'poor'
-            else:
-                # Has debt older than 30 days with no payments = bad
-                self.reputation_score = 10
-                self.reputation = 'bad'
-        else:
-            # Has debt but it's less than 30 days old = good (new debt, give them time)
-            # This gives new customers a fair chance before being penalized
-            self.reputation_score = 70
-            self.reputation = 'good'
+        self.reputation_score, self.reputation = score_reputation(
+            current_debt, total_paid, self.oldest_unsettled_at, thirty_days_ago
+        )
 
         # Update last payment date
-        if recent_payments.exists():
-            self.last_payment_date = recent_payments.latest('created_at').created_at
+        self.last_payment_date = self.debts.aggregate(latest=last_payment())['latest']
 
-        self.save()
+        # Only the reputation columns changed - leave the rest of the row to its own writers
+        self.save(update_fields=REPUTATION_FIELDS)
 
     def can_receive_new_debt(self):
         """Check if customer can receive new debt based on payment history and due dates"""
-        from django.utils import timezone
-        from datetime import timedelta, date
-
-        # 30 days period for production
-        thirty_days_ago = timezone.now() - timedelta(days=30)
-        today = date.today()
-
-        # Check if customer has any positive debt (not overpaid)
-        current_debt = sum(d.amount for d in self.debts.filter(is_settled=False))
-
-        if current_debt <= 0:
-            # No debt or overpaid = can receive new debt
-            if current_debt < 0:
-                return True, f"Customer is overpaid by ${abs(current_debt)} - can receive new debt"
-            else:
-                return True, "Customer has no debt"
-
-        # Check if customer is new (created within last 30 days)
-        # New customers get a grace period before payment requirements kick in
-        if self.created_at and self.created_at > thirty_days_ago:
-            # New customer - check only for overdue payments, not payment history
-            overdue_debts = self.debts.filter(
-                is_settled=False,
-                due_date__isnull=False,
-                due_date__lt=today
-            )
-
-            if overdue_debts.exists():
-                # Has overdue payments = cannot receive new debt
-                overdue_count = overdue_debts.count()
-                return False, f"Customer has {overdue_count} overdue payment(s) - must pay before receiving new debt"
-            else:
-                # New customer with no overdue payments = can receive new debt
-                return True, "New customer - can receive new debt"
-
-        # For existing customers (created more than 30 days ago)
-        # Check if customer has any overdue payments
-        overdue_debts = self.debts.filter(
-            is_settled=False,
-            due_date__isnull=False,
-            due_date__lt=today
-        )
+        from .credit import decide
 
-        if overdue_debts.exists():
-            # Has overdue payments = cannot receive new debt
-            overdue_count = overdue_debts.count()
-            return False, f"Customer has {overdue_count} overdue payment(s) - must pay before receiving new debt"
-
-        # Check if customer has made any payments in last 30 days
-        recent_payments = self.debts.filter(
-            created_at__gte=thirty_days_ago,
-            amount__lt=0  # Negative amounts indicate payments
-        )
-
-        if recent_payments.exists():
-            # Has made payments in last 30 days = can receive new debt
-            total_paid = abs(sum(p.amount for p in recent_payments))
-            return True, f"Customer paid ${total_paid} in last 30 days"
-        else:
-            # No payments in last 30 days = cannot receive new debt
-            return False, "Customer has not made any payments in the last 30 days"
+        decision = decide(self)
+        return decision.allowed, decision.reason
 
     def update_total_debt(self):
         """Update the total debt for this customer"""
@@ -208,6 +142,14 @@ class Customer(TimestampedModel):
         earliest_debt = self.debts.filter(due_date__isnull=False).order_by('due_date').first()
         return earliest_debt.due_date if earliest_debt else None
 
+    class Meta:
+        indexes = [
+            # Largest debtors per user (dashboard top list)
+            models.Index(fields=['user', '-total_debt'], name='customer_user_debt_idx'),
+            # Unsettled debt ageing past the reputation window (run_scheduler)
+            models.Index(fields=['oldest_unsettled_at'], name='customer_oldest_unsettled_idx'),
+        ]
+
 
 class Company(TimestampedModel):
     user = models.ForeignKey('auth.User', on_delete=models.CASCADE, related_name='companies')
@@ -217,6 +159,11 @@ class Company(TimestampedModel):
     market_money = models.DecimalField(max_digits=15, decimal_places=3, default=0)
     total_debt = models.DecimalField(max_digits=15, decimal_places=3, default=0)
 
+    # Running ledger aggregates maintained by core.ledger on every debt write
+    unsettled_debt = models.DecimalField(max_digits=15, decimal_places=3, default=0)
+    oldest_unsettled_at = models.DateTimeField(null=True, blank=True)
+    min_due_date = models.DateField(null=True, blank=True)
+
     def __str__(self) -> str:
         return self.name
 
@@ -232,6 +179,11 @@ class Company(TimestampedModel):
         earliest_debt = self.debts.filter(due_date__isnull=False).order_by('due_date').first()
         return earliest_debt.due_date if earliest_debt else None
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-total_debt'], name='company_user_debt_idx'),
+        ]
+
 
 class Debt(TimestampedModel):
     customer = models.ForeignKey('Customer', null=True, blank=True, on_delete=models.CASCADE, related_name='debts')
@@ -246,33 +198,44 @@ class Debt(TimestampedModel):
         owner = self.customer.name if self.customer else (self.company.name if self.company else 'Unknown')
         return f"Debt {self.amount} {self.currency.code} for {owner}"
 
-    def save(self, *args, **kwargs):
-        super().save(*args, **kwargs)
-        # Update customer reputation and total debt when debt is created or updated
-        if self.customer:
-            self.customer.update_reputation()
-            self.customer.update_total_debt()
-        elif self.company:
-            self.company.update_total_debt()
+    def _previous_ledger_entry(self):
+        """The stored row as the ledger last saw it; read on writes only, so loading debts stays free"""
+        from .ledger import LedgerEntry
+        if self._state.adding or self.pk is None:
+            return None
+        return LedgerEntry.for_pk(self.pk)
 
-    class Meta:
-        ordering = ['-created_at']
+    def save(self, *args, **kwargs):
+        # Fold the change into the customer/company aggregates in the same transaction
+        from . import ledger
+        ledger.post(self._previous_ledger_entry(), self, lambda: super(Debt, self).save(*args, **kwargs))
 
-
-class AuditLog(models.Model):
-    ACTION_CHOICES = (
-        ("create", "Create"),
-        ("delete", "Delete"),
-    )
-    action = models.CharField(max_length=16, choices=ACTION_CHOICES)
-    entity_type = models.CharField(max_length=32)  # 'customer' | 'company' | 'debt'
-    entity_id = models.IntegerField()
-    description = models.CharField(max_length=255, blank=True)
-    amount = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
-    created_at = models.DateTimeField(auto_now_add=True)
+    def delete(self, *args, **kwargs):
+        from . import ledger
+        return ledger.post(self._previous_ledger_entry(), None, lambda: super(Debt, self).delete(*args, **kwargs))
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Entity debt lists (newest first) and the ledger's per-owner scans
+            models.Index(fields=['customer', '-created_at'], name='debt_customer_created_idx'),
+            models.Index(fields=['company', '-created_at'], name='debt_company_created_idx'),
+            # Earliest due date per owner
+            models.Index(fields=['customer', 'due_date'], name='debt_customer_due_idx'),
+            models.Index(fields=['company', 'due_date'], name='debt_company_due_idx'),
+            # Unsettled debts: overdue checks and oldest unsettled debt
+            models.Index(fields=['customer', 'due_date'], condition=models.Q(is_settled=False),
+                         name='debt_cust_unsettled_due_idx'),
+            models.Index(fields=['customer', 'created_at'], condition=models.Q(is_settled=False),
+                         name='debt_cust_unsettled_idx'),
+            models.Index(fields=['company', 'created_at'], condition=models.Q(is_settled=False),
+                         name='debt_comp_unsettled_idx'),
+            # Payments (negative amounts) inside the reputation window
+            models.Index(fields=['customer', 'created_at'], condition=models.Q(amount__lt=0),
+                         name='debt_cust_payment_idx'),
+            # Payments leaving the reputation window across all customers (run_scheduler)
+            models.Index(fields=['created_at'], condition=models.Q(amount__lt=0), name='debt_payment_created_idx'),
+        ]
 
 
 class PaymentPlan(TimestampedModel):
@@ -298,8 +261,8 @@ class PaymentPlan(TimestampedModel):
         ordering = ['manual_priority', 'remaining_debt']
 
 
-class PaymentSchedule(TimestampedModel):
-    payment_plan = models.ForeignKey(PaymentPlan, on_delete=models.CASCADE, related_name='schedules')
+class ScheduleRecord(TimestampedModel):
+    """Columns shared by payment schedules and their archive"""
     scheduled_date = models.DateField()
     scheduled_amount = models.DecimalField(max_digits=12, decimal_places=2)
     actual_amount = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
@@ -310,9 +273,36 @@ class PaymentSchedule(TimestampedModel):
         return f"Payment {self.scheduled_date} - ${self.scheduled_amount}"
 
     class Meta:
+        abstract = True
         ordering = ['scheduled_date']
 
 
+class PaymentSchedule(ScheduleRecord):
+    payment_plan = models.ForeignKey(PaymentPlan, on_delete=models.CASCADE, related_name='schedules')
+
+    class Meta(ScheduleRecord.Meta):
+        indexes = [
+            models.Index(fields=['payment_plan', 'scheduled_date'], name='schedule_plan_date_idx'),
+            # Date range filters walked in keyset order
+            models.Index(fields=['scheduled_date', 'id'], name='schedule_date_idx'),
+        ]
+
+
+class PaymentScheduleArchive(ScheduleRecord):
+    """Paid schedules moved out of PaymentSchedule by `manage.py archive`, see core.archive"""
+    id = models.BigIntegerField(primary_key=True)  # Keeps the id the schedule had
+    payment_plan = models.ForeignKey(PaymentPlan, on_delete=models.CASCADE, related_name='archived_schedules')
+    # Copied as they were, not stamped again
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+
+    class Meta(ScheduleRecord.Meta):
+        indexes = [
+            models.Index(fields=['payment_plan', 'scheduled_date'], name='schedule_arch_plan_date_idx'),
+            models.Index(fields=['scheduled_date', 'id'], name='schedule_arch_date_idx'),
+        ]
+
+
 class DailyBalance(TimestampedModel):
     date = models.DateField(unique=True)
     available_amount = models.DecimalField(max_digits=12, decimal_places=2)
@@ -336,9 +326,14 @@ class ShopMoney(TimestampedModel):
         unique_together = ['user']  # Each user can have only one shop money record
 
 
-class EntityActivity(TimestampedModel):
-    """Track all activities for customers and companies"""
-    ACTIVITY_TYPES = [
+class EventRecord(models.Model):
+    """Columns shared by the event journal and its archive"""
+    ACTION_CHOICES = (
+        ("create", "Create"),
+        ("update", "Update"),
+        ("delete", "Delete"),
+    )
+    KIND_CHOICES = [
         ('debt_created', 'Debt Created'),
         ('debt_updated', 'Debt Updated'),
         ('debt_deleted', 'Debt Deleted'),
@@ -348,21 +343,121 @@ class EntityActivity(TimestampedModel):
         ('profile_deleted', 'Profile Deleted'),
     ]
 
-    # Either customer or company must be set
-    customer = models.ForeignKey('Customer', null=True, blank=True, on_delete=models.CASCADE, related_name='activities')
-    company = models.ForeignKey('Company', null=True, blank=True, on_delete=models.CASCADE, related_name='activities')
-
-    activity_type = models.CharField(max_length=20, choices=ACTIVITY_TYPES)
-    description = models.CharField(max_length=255)
+    action = models.CharField(max_length=16, choices=ACTION_CHOICES)
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    entity_type = models.CharField(max_length=32)  # 'customer' | 'company' | 'debt' | 'payment'
+    entity_id = models.IntegerField()
+    description = models.CharField(max_length=255, blank=True)
     amount = models.DecimalField(max_digits=15, decimal_places=3, null=True, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.get_kind_display()} {self.entity_type} {self.entity_id}: {self.description}"
+
+    class Meta:
+        abstract = True
+        ordering = ['-created_at']
 
-    # Reference to the related object (debt, etc.)
-    related_object_type = models.CharField(max_length=50, blank=True)  # 'debt', 'customer', 'company'
-    related_object_id = models.IntegerField(null=True, blank=True)
+
+class Event(EventRecord):
+    """Append-only journal of changes, read as the audit log and the entity activity feed (see core.journal)"""
+    # Owner of the changed entity - the audit log is filtered on it without joins
+    user = models.ForeignKey('auth.User', null=True, blank=True, on_delete=models.CASCADE, related_name='events')
+
+    # Customer or company the change belongs to. Events outlive them, so there is
+    # no constraint and deleting an entity never rewrites the journal.
+    customer = models.ForeignKey('Customer', null=True, blank=True, on_delete=models.DO_NOTHING,
+                                 db_constraint=False, related_name='events')
+    company = models.ForeignKey('Company', null=True, blank=True, on_delete=models.DO_NOTHING,
+                                db_constraint=False, related_name='events')
+
+    class Meta(EventRecord.Meta):
+        indexes = [
+            # Per-user journal walked newest first by the keyset cursor
+            models.Index(fields=['user', '-created_at', '-id'], name='event_user_created_idx'),
+            models.Index(fields=['entity_type', 'entity_id', '-created_at'], name='event_entity_idx'),
+            # Activity feed of one customer or company
+            models.Index(fields=['customer', '-created_at'], name='event_customer_created_idx'),
+            models.Index(fields=['company', '-created_at'], name='event_company_created_idx'),
+            # Cold rows picked by `manage.py archive`
+            models.Index(fields=['created_at', 'id'], name='event_created_idx'),
+        ]
+
+
+class EventArchive(EventRecord):
+    """Events moved out of the journal by `manage.py archive`, see core.archive"""
+    id = models.BigIntegerField(primary_key=True)  # Keeps the id the event had
+    user = models.ForeignKey('auth.User', null=True, blank=True, on_delete=models.CASCADE,
+                             related_name='archived_events')
+    customer = models.ForeignKey('Customer', null=True, blank=True, on_delete=models.DO_NOTHING,
+                                 db_constraint=False, related_name='+')
+    company = models.ForeignKey('Company', null=True, blank=True, on_delete=models.DO_NOTHING,
+                                db_constraint=False, related_name='+')
+
+    class Meta(EventRecord.Meta):
+        indexes = [
+            models.Index(fields=['user', '-created_at', '-id'], name='event_arch_user_created_idx'),
+            models.Index(fields=['entity_type', 'entity_id', '-created_at'], name='event_arch_entity_idx'),
+            models.Index(fields=['customer', '-created_at'], name='event_arch_customer_idx'),
+            models.Index(fields=['company', '-created_at'], name='event_arch_company_idx'),
+        ]
+
+
+class DashboardSummary(TimestampedModel):
+    """Per-user dashboard figures, kept current by core.dashboard on every ledger write"""
+    user = models.OneToOneField('auth.User', on_delete=models.CASCADE, related_name='dashboard_summary')
+    total_receivables = models.DecimalField(max_digits=15, decimal_places=3, default=0)  # Sum of customer debts
+    total_payables = models.DecimalField(max_digits=15, decimal_places=3, default=0)  # Sum of company debts
+    shop_money = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    customer_count = models.IntegerField(default=0)
+    company_count = models.IntegerField(default=0)
+    reputation_counts = models.JSONField(default=dict)  # {'good': 3, ...}
+    top_customers = models.JSONField(default=list)  # [{'id', 'name', 'total_debt'}] by total_debt desc
+    top_companies = models.JSONField(default=list)
+    customer_due_dates = models.JSONField(default=dict)  # {'2030-01-31': entities whose earliest due date it is}
+    company_due_dates = models.JSONField(default=dict)
 
     def __str__(self):
-        entity_name = self.customer.name if self.customer else (self.company.name if self.company else 'Unknown')
-        return f"{entity_name} - {self.get_activity_type_display()}: {self.description}"
+        return f"Dashboard for {self.user.username}"
+
+
+class Job(TimestampedModel):
+    """Background job run by `manage.py run_worker`, see core.jobs"""
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    user = models.ForeignKey('auth.User', on_delete=models.CASCADE, related_name='jobs')
+    kind = models.CharField(max_length=50)  # Handler name registered with core.jobs.handler
+    payload = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    result = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    error = models.TextField(blank=True)
+    attempts = models.IntegerField(default=0)
+    worker = models.CharField(max_length=100, blank=True)  # host:pid of the worker that ran it
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Job {self.pk} {self.kind} ({self.status})"
 
     class Meta:
-        ordering = ['-created_at']
\ No newline at end of file
+        ordering = ['-created_at']
+        indexes = [
+            # Worker queue scan, oldest queued first
+            models.Index(fields=['status', 'created_at'], name='job_status_created_idx'),
+            # Per-user job list walked by the keyset cursor
+            models.Index(fields=['user', '-created_at', '-id'], name='job_user_created_idx'),
+        ]
+
+
+class SchedulerRun(TimestampedModel):
+    """Last completed run of a periodic task of `manage.py run_scheduler`"""
+    name = models.CharField(max_length=50, unique=True)
+    last_run_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.name} at {self.last_run_at}"
@@ -0,0 +1,171 @@
+"""
+Keyset (cursor) pagination helpers.
+
+A cursor is an opaque token holding the ordering values of the last row of a
+page, so the next page is fetched with an indexed range condition instead of
+an OFFSET scan.
+"""
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.encoders import JSONEncoder
+from rest_framework.utils.urls import replace_query_param
+
+
+def encode_cursor(values):
+    """Encode the ordering values of a row as an opaque cursor token."""
+    payload = json.dumps(list(values), cls=JSONEncoder, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token, model, fields):
+    """
+    Decode a cursor token into the ordering values of `fields` on `model`.
+
+    Each value is converted with its model field, so a tampered cursor raises
+    ValueError here instead of failing while the range filter is built.
+    """
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+    except (TypeError, ValueError, UnicodeDecodeError) as exc:
+        raise ValueError('Invalid cursor') from exc
+    if not isinstance(values, list) or len(values) != len(fields):
+        raise ValueError('Invalid cursor')
+    try:
+        values = [_model_field(model, field).to_python(value) for field, value in zip(fields, values)]
+    except (ValidationError, TypeError, ValueError) as exc:
+        raise ValueError('Invalid cursor') from exc
+    if any(value is None for value in values):
+        raise ValueError('Invalid cursor')
+    return values
+
+
+def _model_field(model, path):
+    *relations, name = path.split('__')
+    for relation in relations:
+        model = model._meta.get_field(relation).related_model
+    return model._meta.get_field(name)
+
+
+def keyset_filter(queryset, fields, values, descending=False):
+    """
+    Restrict a queryset to the rows that come after `values` in `fields` order.
+
+    For fields (a, b) ascending this is: a > x OR (a = x AND b > y).
+    """
+    lookup = 'lt' if descending else 'gt'
+    condition = Q()
+    for index, field in enumerate(fields):
+        step = Q(**{f'{field}__{lookup}': values[index]})
+        for previous, value in zip(fields[:index], values[:index]):
+            step &= Q(**{previous: value})
+        condition |= step
+    return queryset.filter(condition)
+
+
+def keyset_page(queryset, fields, cursor=None, page_size=50, descending=False):
+    """
+    Fetch one keyset page.
+
+    Args:
+        queryset: Base queryset (ordering is replaced)
+        fields: Ordering fields, the last one must be unique (e.g. 'id')
+        cursor: Token returned as next_cursor by the previous page
+        page_size: Maximum number of rows in the page
+        descending: Walk the ordering from newest to oldest
+
+    Returns:
+        Tuple of (rows, next_cursor) where next_cursor is None on the last page
+    """
+    if cursor:
+        queryset = keyset_filter(queryset, fields, decode_cursor(cursor, queryset.model, fields), descending)
+    ordering = [f'-{field}' if descending else field for field in fields]
+    rows = list(queryset.order_by(*ordering)[:page_size + 1])
+
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        last = rows[-1]
+        next_cursor = encode_cursor(_resolve(last, field) for field in fields)
+    return rows, next_cursor
+
+
+def _resolve(row, field):
+    for part in field.split('__'):
+        row = getattr(row, part)
+    return row
+
+
+class KeysetPagination(BasePagination):
+    """
+    DRF pagination walking `ordering` with keyset_page.
+
+    All ordering fields must share one direction and the last one must be
+    unique. Responses are {'next': url or None, 'results': [...]}. Passing
+    ?page=N falls back to classic page-number pagination over the same
+    ordering for older clients.
+    """
+    ordering = ('-created_at', '-id')
+    page_size = api_settings.PAGE_SIZE or 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+    cursor_query_param = 'cursor'
+    page_query_param = 'page'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_paginator = None
+        if self.page_query_param in request.query_params:
+            self.page_paginator = PageNumberPagination()
+            self.page_paginator.page_size = self.get_page_size(request)
+            self.page_paginator.page_query_param = self.page_query_param
+            return self.page_paginator.paginate_queryset(queryset.order_by(*self.ordering), request, view)
+
+        descending = self.ordering[0].startswith('-')
+        fields = [field.lstrip('-') for field in self.ordering]
+        cursor = request.query_params.get(self.cursor_query_param)
+        try:
+            rows, self.next_cursor = keyset_page(queryset, fields, cursor, self.get_page_size(request), descending)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+        return rows
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except ValueError:
+            return self.page_size
+        return min(max(size, 1), self.max_page_size)
+
+    def get_next_link(self):
+        if self.next_cursor is None:
+            return None
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, self.next_cursor)
+
+    def get_paginated_response(self, data):
+        if self.page_paginator is not None:
+            return self.page_paginator.get_paginated_response(data)
+        return Response({'next': self.get_next_link(), 'results': data})
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+class ScheduleKeysetPagination(KeysetPagination):
+    """Keyset pagination over payment schedules, earliest date first."""
+    ordering = ('scheduled_date', 'id')
@@ -1,6 +1,11 @@
 from decimal import Decimal
 from datetime import datetime, timedelta
 from typing import List, Dict, Tuple
+import math
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from . import dashboard
 from .models import PaymentPlan, PaymentSchedule, DailyBalance, Customer, Company
 
 
@@ -13,6 +18,10 @@ class PaymentPlanner:
     def __init__(self):
         # Priority weights (1 = highest, 3 = lowest)
         self.priority_weights = {1: 3.0, 2: 2.0, 3: 1.0}
+        # Rows per INSERT when persisting a plan
+        self.bulk_batch_size = 500
+        # Allocation engines accepted by schedule_payments
+        self.engines = {'fixed': '_allocate_fixed', 'decimal': '_allocate_decimal', 'numpy': '_allocate_numpy'}
     
     def calculate_debt_priority(self, total_debt: Decimal, paid_amount: Decimal, 
                               manual_priority: int) -> float:
@@ -33,7 +42,6 @@ class PaymentPlanner:
         # Use logarithmic scale to balance distribution across many companies
         # This ensures 8-12 companies get paid each day instead of just 1-2
         # log10(10000) = 4, log10(100) = 2, log10(1000) = 3
-        import math
         debt_amount_score = math.log10(max(float(remaining_debt), 1)) + 1
         
         # Final score: multiply base priority by logarithmic debt amount
@@ -42,25 +50,26 @@ class PaymentPlanner:
         return final_score
     
     def generate_payment_plan(self, daily_balances: Dict[str, Decimal], 
-                            debts: List[Dict]) -> Dict:
+                            debts: List[Dict], user, engine: str = None) -> Dict:
         """
         Generate payment plan prioritizing by debt amount.
         
         Args:
             daily_balances: Dict with date strings as keys and available amounts as values
             debts: List of debt dictionaries with company, totalDebt, paid, manualPriority
+            user: Owner of the companies/customers named in debts
+            engine: Allocation engine, see schedule_payments
         
         Returns:
             Dict containing payment plans and schedules
         """
-        # Sort dates chronologically
-        sorted_dates = sorted(daily_balances.keys())
+        # Find or create every customer/company named in the request up front
+        entities = self._resolve_entities(debts, user)
         
         # Create payment plans for each debt
         payment_plans = []
         for debt in debts:
-            # Find or create customer/company
-            entity = self._get_or_create_entity(debt)
+            entity = entities[self._entity_name(debt)]
             
             # Calculate remaining debt
             remaining_debt = Decimal(str(debt['totalDebt'])) - Decimal(str(debt['paid']))
@@ -77,27 +86,89 @@ class PaymentPlanner:
                 )
                 payment_plans.append(plan)
         
+        return self.schedule_payments(payment_plans, daily_balances, engine)
+    
+    def schedule_payments(self, payment_plans: List[PaymentPlan],
+                          daily_balances: Dict[str, Decimal], engine: str = None) -> Dict:
+        """
+        Split each day's balance across the plans in proportion to their priority score.
+        
+        Args:
+            payment_plans: Unsaved plans; their paid/remaining amounts are advanced in place
+            daily_balances: Dict with date strings as keys and available amounts as values
+            engine: 'fixed' (integer minor units) or 'decimal' (reference implementation),
+                    which produce identical schedules, or 'numpy' (vectorized, rounds each
+                    day with largest remainders). Defaults to settings.PAYMENT_PLANNER_ENGINE
+        
+        Returns:
+            Dict containing payment plans and schedules
+        """
+        engine = engine or getattr(settings, 'PAYMENT_PLANNER_ENGINE', 'fixed')
+        if engine not in self.engines:
+            raise ValueError(f"Unknown payment planner engine: {engine}")
+        
+        # Sort dates chronologically and skip days without money
+        days = []
+        for date_str in sorted(daily_balances.keys()):
+            available_amount = daily_balances[date_str]
+            if available_amount > 0:
+                days.append((datetime.strptime(date_str, '%Y-%m-%d').date(), available_amount))
+        
+        allocations, paid = getattr(self, self.engines[engine])(payment_plans, days)
+        
         # Generate daily payment schedules
-        schedules = []
+        schedules = [
+            PaymentSchedule(
+                payment_plan=payment_plans[index],
+                scheduled_date=date,
+                scheduled_amount=amount,
+                is_paid=False
+            )
+            for date, index, amount in allocations
+        ]
+        
+        # Update remaining amounts
         total_scheduled = Decimal('0')
+        for plan, plan_paid in zip(payment_plans, paid):
+            plan.remaining_debt -= plan_paid
+            plan.paid_amount += plan_paid
+            total_scheduled += plan_paid
         
-        for date_str in sorted_dates:
-            date = datetime.strptime(date_str, '%Y-%m-%d').date()
-            available_amount = daily_balances[date_str]
-            
-            if available_amount <= 0:
-                continue
-            
+        # Calculate total available money
+        total_available = sum(daily_balances.values())
+        
+        return {
+            'payment_plans': payment_plans,
+            'schedules': schedules,
+            'total_scheduled': total_scheduled,
+            'total_available': total_available,
+            'utilization_rate': float(total_scheduled / total_available) if total_available > 0 else 0
+        }
+    
+    def _allocate_decimal(self, payment_plans: List[PaymentPlan], days: List[Tuple]) -> Tuple[List, List]:
+        """
+        Reference allocation on Decimals.
+        
+        Returns (allocations, paid) where allocations is a list of
+        (date, plan index, amount) and paid the total scheduled per plan.
+        """
+        total_debt = [plan.total_debt for plan in payment_plans]
+        paid_amount = [plan.paid_amount for plan in payment_plans]
+        remaining_debt = [plan.remaining_debt for plan in payment_plans]
+        paid = [Decimal('0')] * len(payment_plans)
+        allocations = []
+        
+        for date, available_amount in days:
             # Calculate priority scores for all debts with remaining balance
             debt_priorities = []
-            for plan in payment_plans:
-                if plan.remaining_debt > 0:
+            for index, plan in enumerate(payment_plans):
+                if remaining_debt[index] > 0:
                     priority_score = self.calculate_debt_priority(
-                        plan.total_debt, 
-                        plan.paid_amount, 
+                        total_debt[index],
+                        paid_amount[index],
                         plan.manual_priority
                     )
-                    debt_priorities.append((plan, priority_score))
+                    debt_priorities.append((index, priority_score))
             
             # Sort by priority score (HIGHEST FIRST)
             # This means largest debts with high priority come first
@@ -108,59 +179,247 @@ class PaymentPlanner:
             
             if total_priority_weight > 0:
                 # Distribute money proportionally based on priority scores
-                for plan, priority_score in debt_priorities:
+                for index, priority_score in debt_priorities:
                     # Calculate proportional share of available money
                     # Higher priority = larger share
                     proportion = priority_score / total_priority_weight
                     allocated_amount = available_amount * Decimal(str(proportion))
                     
                     # Don't pay more than remaining debt
-                    payment_amount = min(allocated_amount, plan.remaining_debt)
+                    payment_amount = min(allocated_amount, remaining_debt[index])
                     
                     if payment_amount > 0:
                         # Round to 2 decimal places
                         payment_amount = payment_amount.quantize(Decimal('0.01'))
-                        
-                        # Create payment schedule
-                        schedule = PaymentSchedule(
-                            payment_plan=plan,
-                            scheduled_date=date,
-                            scheduled_amount=payment_amount,
-                            is_paid=False
-                        )
-                        schedules.append(schedule)
+                        allocations.append((date, index, payment_amount))
                         
                         # Update remaining amounts
-                        plan.remaining_debt -= payment_amount
-                        plan.paid_amount += payment_amount
-                        total_scheduled += payment_amount
+                        remaining_debt[index] -= payment_amount
+                        paid_amount[index] += payment_amount
+                        paid[index] += payment_amount
         
-        # Calculate total available money
-        total_available = sum(daily_balances.values())
+        return allocations, paid
+    
+    def _allocate_fixed(self, payment_plans: List[PaymentPlan], days: List[Tuple]) -> Tuple[List, List]:
+        """
+        Allocation on integer minor units, identical to _allocate_decimal.
         
-        return {
-            'payment_plans': payment_plans,
-            'schedules': schedules,
-            'total_scheduled': total_scheduled,
-            'total_available': total_available,
-            'utilization_rate': float(total_scheduled / total_available) if total_available > 0 else 0
-        }
+        Amounts are scaled to the smallest unit present in the input (cents or
+        finer), only plans with a balance are kept in the working set and
+        Decimals are rebuilt once for the output. Scores use the same float
+        operations in the same order as the reference, so every proportion and
+        therefore every rounded cent matches (the reference multiplies within
+        the default 28 digit Decimal context, which is exact for daily
+        balances below one billion).
+        """
+        scale = max([2] + [_decimal_places(plan.remaining_debt) for plan in payment_plans]
+                    + [_decimal_places(available) for _, available in days])
+        unit = 10 ** scale
+        per_cent = 10 ** (scale - 2)
+        
+        remaining = [_to_units(plan.remaining_debt, scale) for plan in payment_plans]
+        weights = [self.priority_weights.get(plan.manual_priority, 2.0) for plan in payment_plans]
+        scores = [0.0] * len(payment_plans)
+        paid_cents = [0] * len(payment_plans)
+        active = [index for index, units in enumerate(remaining) if units > 0]
+        cent_allocations = []
+        log10 = math.log10
+        
+        for date, available_amount in days:
+            if not active:
+                break
+            available = _to_units(available_amount, scale)
+            
+            # Same expression as calculate_debt_priority; int / int is correctly
+            # rounded just like float(Decimal)
+            for index in active:
+                scores[index] = weights[index] * (log10(max(remaining[index] / unit, 1)) + 1)
+            ordered = sorted(active, key=scores.__getitem__, reverse=True)
+            total_priority_weight = sum(scores[index] for index in ordered)
+            if total_priority_weight <= 0:
+                continue
+            
+            for index in ordered:
+                proportion = scores[index] / total_priority_weight
+                cents = _share_cents(available, proportion, remaining[index], per_cent)
+                if cents is None:
+                    continue
+                cent_allocations.append((date, index, cents))
+                remaining[index] -= cents * per_cent
+                paid_cents[index] += cents
+            
+            active = [index for index in active if remaining[index] > 0]
+        
+        allocations = [(date, index, Decimal(cents).scaleb(-2)) for date, index, cents in cent_allocations]
+        paid = [Decimal(cents).scaleb(-2) for cents in paid_cents]
+        return allocations, paid
     
-    def _get_or_create_entity(self, debt: Dict):
-        """Get or create customer/company entity from debt data."""
-        entity_name = debt.get('company', debt.get('customer', 'Unknown'))
+    def _allocate_numpy(self, payment_plans: List[PaymentPlan], days: List[Tuple]) -> Tuple[List, List]:
+        """
+        Vectorized allocation for large what-if plans.
         
-        # Try to find existing company first
+        Scores, proportions, caps at the remaining debt and rounding run as
+        array operations over all plans of a day. Instead of rounding every
+        share on its own, the day is rounded with largest remainders so the
+        cents handed out add up to the rounded day total; schedules can
+        therefore differ from the other engines by a cent per plan and day.
+        Shares capped at the remaining debt are rounded like the other
+        engines, so a sub-cent balance is never overpaid.
+        """
         try:
-            return Company.objects.get(name=entity_name)
-        except Company.DoesNotExist:
-            pass
+            import numpy as np
+        except ImportError:
+            raise ImproperlyConfigured("The 'numpy' payment planner engine requires numpy to be installed")
         
-        # Try to find existing customer
-        try:
-            return Customer.objects.get(name=entity_name)
-        except Customer.DoesNotExist:
-            pass
+        scale = max([2] + [_decimal_places(plan.remaining_debt) for plan in payment_plans]
+                    + [_decimal_places(available) for _, available in days])
+        unit = 10 ** scale
+        per_cent = 10 ** (scale - 2)
+        
+        remaining = np.array([_to_units(plan.remaining_debt, scale) for plan in payment_plans], dtype=np.int64)
+        weights = np.array([self.priority_weights.get(plan.manual_priority, 2.0) for plan in payment_plans],
+                           dtype=np.float64)
+        paid_cents = np.zeros(len(payment_plans), dtype=np.int64)
+        allocations = []
         
-        # Create new company if not found
-        return Company.objects.create(name=entity_name)
\ No newline at end of file
+        for date, available_amount in days:
+            active = np.flatnonzero(remaining > 0)
+            if not active.size:
+                break
+            available = _to_units(available_amount, scale)
+            
+            balance = remaining[active]
+            scores = weights[active] * (np.log10(np.maximum(balance / unit, 1)) + 1)
+            wanted = available * (scores / scores.sum())
+            shares = np.minimum(wanted, balance) / per_cent
+            
+            # A share capped at its balance pays the balance rounded half-even to
+            # cents, as in the other engines; no plan is ever paid more than that
+            whole, rest = np.divmod(balance, per_cent)
+            caps = whole + ((2 * rest > per_cent) | ((2 * rest == per_cent) & (whole % 2 == 1)))
+            capped = wanted >= balance
+            
+            # Largest remainder over the other shares: floor them, then give the
+            # leftover cents of the day to the largest fractional parts
+            cents = np.where(capped, caps, np.floor(shares).astype(np.int64))
+            free = np.flatnonzero(~capped)
+            fractions = shares[free] - cents[free]
+            leftover = int(np.rint(shares[free].sum())) - int(cents[free].sum())
+            if leftover > 0:
+                cents[free[np.argsort(-fractions, kind='stable')[:leftover]]] += 1
+            cents = np.minimum(cents, caps)
+            
+            # Emit in priority order like the other engines
+            for position in np.argsort(-scores, kind='stable'):
+                if cents[position] > 0:
+                    allocations.append((date, int(active[position]), Decimal(int(cents[position])).scaleb(-2)))
+            
+            remaining[active] -= cents * per_cent
+            paid_cents[active] += cents
+        
+        paid = [Decimal(int(value)).scaleb(-2) for value in paid_cents]
+        return allocations, paid
+    
+    def save_payment_plan(self, result: Dict, daily_balances: Dict[str, Decimal]) -> None:
+        """
+        Persist a generated plan in one transaction with bulk statements.
+
+        Plans and schedules are inserted with bulk_create (primary keys are
+        returned and set on the instances) and daily balances are upserted on
+        their unique date.
+        """
+        balances = [
+            DailyBalance(date=datetime.strptime(date_str, '%Y-%m-%d').date(), available_amount=amount)
+            for date_str, amount in daily_balances.items()
+        ]
+        with transaction.atomic():
+            PaymentPlan.objects.bulk_create(result['payment_plans'], batch_size=self.bulk_batch_size)
+            PaymentSchedule.objects.bulk_create(result['schedules'], batch_size=self.bulk_batch_size)
+            DailyBalance.objects.bulk_create(
+                balances,
+                batch_size=self.bulk_batch_size,
+                update_conflicts=True,
+                unique_fields=['date'],
+                update_fields=['available_amount', 'updated_at'],
+            )
+
+    def _entity_name(self, debt: Dict) -> str:
+        return debt.get('company', debt.get('customer', 'Unknown'))
+    
+    def _resolve_entities(self, debts: List[Dict], user) -> Dict:
+        """
+        Map every entity name in debts to one of the user's companies or customers.
+        
+        Companies win over customers with the same name, and names matching
+        neither are created as companies in one bulk insert, which drops the
+        user's dashboard summary.
+        """
+        names = {self._entity_name(debt) for debt in debts}
+        
+        entities = {}
+        for company in Company.objects.filter(user=user, name__in=names).order_by('pk'):
+            entities.setdefault(company.name, company)
+        
+        missing = names - entities.keys()
+        if missing:
+            for customer in Customer.objects.filter(user=user, name__in=missing).order_by('pk'):
+                entities.setdefault(customer.name, customer)
+        
+        # Create new companies if not found
+        missing = names - entities.keys()
+        if missing:
+            created = Company.objects.bulk_create([Company(user=user, name=name) for name in sorted(missing)])
+            entities.update((company.name, company) for company in created)
+            # bulk_create skips the ledger, so the cached summary misses the new companies
+            dashboard.invalidate(user)
+        
+        return entities
+
+def _decimal_places(value) -> int:
+    """Number of digits after the decimal point in a Decimal or int"""
+    exponent = Decimal(value).as_tuple().exponent
+    return -exponent if exponent < 0 else 0
+
+
+def _to_units(value, scale: int) -> int:
+    """Exact integer count of 10**-scale units in value"""
+    return int(Decimal(value).scaleb(scale))
+
+
+def _share_cents(available: int, proportion: float, remaining: int, per_cent: int):
+    """
+    Cents paid to one plan: min(available * proportion, remaining) rounded half-even.
+    
+    The reference multiplies by Decimal(str(proportion)), which differs from
+    the float's exact binary value by at most half an ulp (proportion <= 1).
+    The cheap binary fraction is used unless the result lies within that
+    error of a decision boundary, in which case the decimal string is used.
+    Returns None when nothing is allocated.
+    """
+    numerator, denominator = proportion.as_integer_ratio()
+    if numerator <= 0:
+        return None
+    product = available * numerator
+    limit = remaining * denominator
+    tolerance = available * denominator
+    if abs(product - limit) << 52 > tolerance:
+        if product > limit:
+            return _round_half_even(remaining, per_cent)
+        divisor = denominator * per_cent
+        quotient, remainder = divmod(product, divisor)
+        if abs(2 * remainder - divisor) << 52 > 2 * tolerance:
+            return quotient + 1 if 2 * remainder > divisor else quotient
+    
+    # Too close to call with the binary value - use the exact decimal string
+    numerator, denominator = Decimal(repr(proportion)).as_integer_ratio()
+    if available * numerator >= remaining * denominator:
+        return _round_half_even(remaining, per_cent)
+    return _round_half_even(available * numerator, denominator * per_cent)
+
+
+def _round_half_even(numerator: int, denominator: int) -> int:
+    """numerator / denominator rounded half-even, like Decimal.quantize"""
+    quotient, remainder = divmod(numerator, denominator)
+    if 2 * remainder > denominator or (2 * remainder == denominator and quotient % 2):
+        quotient += 1
+    return quotient
@@ -0,0 +1,153 @@
+from datetime import timedelta
+from decimal import Decimal
+
+
+# Reputation looks at payment behaviour over a sliding 30 day window
+REPUTATION_WINDOW = timedelta(days=30)
+
+# Customer fields written by refresh_reputations
+REPUTATION_FIELDS = ['total_paid_30_days', 'unsettled_debt', 'oldest_unsettled_at', 'paid_window_at',
+                     'last_payment_date', 'reputation', 'reputation_score']
+
+
+def last_payment():
+    """
+    Aggregate for Customer.last_payment_date: the newest payment of the whole ledger.
+
+    The single definition used by the incremental ledger, its full recompute
+    and the reputation refresh, so none of them rewrites another's value.
+    """
+    from django.db.models import Max, Q
+
+    return Max('created_at', filter=Q(amount__lt=0))
+
+
+def score_reputation(current_debt, total_paid, oldest_unsettled_at, window_start):
+    """
+    Score a customer from their ledger aggregates.
+
+    Args:
+        current_debt: Sum of all unsettled debt amounts
+        total_paid: Absolute amount paid inside the reputation window
+        oldest_unsettled_at: created_at of the oldest unsettled debt (or None)
+        window_start: Start of the reputation window (now - 30 days)
+
+    Returns:
+        Tuple of (reputation_score, reputation)
+    """
+    current_debt = current_debt or Decimal('0')
+    total_paid = total_paid or Decimal('0')
+
+    if current_debt == 0:
+        # No debt = excellent
+        return 100, 'excellent'
+
+    if oldest_unsettled_at and oldest_unsettled_at < window_start:
+        # Has debt older than 30 days - check payment behavior
+        if total_paid > 0:
+            # Has made payments - calculate based on payment ratio
+            payment_ratio = float(total_paid) / float(current_debt + total_paid)
+            if payment_ratio >= 0.5:  # Paid at least 50% of total debt
+                return 80, 'good'
+            if payment_ratio >= 0.25:  # Paid at least 25%
+                return 60, 'fair'
+            # Paid less than 25%
+            return 30, 'poor'
+        # Has debt older than 30 days with no payments = bad
+        return 10, 'bad'
+
+    # Has debt but it's less than 30 days old = good (new debt, give them time)
+    # This gives new customers a fair chance before being penalized
+    return 70, 'good'
+
+
+def refresh_reputations(customers, now=None, batch_size=500):
+    """
+    Recompute reputation for many customers with grouped aggregate queries.
+
+    Each batch of customers costs one GROUP BY over their debts plus one
+    bulk_update, instead of several queries and a full save per customer.
+    A batch is locked (select_for_update) before it is aggregated and commits
+    on its own, so a concurrent ledger.post waits for it instead of having its
+    delta overwritten, and debt writes are only held up for one batch.
+
+    Args:
+        customers: Customer queryset to refresh
+        now: Reference time for the 30 day window (defaults to timezone.now())
+        batch_size: Number of customers aggregated and written per batch
+
+    Returns:
+        Number of customers updated
+    """
+    from django.utils import timezone
+
+    now = now or timezone.now()
+    pks = list(customers.order_by('pk').values_list('pk', flat=True))
+    updated = 0
+    for start in range(0, len(pks), batch_size):
+        updated += _refresh_batch(pks[start:start + batch_size], now)
+    return updated
+
+
+def window_rollovers(since, now):
+    """
+    Customers whose reputation may have changed between `since` and `now` without any debt write.
+
+    Stored reputations only move when a debt is written, but the 30 day window
+    keeps sliding: a payment can age out of it, and the oldest unsettled debt can
+    age past it. Both happen exactly when the timestamp falls in
+    [since - 30 days, now - 30 days), which is an indexed range scan rather than
+    a pass over every customer.
+    """
+    from django.db.models import Q
+    from .models import Customer, Debt
+
+    lower, upper = since - REPUTATION_WINDOW, now - REPUTATION_WINDOW
+    aged_debt = Customer.objects.filter(oldest_unsettled_at__gte=lower, oldest_unsettled_at__lt=upper).values('pk')
+    aged_payments = Debt.objects.filter(amount__lt=0, created_at__gte=lower, created_at__lt=upper,
+                                        customer__isnull=False).values('customer_id')
+    return Customer.objects.filter(Q(pk__in=aged_debt) | Q(pk__in=aged_payments))
+
+
+def _refresh_batch(pks, now):
+    from django.db import transaction
+    from .models import Customer
+
+    with transaction.atomic():
+        # Same lock order as ledger.post: customers by pk
+        customers = list(Customer.objects.select_for_update().filter(pk__in=pks).order_by('pk')
+                         .only('pk', *REPUTATION_FIELDS))
+        _score_batch(customers, now)
+        Customer.objects.bulk_update(customers, REPUTATION_FIELDS)
+    return len(customers)
+
+
+def _score_batch(customers, now):
+    from django.db.models import Min, Q, Sum
+    from .models import Debt
+
+    window_start = now - REPUTATION_WINDOW
+    unsettled = Q(is_settled=False)
+    recent_payments = Q(amount__lt=0, created_at__gte=window_start)
+
+    rows = Debt.objects.filter(customer_id__in=[c.pk for c in customers]) \
+        .order_by() \
+        .values('customer_id') \
+        .annotate(
+            total_paid=Sum('amount', filter=recent_payments),
+            current_debt=Sum('amount', filter=unsettled),
+            oldest_unsettled_at=Min('created_at', filter=unsettled),
+            last_payment_date=last_payment(),
+        )
+    aggregates = {row['customer_id']: row for row in rows}
+
+    for customer in customers:
+        row = aggregates.get(customer.pk, {})
+        customer.total_paid_30_days = abs(row.get('total_paid') or Decimal('0'))
+        customer.unsettled_debt = row.get('current_debt') or Decimal('0')
+        customer.oldest_unsettled_at = row.get('oldest_unsettled_at')
+        customer.paid_window_at = now
+        customer.last_payment_date = row.get('last_payment_date')
+        customer.reputation_score, customer.reputation = score_reputation(
+            customer.unsettled_debt, customer.total_paid_30_days, customer.oldest_unsettled_at, window_start,
+        )
@@ -0,0 +1,124 @@
+"""
+Versioned response cache for read-mostly endpoints.
+
+Cached bodies are keyed by (user, path, query, data version). The data
+version pairs a per-user counter, bumped whenever one of the user's debts,
+customers, companies, payment plans or payment schedules changes, with a global counter for
+the shared daily balances and currencies. A write therefore makes every older
+entry unreachable instead of waiting for a TTL; the cache timeout only
+reclaims the orphaned entries.
+
+The ETag is derived from the key alone, so a matching If-None-Match is
+answered with 304 before the cache or the database is read.
+"""
+import functools
+import hashlib
+import time
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.request import Request
+from rest_framework.response import Response
+
+from .models import Debt, PaymentPlan, PaymentSchedule
+
+
+GLOBAL = 'global'
+
+
+def _version_key(scope):
+    return f'response_version:{scope}'
+
+
+def versions(user):
+    """Current (user, global) data versions, initialising missing counters."""
+    keys = [_version_key(user.pk if user.is_authenticated else 'anon'), _version_key(GLOBAL)]
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            # Start from the clock, so an evicted counter never reuses an old version
+            cache.add(key, time.time_ns(), None)
+            found[key] = cache.get(key)
+    return tuple(found[key] for key in keys)
+
+
+def bump(user_id=GLOBAL):
+    """Invalidate the user's cached responses (or the shared ones) once the transaction commits."""
+    def increment():
+        key = _version_key(user_id)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, time.time_ns(), None)
+    transaction.on_commit(increment)
+
+
+def cached_response(view):
+    """
+    Cache the data of successful GET responses of a view function or method.
+
+    Responses carry an ETag and `Cache-Control: private, no-cache`, so clients
+    revalidate on every use and get a 304 while the data is unchanged.
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        request = args[0] if isinstance(args[0], Request) else args[1]
+        if request.method != 'GET':
+            return view(*args, **kwargs)
+
+        user_version, global_version = versions(request.user)
+        query = urlencode(sorted(request.query_params.lists()), doseq=True)
+        digest = hashlib.sha1(f'{request.path}?{query}'.encode()).hexdigest()
+        owner = request.user.pk if request.user.is_authenticated else 'anon'
+        key = f'response:{owner}:{digest}:{user_version}:{global_version}'
+        etag = f'"{hashlib.sha1(key.encode()).hexdigest()}"'
+
+        if etag in parse_etags(request.headers.get('If-None-Match', '')):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            data = cache.get(key)
+            if data is None:
+                response = view(*args, **kwargs)
+                if response.status_code != status.HTTP_200_OK:
+                    return response
+                cache.set(key, response.data, getattr(settings, 'RESPONSE_CACHE_TIMEOUT', 86400))
+            else:
+                response = Response(data)
+        response['ETag'] = etag
+        response['Cache-Control'] = 'private, no-cache'
+        return response
+    return wrapper
+
+
+def _owner(instance, *paths):
+    """User id reached through the first non-null path of FK attributes."""
+    for path in paths:
+        target = instance
+        for part in path.split('.'):
+            target = getattr(target, part)
+            if target is None:
+                break
+        else:
+            return target
+    return None
+
+
+def bump_owner(sender, instance, **kwargs):
+    """post_save/post_delete receiver for the per-user models."""
+    if sender is PaymentSchedule:
+        user_id = _owner(instance, 'payment_plan.customer.user_id', 'payment_plan.company.user_id')
+    elif sender in (Debt, PaymentPlan):
+        user_id = _owner(instance, 'customer.user_id', 'company.user_id')
+    else:
+        user_id = instance.user_id
+    if user_id is not None:
+        bump(user_id)
+
+
+def bump_global(sender, instance, **kwargs):
+    """post_save/post_delete receiver for the shared models."""
+    bump()
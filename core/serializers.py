@@ -3,7 +3,8 @@ from django.contrib.auth import authenticate
 from django.contrib.auth.password_validation import validate_password
 from django.contrib.auth.models import User
 from decimal import Decimal
-from .models import UserProfile, Customer, Company, Debt, AuditLog, PaymentPlan, PaymentSchedule, DailyBalance, ShopMoney, EntityActivity, Currency
+from .models import UserProfile, Customer, Company, Debt, Event, PaymentPlan, PaymentSchedule, DailyBalance, ShopMoney, Currency, Job
+from . import credit
 
 
 
@@ -128,6 +129,9 @@ class CustomerSerializer(serializers.ModelSerializer):
         read_only_fields = ["user", "total_debt", "reputation", "reputation_score", "last_payment_date", "total_paid_30_days", "payment_streak_days"]
 
     def get_earliest_due_date(self, obj):
+        # Annotated by the viewset queryset; query only for plain instances
+        if hasattr(obj, 'earliest_due_date'):
+            return obj.earliest_due_date
         return obj.get_earliest_due_date()
 
     def validate_name(self, value):
@@ -153,6 +157,9 @@ class CompanySerializer(serializers.ModelSerializer):
         read_only_fields = ["user", "total_debt"]
 
     def get_earliest_due_date(self, obj):
+        # Annotated by the viewset queryset; query only for plain instances
+        if hasattr(obj, 'earliest_due_date'):
+            return obj.earliest_due_date
         return obj.get_earliest_due_date()
 
     def validate_name(self, value):
@@ -194,9 +201,9 @@ class DebtSerializer(serializers.ModelSerializer):
         # Only check credit control for new POSITIVE debt to customers (unless overridden)
         # Payments (negative amounts) should always be allowed
         if customer and amount > 0 and not self.instance and not data.get('override'):
-            can_receive, reason = customer.can_receive_new_debt()
-            if not can_receive:
-                raise serializers.ValidationError(f"Cannot increase debt: {reason}")
+            decision = credit.decide(customer)
+            if not decision.allowed:
+                raise serializers.ValidationError(f"Cannot increase debt: {decision.reason}")
 
         return data
 
@@ -208,7 +215,7 @@ class DebtSerializer(serializers.ModelSerializer):
 
 class AuditLogSerializer(serializers.ModelSerializer):
     class Meta:
-        model = AuditLog
+        model = Event
         fields = ["id", "action", "entity_type", "entity_id", "description", "amount", "created_at"]
 
 
@@ -254,6 +261,26 @@ class PaymentPlanGenerationSerializer(serializers.Serializer):
     )
 
 
+class DebtImportRowSerializer(serializers.Serializer):
+    """One row of a bulk debt import; the owner is given by id or by name"""
+    customer = serializers.IntegerField(required=False)
+    company = serializers.IntegerField(required=False)
+    customer_name = serializers.CharField(required=False, max_length=255)
+    company_name = serializers.CharField(required=False, max_length=255)
+    amount = serializers.DecimalField(max_digits=15, decimal_places=3)
+    currency = serializers.CharField(required=False, max_length=3, help_text="Currency code, IQD by default")
+    note = serializers.CharField(required=False, allow_blank=True, max_length=255, default='')
+    is_settled = serializers.BooleanField(required=False, default=False)
+    due_date = serializers.DateField(required=False, allow_null=True, default=None)
+    created_at = serializers.DateTimeField(required=False, help_text="Original entry date of historical rows")
+
+    def validate(self, data):
+        owners = [field for field in ('customer', 'company', 'customer_name', 'company_name') if data.get(field)]
+        if len(owners) != 1:
+            raise serializers.ValidationError('Provide exactly one of customer, company, customer_name or company_name')
+        return data
+
+
 class ShopMoneySerializer(serializers.ModelSerializer):
     """Serializer for shop money"""
     class Meta:
@@ -263,10 +290,34 @@ class ShopMoneySerializer(serializers.ModelSerializer):
 
 
 class EntityActivitySerializer(serializers.ModelSerializer):
-    activity_type_display = serializers.CharField(source='get_activity_type_display', read_only=True)
+    activity_type = serializers.CharField(source='kind', read_only=True)
+    activity_type_display = serializers.CharField(source='get_kind_display', read_only=True)
+    related_object_type = serializers.SerializerMethodField()
+    related_object_id = serializers.SerializerMethodField()
+    # Events are never changed after they are recorded
+    updated_at = serializers.DateTimeField(source='created_at', read_only=True)
 
     class Meta:
-        model = EntityActivity
+        model = Event
         fields = ['id', 'activity_type', 'activity_type_display', 'description', 'amount',
                  'related_object_type', 'related_object_id', 'created_at', 'updated_at']
 
+    def get_related_object_type(self, obj):
+        # Profile events are about the customer/company itself
+        return '' if obj.entity_type in ('customer', 'company') else obj.entity_type
+
+    def get_related_object_id(self, obj):
+        return None if obj.entity_type in ('customer', 'company') else obj.entity_id
+
+
+class JobSerializer(serializers.ModelSerializer):
+    error = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Job
+        fields = ['id', 'kind', 'status', 'result', 'error', 'attempts', 'created_at', 'started_at', 'finished_at']
+
+    def get_error(self, obj):
+        # Only the exception line - the traceback stays in the database for operators
+        lines = obj.error.strip().splitlines()
+        return lines[-1] if lines else ''
@@ -0,0 +1,62 @@
+"""
+Long-running operations shared by the views and the background job handlers.
+"""
+from decimal import Decimal
+
+from rest_framework.exceptions import ValidationError
+
+from . import dashboard, response_cache
+from .jobs import handler
+from .models import Customer
+from .payment_algorithm import PaymentPlanner
+from .reputation import refresh_reputations
+from .serializers import PaymentPlanGenerationSerializer, PaymentPlanSerializer, PaymentScheduleSerializer
+
+
+@handler('update-reputations')
+def update_reputations(user, payload):
+    """Recompute the reputation of every customer of the user."""
+    updated_count = refresh_reputations(Customer.objects.filter(user=user))
+    dashboard.invalidate(user)
+    return {
+        'message': f'Updated reputation for {updated_count} customers',
+        'updated_count': updated_count,
+    }
+
+
+def generate_plan(user, data):
+    """Generate and persist a payment plan from validated PaymentPlanGenerationSerializer data."""
+    daily_balances = {k: Decimal(str(v)) for k, v in data['daily_balances'].items()}
+    debts = data['debts']
+
+    # Generate payment plan using algorithm
+    planner = PaymentPlanner()
+    result = planner.generate_payment_plan(daily_balances, debts, user)
+
+    # Save plans, schedules and daily balances in one transaction
+    planner.save_payment_plan(result, daily_balances)
+    # Bulk inserts send no signals, so drop the cached responses here
+    response_cache.bump(user.pk)
+    response_cache.bump()
+    saved_plans = result['payment_plans']
+    saved_schedules = result['schedules']
+
+    return {
+        'payment_plans': PaymentPlanSerializer(saved_plans, many=True).data,
+        'schedules': PaymentScheduleSerializer(saved_schedules, many=True).data,
+        'summary': {
+            'total_scheduled': float(result['total_scheduled']),
+            'total_available': float(result['total_available']),
+            'utilization_rate': float(result['utilization_rate']),
+            'days_planned': len(daily_balances),
+            'debts_planned': len(saved_plans)
+        }
+    }
+
+
+@handler('generate-plan')
+def generate_plan_job(user, payload):
+    serializer = PaymentPlanGenerationSerializer(data=payload)
+    if not serializer.is_valid():
+        raise ValidationError(serializer.errors)
+    return generate_plan(user, serializer.validated_data)
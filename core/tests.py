@@ -1,3 +1,1275 @@
-from django.test import TestCase
+import csv
+import io
+import json
+import os
+import random
+import re
+import tempfile
+import zipfile
+from datetime import date, timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import skipUnless
+from unittest.mock import patch
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection, models
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from backend.cache import cache_config, require_shared
+from backend.database import database_config, with_pool
+
+from . import archive, credit, dashboard, jobs
+from .ledger import LedgerEntry, recompute_aggregates, reconcile
+from .models import (Company, Currency, Customer, DailyBalance, DashboardSummary, Debt, Event, EventArchive, Job,
+                     PaymentPlan, PaymentSchedule, PaymentScheduleArchive, SchedulerRun, ShopMoney)
+from .pagination import encode_cursor
+from .payment_algorithm import PaymentPlanner
+from .reputation import refresh_reputations, window_rollovers
+from .token_cache import token_cache
+from .views import owned_by, with_earliest_due_date
+
+# Optional dependencies - the tests that need them are skipped without them
+try:
+    import numpy
+except ImportError:
+    numpy = None
+try:
+    import xlsxwriter
+except ImportError:
+    xlsxwriter = None
+try:
+    import dj_database_url
+except ImportError:
+    dj_database_url = None
+try:
+    import psycopg_pool
+except ImportError:
+    psycopg_pool = None
+
+
+class LedgerTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='shop', password='secret-pass-123')
+        self.customer = Customer.objects.create(user=self.user, name='Ahmed', phone='0750')
+        self.company = Company.objects.create(user=self.user, name='Supplier', phone='0770')
+
+    def assertConsistent(self, entity):
+        entity.refresh_from_db()
+        for field, expected in recompute_aggregates(entity).items():
+            if field == 'paid_window_at':
+                continue
+            self.assertEqual(getattr(entity, field), expected, field)
+
+    def test_create_update_delete_keep_aggregates_consistent(self):
+        first = Debt.objects.create(customer=self.customer, amount=Decimal('100'), due_date=date(2030, 1, 5))
+        second = Debt.objects.create(customer=self.customer, amount=Decimal('50'), due_date=date(2030, 1, 1))
+        payment = Debt.objects.create(customer=self.customer, amount=Decimal('-30'))
+        self.assertConsistent(self.customer)
+        self.assertEqual(self.customer.total_debt, Decimal('120'))
+        self.assertEqual(self.customer.total_paid_30_days, Decimal('30'))
+        self.assertEqual(self.customer.min_due_date, date(2030, 1, 1))
+
+        second.is_settled = True
+        second.due_date = None
+        second.save()
+        self.assertConsistent(self.customer)
+        self.assertEqual(self.customer.unsettled_debt, Decimal('70'))
+        self.assertEqual(self.customer.min_due_date, date(2030, 1, 5))
+
+        first.delete()
+        payment.delete()
+        self.assertConsistent(self.customer)
+        self.assertIsNone(self.customer.oldest_unsettled_at)
+        self.assertEqual(self.customer.reputation, 'excellent')
+
+    def test_loading_debts_builds_no_ledger_snapshot(self):
+        debt = Debt.objects.create(customer=self.customer, amount=Decimal('40'))
+        with patch.object(LedgerEntry, 'from_debt', side_effect=AssertionError('snapshot on read')):
+            self.assertEqual(len(list(Debt.objects.all())), 1)
+            debt.refresh_from_db()
+
+        # The write path reads the stored row instead
+        debt.amount = Decimal('15')
+        debt.save()
+        self.assertConsistent(self.customer)
+        self.assertEqual(self.customer.total_debt, Decimal('15'))
+
+    def test_moving_debt_between_owners_updates_both(self):
+        debt = Debt.objects.create(customer=self.customer, amount=Decimal('40'))
+        other = Customer.objects.create(user=self.user, name='Omar', phone='0751')
+        debt.customer = other
+        debt.save()
+        self.assertConsistent(self.customer)
+        self.assertConsistent(other)
+        self.assertEqual(other.total_debt, Decimal('40'))
+
+    def test_company_aggregates(self):
+        Debt.objects.create(company=self.company, amount=Decimal('500'), due_date=date(2030, 2, 1))
+        Debt.objects.create(company=self.company, amount=Decimal('-200'))
+        self.assertConsistent(self.company)
+        self.assertEqual(self.company.total_debt, Decimal('300'))
+
+    def test_paid_window_slides(self):
+        payment = Debt.objects.create(customer=self.customer, amount=Decimal('-25'))
+        Debt.objects.filter(pk=payment.pk).update(created_at=timezone.now() - timedelta(days=31))
+        Customer.objects.filter(pk=self.customer.pk).update(paid_window_at=timezone.now() - timedelta(days=2))
+
+        Debt.objects.create(customer=self.customer, amount=Decimal('10'))
+        self.customer.refresh_from_db()
+        self.assertEqual(self.customer.total_paid_30_days, Decimal('0'))
+
+    def test_reconcile_repairs_drift(self):
+        Debt.objects.create(customer=self.customer, amount=Decimal('80'))
+        Customer.objects.filter(pk=self.customer.pk).update(total_debt=0, unsettled_debt=5)
+
+        out = StringIO()
+        call_command('reconcile', stdout=out)
+        self.assertIn('1 entities drifted', out.getvalue())
+
+        call_command('reconcile', '--repair', stdout=StringIO())
+        self.assertConsistent(self.customer)
+        self.assertEqual(self.customer.total_debt, Decimal('80'))
+
+    def test_reputation_refresh_agrees_with_reconcile(self):
+        Debt.objects.create(customer=self.customer, amount=Decimal('80'))
+        old_payment = Debt.objects.create(customer=self.customer, amount=Decimal('-20'))
+        last_month = timezone.now() - timedelta(days=45)
+        Debt.objects.filter(pk=old_payment.pk).update(created_at=last_month)
+        Customer.objects.filter(pk=self.customer.pk).update(last_payment_date=None)
+
+        # Both writers store the newest payment, even one outside the 30 day window
+        for refresh in (lambda: refresh_reputations(Customer.objects.all()), self.customer.update_reputation):
+            refresh()
+            self.customer.refresh_from_db()
+            self.assertEqual(self.customer.last_payment_date, last_month)
+            self.assertEqual(list(reconcile(Customer.objects.all())), [])
+
+
+class BulkReputationTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='shop', password='secret-pass-123')
+
+    def test_matches_per_customer_update(self):
+        old = timezone.now() - timedelta(days=45)
+        customers = []
+        for index, (debt, payment) in enumerate([(100, 0), (100, 60), (100, 30), (100, 10), (0, 0)]):
+            customer = Customer.objects.create(user=self.user, name=f'Customer {index}', phone='0750')
+            if debt:
+                row = Debt.objects.create(customer=customer, amount=Decimal(debt))
+                Debt.objects.filter(pk=row.pk).update(created_at=old)
+            if payment:
+                Debt.objects.create(customer=customer, amount=Decimal(-payment))
+            customers.append(customer)
+
+        expected = {}
+        for customer in customers:
+            customer.update_reputation()
+            expected[customer.pk] = (customer.reputation, customer.reputation_score, customer.total_paid_30_days)
+        Customer.objects.update(reputation='fair', reputation_score=50, total_paid_30_days=0)
+
+        # One customer scan, then per batch its own transaction (a savepoint here) holding
+        # the locking SELECT, one GROUP BY and one bulk UPDATE
+        with self.assertNumQueries(16):
+            updated = refresh_reputations(Customer.objects.filter(user=self.user), batch_size=2)
+        self.assertEqual(updated, 5)
+
+        for customer in Customer.objects.all():
+            self.assertEqual((customer.reputation, customer.reputation_score, customer.total_paid_30_days),
+                             expected[customer.pk])
+
+
+class EntityListQueryCountTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='shop', password='secret-pass-123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def seed(self, count):
+        for index in range(count):
+            customer = Customer.objects.create(user=self.user, name=f'Customer {index}', phone='0750')
+            company = Company.objects.create(user=self.user, name=f'Company {index}', phone='0770')
+            Debt.objects.create(customer=customer, amount=Decimal('10'), due_date=date(2030, 1, index + 1))
+            Debt.objects.create(company=company, amount=Decimal('10'), due_date=date(2030, 2, index + 1))
+
+    def test_list_query_count_does_not_grow_with_rows(self):
+        for url in ('/api/customers/', '/api/companies/'):
+            self.seed(2)
+            # One COUNT for pagination and one annotated SELECT
+            with self.assertNumQueries(2):
+                small = self.client.get(url)
+            self.seed(10)
+            with self.assertNumQueries(2):
+                large = self.client.get(url)
+            self.assertEqual(small.status_code, 200)
+            self.assertIsNotNone(large.data['results'][0]['earliest_due_date'])
+
+    def test_retrieve_uses_annotation(self):
+        self.seed(1)
+        customer = Customer.objects.get()
+        with self.assertNumQueries(1):
+            response = self.client.get(f'/api/customers/{customer.pk}/')
+        self.assertEqual(response.data['earliest_due_date'], date(2030, 1, 1))
+
+
+class PaymentAnalyticsTestCase(TestCase):
+    def setUp(self):
+        # Responses are cached per user id, which the rolled back tests reuse
+        cache.clear()
+        self.user = User.objects.create_user(username='shop', password='secret-pass-123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.company = Company.objects.create(user=self.user, name='Supplier', phone='0770')
+
+    def seed(self, days, start=date(2030, 1, 1)):
+        for priority in (1, 2):
+            plan = PaymentPlan.objects.create(company=self.company, total_debt=1000, remaining_debt=1000,
+                                              manual_priority=priority)
+            for offset in range(days):
+                day = start + timedelta(days=offset)
+                PaymentSchedule.objects.create(payment_plan=plan, scheduled_date=day, scheduled_amount=Decimal('10'),
+                                               actual_amount=Decimal('10') if priority == 1 else None,
+                                               is_paid=priority == 1)
+        for offset in range(days):
+            DailyBalance.objects.create(date=start + timedelta(days=offset), available_amount=Decimal('40'))
+
+    def test_response_shape(self):
+        self.seed(3)
+        data = self.client.get('/api/analytics/').data
+        self.assertEqual(data['overview'], {'total_scheduled': 60.0, 'total_paid': 30.0,
+                                            'pending_amount': 30.0, 'completion_rate': 0.5})
+        self.assertEqual(data['priority_breakdown']['priority_1'], {'scheduled': 30.0, 'paid': 30.0, 'completion_rate': 1.0})
+        self.assertEqual(data['priority_breakdown']['priority_3'], {'scheduled': 0.0, 'paid': 0.0, 'completion_rate': 0})
+        self.assertEqual(data['daily_utilization'][0], {'date': '2030-01-03', 'available': 40.0,
+                                                        'scheduled': 20.0, 'utilization_rate': 0.5})
+
+    def test_query_count_is_bounded_by_date_range(self):
+        self.seed(3)
+        with self.assertNumQueries(4):
+            self.client.get('/api/analytics/')
+        self.seed(60, start=date(2031, 1, 1))
+        with self.assertNumQueries(4):
+            response = self.client.get('/api/analytics/', {'start_date': '2031-01-01'})
+        self.assertEqual(len(response.data['daily_utilization']), 60)
+
+
+class PaymentScheduleListTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='shop', password='secret-pass-123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        for name in ('Supplier A', 'Supplier B'):
+            company = Company.objects.create(user=self.user, name=name, phone='0770')
+            plan = PaymentPlan.objects.create(company=company, total_debt=1000, remaining_debt=1000)
+            for offset in range(5):
+                PaymentSchedule.objects.create(payment_plan=plan, scheduled_date=date(2030, 1, 1) + timedelta(days=offset),
+                                               scheduled_amount=Decimal('10'))
+
+    def test_cursor_pages_cover_every_row_once(self):
+        seen = []
+        params = {'page_size': 3}
+        while True:
+            with self.assertNumQueries(2):
+                data = self.client.get('/api/schedule/', params).data
+            seen.extend((row['scheduled_date'], row['id']) for row in data['schedules'])
+            self.assertEqual(data['summary']['total_days'], 5)
+            self.assertEqual(data['summary']['total_scheduled'], 100.0)
+            if not data['next_cursor']:
+                break
+            params['cursor'] = data['next_cursor']
+        self.assertEqual(seen, sorted(seen))
+        self.assertEqual(len(set(seen)), PaymentSchedule.objects.count())
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/api/schedule/', {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_tampered_cursor(self):
+        for values in (['garbage', 1], [{'a': 1}, 1], ['2030-01-01', None]):
+            response = self.client.get('/api/schedule/', {'cursor': encode_cursor(values)})
+            self.assertEqual(response.status_code, 400)
+
+    def test_stream_ndjson(self):
+        response = self.client.get('/api/schedule/', {'stream': '1', 'start_date': '2030-01-05'})
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertEqual([json.loads(line)['entity_name'] for line in lines], ['Supplier A', 'Supplier B'])
+
+
+class AuditLogListTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='shop', password='secret-pass-123')
+        self.other = User.objects.create_user(username='other', password='secret-pass-123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_logs_are_owned_and_paged_by_cursor(self):
+        for index in range(7):
+            self.client.post('/api/customers/', {'name': f'Customer {index}', 'phone': str(index)})
+        Event.objects.create(user=self.other, action='create', kind='profile_created', entity_type='customer',
+                             entity_id=999)
+
+        seen = []
+        url, params = '/api/audit/', {'page_size': 3}
+        while url:
+            with self.assertNumQueries(1):
+                data = self.client.get(url, params).data
+            seen.extend(row['id'] for row in data['results'])
+            url, params = data['next'], None
+        self.assertEqual(seen, list(Event.objects.filter(user=self.user).order_by('-created_at', '-id')
+                                    .values_list('id', flat=True)))
+        self.assertEqual(len(seen), 7)
+
+    def test_invalid_cursor(self):
+        self.assertEqual(self.client.get('/api/audit/', {'cursor': 'bogus'}).status_code, 404)
+        for values in (['garbage', 1], [{'a': 1}, 1]):
+            self.assertEqual(self.client.get('/api/audit/', {'cursor': encode_cursor(values)}).status_code, 404)
+            self.assertEqual(self.client.get('/api/debts/', {'cursor': encode_cursor(values)}).status_code, 404)
+
+
+class EventJournalTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='shop', password='secret-pass-123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_audit_log_and_activity_feed_read_one_journal(self):
+        customer_id = self.client.post('/api/customers/', {'name': 'Ahmed', 'phone': '0750'}).data['id']
+        debt_id = self.client.post('/api/debts/', {'customer': customer_id, 'amount': '25.00', 'note': 'Rice'},
+                                   format='json').data['id']
+        self.assertEqual(Event.objects.count(), 2)
+
+        audit = self.client.get('/api/audit/').data['results']
+        self.assertEqual([(row['action'], row['entity_type'], row['entity_id']) for row in audit],
+                         [('create', 'debt', debt_id), ('create', 'customer', customer_id)])
+
+        activities = self.client.get('/api/entity-activities/', {'customer_id': customer_id}).data['results']
+        self.assertEqual([row['activity_type'] for row in activities], ['debt_created', 'profile_created'])
+        self.assertEqual((activities[0]['related_object_type'], activities[0]['related_object_id']), ('debt', debt_id))
+        self.assertEqual(activities[0]['description'], 'Debt added: Rice')
+        self.assertEqual(activities[1]['related_object_type'], '')
+
+    def test_deleting_an_entity_keeps_its_history(self):
+        customer_id = self.client.post('/api/customers/', {'name': 'Ahmed', 'phone': '0750'}).data['id']
+        self.assertEqual(self.client.delete(f'/api/customers/{customer_id}/').status_code, 204)
+        self.assertEqual([row['action'] for row in self.client.get('/api/audit/').data['results']],
+                         ['delete', 'create'])
+
+
+class ArchiveTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='shop', password='secret-pass-123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        customer = Customer.objects.create(user=self.user, name='Ahmed')
+        for index in range(6):
+            self.client.post('/api/debts/', {'customer': customer.pk, 'amount': '10.00', 'note': f'Debt {index}'},
+                             format='json')
+        old = timezone.now() - timedelta(days=400)
+        for index, event in enumerate(Event.objects.order_by('id')[:4]):
+            Event.objects.filter(pk=event.pk).update(created_at=old + timedelta(minutes=index))
+
+        plan = PaymentPlan.objects.create(customer=customer, total_debt=60, remaining_debt=60)
+        today = date.today()
+        PaymentSchedule.objects.bulk_create([
+            PaymentSchedule(payment_plan=plan, scheduled_date=today - timedelta(days=300), scheduled_amount=10,
+                            actual_amount=10, is_paid=True),
+            PaymentSchedule(payment_plan=plan, scheduled_date=today - timedelta(days=200), scheduled_amount=10),
+            PaymentSchedule(payment_plan=plan, scheduled_date=today - timedelta(days=100), scheduled_amount=10,
+                            actual_amount=5, is_paid=True),
+            PaymentSchedule(payment_plan=plan, scheduled_date=today, scheduled_amount=10, actual_amount=10,
+                            is_paid=True),
+        ])
+        self.journal = list(Event.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+        self.schedules = list(PaymentSchedule.objects.order_by('scheduled_date', 'id').values_list('id', flat=True))
+        self.analytics = self.client.get('/api/analytics/').data['overview']
+        self.summary = self.client.get('/api/schedule/').data['summary']
+
+    def walk(self, url, **params):
+        seen = []
+        url, params = url, {'page_size': 2, **params}
+        while url:
+            data = self.client.get(url, params).data
+            seen.extend(row['id'] for row in data['results'])
+            url, params = data['next'], None
+        return seen
+
+    def test_cold_rows_move_and_are_read_back_on_request(self):
+        out = StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('archive', '--older-than', '90', '--batch-size', '3', stdout=out)
+        self.assertIn('Archived 4 events', out.getvalue())
+        self.assertIn('Archived 2 paid schedules', out.getvalue())
+        self.assertEqual(EventArchive.objects.count(), 4)
+        self.assertEqual(PaymentScheduleArchive.objects.count(), 2)
+
+        self.assertEqual(self.walk('/api/audit/'), self.journal[:2])
+        self.assertEqual(self.walk('/api/audit/', include_archived=1), self.journal)
+        self.assertEqual(self.walk('/api/payment-schedules/'), [self.schedules[1], self.schedules[3]])
+        self.assertEqual(self.walk('/api/payment-schedules/', include_archived=1), self.schedules)
+        self.assertEqual(self.client.get('/api/audit/', {'include_archived': 1, 'page': 2, 'page_size': 4})
+                         .data['count'], 6)
+        self.assertEqual(self.client.get(f'/api/audit/{self.journal[-1]}/', {'include_archived': 1}).status_code, 200)
+
+        rows = list(csv.DictReader(io.StringIO(b''.join(self.client.get(
+            '/api/entity-activities/export/', {'include_archived': 1}).streaming_content).decode())))
+        self.assertEqual([int(row['id']) for row in rows], self.journal[::-1])
+
+        # Totals of the whole range add the archive back in
+        self.assertNotEqual(self.client.get('/api/analytics/').data['overview'], self.analytics)
+        self.assertEqual(self.client.get('/api/analytics/', {'include_archived': 1}).data['overview'], self.analytics)
+        self.assertEqual(self.client.get('/api/schedule/', {'include_archived': 1}).data['summary'], self.summary)
+
+    def test_move_cost_does_not_grow_with_rows(self):
+        plan = PaymentPlan.objects.get()
+        old = date.today() - timedelta(days=500)
+        counts = []
+        for count in (5, 50):
+            PaymentSchedule.objects.bulk_create([
+                PaymentSchedule(payment_plan=plan, scheduled_date=old, scheduled_amount=1, is_paid=True)
+                for _ in range(count)
+            ])
+            with CaptureQueriesContext(connection) as queries:
+                moved, users = archive.move(archive.cold_rows(PaymentSchedule, timedelta(days=400)), batch_size=100)
+            self.assertEqual((moved, users), (count, {self.user.pk}))
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+        self.assertFalse(PaymentSchedule.objects.filter(scheduled_date=old).exists())
+
+    def test_dry_run_moves_nothing(self):
+        out = StringIO()
+        call_command('archive', '--older-than', '90', '--dry-run', stdout=out)
+        self.assertIn('4 events would be archived', out.getvalue())
+        self.assertEqual(EventArchive.objects.count(), 0)
+        self.assertEqual(PaymentSchedule.objects.count(), 4)
+
+
+class LedgerPaginationTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='shop', password='secret-pass-123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        customer = Customer.objects.create(user=self.user, name='Customer', phone='0750')
+        Debt.objects.bulk_create([Debt(customer=customer, amount=Decimal('10')) for _ in range(7)])
+
+    def test_debts_page_by_cursor(self):
+        seen = []
+        url, params = '/api/debts/', {'page_size': 3}
+        while url:
+            data = self.client.get(url, params).data
+            self.assertNotIn('count', data)
+            seen.extend(row['id'] for row in data['results'])
+            url, params = data['next'], None
+        self.assertEqual(seen, list(Debt.objects.order_by('-created_at', '-id').values_list('id', flat=True)))
+
+    def test_page_number_fallback(self):
+        data = self.client.get('/api/debts/', {'page': 2, 'page_size': 3}).data
+        self.assertEqual(data['count'], 7)
+        self.assertEqual([row['id'] for row in data['results']],
+                         list(Debt.objects.order_by('-created_at', '-id').values_list('id', flat=True)[3:6]))
+
+
+class TokenCacheTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        token_cache.clear()
+        self.user = User.objects.create_user(username='shop', password='secret-pass-123')
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def test_hit_skips_token_lookup(self):
+        self.assertEqual(self.client.get('/api/audit/').status_code, 200)
+        # Only the audit page itself
+        with self.assertNumQueries(1):
+            self.client.get('/api/audit/')
+        self.assertEqual(token_cache.stats()['hits'], 1)
+
+    def test_logout_evicts(self):
+        self.client.get('/api/auth/status/')
+        self.client.post('/api/auth/logout/')
+        self.assertEqual(self.client.get('/api/auth/status/').status_code, 401)
+
+    def test_deactivation_evicts(self):
+        self.client.get('/api/auth/status/')
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get('/api/auth/status/').status_code, 401)
+
+    def test_revocation_reaches_other_processes(self):
+        self.assertRevocationSpreads()
+
+    def test_revocation_reaches_other_processes_through_files(self):
+        # Every process on the box reads the counter from the same directory
+        with tempfile.TemporaryDirectory() as directory, \
+                override_settings(CACHES={'default': cache_config(f'file://{directory}')}):
+            self.assertRevocationSpreads()
+            self.assertTrue(os.listdir(directory))
+
+    def assertRevocationSpreads(self):
+        self.client.get('/api/auth/status/')
+        # Another worker still holds the entry in its own memory
+        elsewhere = dict(token_cache._entries)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/auth/logout/')
+        token_cache._entries.update(elsewhere)
+        self.assertEqual(self.client.get('/api/auth/status/').status_code, 401)
+
+        token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        self.client.get('/api/auth/status/')
+        elsewhere = dict(token_cache._entries)
+        with self.captureOnCommitCallbacks(execute=True):
+            User.objects.filter(pk=self.user.pk).update(is_active=False)
+            self.user.refresh_from_db()
+            self.user.save()
+        token_cache._entries.update(elsewhere)
+        self.assertEqual(self.client.get('/api/auth/status/').status_code, 401)
+
+
+class CacheConfigTestCase(TestCase):
+    def test_tiers_share_namespace(self):
+        configs = [cache_config(url, key_prefix='shop', version=3, timeout=60) for url in
+                   ('locmem://', 'file:///var/tmp/deptapp', 'db://cache_table', 'redis://cache:6379/1')]
+        self.assertEqual([config['LOCATION'] for config in configs],
+                         ['unique-snowflake', '/var/tmp/deptapp', 'cache_table', 'redis://cache:6379/1'])
+        for config in configs:
+            self.assertEqual((config['KEY_PREFIX'], config['VERSION'], config['TIMEOUT']), ('shop', 3, 60))
+
+    def test_rejects_unknown_scheme(self):
+        with self.assertRaises(ImproperlyConfigured):
+            cache_config('memcached://localhost:11211')
+        with self.assertRaises(ImproperlyConfigured):
+            cache_config('file://')
+
+    def test_background_processes_need_a_shared_tier(self):
+        for url in ('db://cache_table', 'redis://cache:6379/1'):
+            require_shared(url, 'run_worker')
+        for url in ('locmem://', 'file:///var/tmp/deptapp'):
+            with self.assertRaisesMessage(ImproperlyConfigured, 'run_scheduler needs a CACHE_URL shared'):
+                require_shared(url, 'run_scheduler')
+
+
+class DatabaseConfigTestCase(TestCase):
+    POSTGRES = {'ENGINE': 'django.db.backends.postgresql', 'NAME': 'shop', 'CONN_MAX_AGE': 600, 'OPTIONS': {}}
+
+    @skipUnless(dj_database_url, 'dj-database-url is not installed')
+    def test_persistent_health_checked_connections(self):
+        config = database_config('postgresql://shop:secret@db:5432/shop', conn_max_age=300)
+        self.assertEqual((config['CONN_MAX_AGE'], config['CONN_HEALTH_CHECKS']), (300, True))
+        self.assertNotIn('pool', config.get('OPTIONS', {}))
+
+    @skipUnless(psycopg_pool, 'psycopg_pool is not installed')
+    def test_pool_replaces_persistent_connections(self):
+        config = with_pool(self.POSTGRES, min_size=4, max_size=8, timeout=5)
+        self.assertEqual(config['CONN_MAX_AGE'], 0)
+        self.assertEqual(config['OPTIONS']['pool'], {'min_size': 4, 'max_size': 8, 'timeout': 5})
+        self.assertEqual(self.POSTGRES['OPTIONS'], {})
+        with self.assertRaises(ImproperlyConfigured):
+            with_pool(self.POSTGRES, min_size=10, max_size=2)
+
+    def test_pool_needs_postgresql(self):
+        with self.assertRaises(ImproperlyConfigured):
+            with_pool({'ENGINE': 'django.db.backends.sqlite3', 'NAME': 'db.sqlite3'})
+
+
+class ResponseCacheTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='shop', password='secret-pass-123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.customer = Customer.objects.create(user=self.user, name='Customer', phone='0750')
+
+    def add_debt(self, amount):
+        with self.captureOnCommitCallbacks(execute=True):
+            Debt.objects.create(customer=self.customer, amount=Decimal(amount))
+
+    def test_hit_and_invalidation(self):
+        url = f'/api/customers/{self.customer.pk}/debts/'
+        self.add_debt('10')
+        first = self.client.get(url)
+        with self.assertNumQueries(0):
+            cached = self.client.get(url)
+        self.assertEqual(cached.data, first.data)
+        self.assertEqual(cached['ETag'], first['ETag'])
+
+        self.add_debt('20')
+        fresh = self.client.get(url)
+        self.assertEqual(len(fresh.data), 2)
+        self.assertNotEqual(fresh['ETag'], first['ETag'])
+
+    def test_not_modified(self):
+        url = '/api/currencies/'
+        etag = self.client.get(url)['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        currency = Currency.objects.get(code='EUR')
+        currency.is_active = False
+        with self.captureOnCommitCallbacks(execute=True):
+            currency.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('EUR', [row['code'] for row in response.data['results']])
+
+    def test_plan_changes_invalidate_analytics(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            plan = PaymentPlan.objects.create(customer=self.customer, total_debt=100, remaining_debt=100,
+                                              manual_priority=1)
+            PaymentSchedule.objects.create(payment_plan=plan, scheduled_date=date(2030, 1, 1),
+                                           scheduled_amount=Decimal('40'))
+        first = self.client.get('/api/analytics/')
+        self.assertEqual(first.data['priority_breakdown']['priority_1']['scheduled'], 40.0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(f'/api/payment-plans/{plan.pk}/', {'manual_priority': 2})
+        self.assertEqual(response.status_code, 200)
+        fresh = self.client.get('/api/analytics/')
+        self.assertNotEqual(fresh['ETag'], first['ETag'])
+        self.assertEqual(fresh.data['priority_breakdown']['priority_1']['scheduled'], 0)
+        self.assertEqual(fresh.data['priority_breakdown']['priority_2']['scheduled'], 40.0)
+
+
+class CreditDecisionTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='shop', password='secret-pass-123')
+        self.customer = Customer.objects.create(user=self.user, name='Customer', phone='0750')
+        Customer.objects.filter(pk=self.customer.pk).update(created_at=timezone.now() - timedelta(days=90))
+        self.customer.refresh_from_db()
+
+    def test_single_query(self):
+        Debt.objects.create(customer=self.customer, amount=Decimal('100'))
+        Debt.objects.create(customer=self.customer, amount=Decimal('-30'))
+        with self.assertNumQueries(1):
+            decision = credit.decide(self.customer)
+        self.assertEqual((decision.allowed, decision.current_debt, decision.paid_30_days),
+                         (True, Decimal('70'), Decimal('30')))
+        self.assertTrue(decision.reason.startswith('Customer paid $30'))
+
+    def test_overdue_blocks(self):
+        Debt.objects.create(customer=self.customer, amount=Decimal('100'), due_date=date.today() - timedelta(days=1))
+        Debt.objects.create(customer=self.customer, amount=Decimal('-30'))
+        decision = credit.decide(self.customer)
+        self.assertFalse(decision.allowed)
+        self.assertEqual(decision.overdue_count, 1)
+
+    def test_no_recent_payment_blocks_and_endpoint_agrees(self):
+        Debt.objects.create(customer=self.customer, amount=Decimal('100'))
+        self.assertFalse(credit.decide(self.customer).allowed)
+
+        client = APIClient()
+        client.force_authenticate(self.user)
+        data = client.get(f'/api/check-customer-credit/{self.customer.pk}/').data
+        self.assertFalse(data['can_receive_new_debt'])
+        self.assertEqual(data['current_debt'], Decimal('100'))
+        response = client.post('/api/debts/', {'customer': self.customer.pk, 'amount': '10.00'})
+        self.assertEqual(response.status_code, 400)
+
+
+class DebtImportTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='shop', password='secret-pass-123')
+        self.other = User.objects.create_user(username='other', password='secret-pass-123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.customer = Customer.objects.create(user=self.user, name='Ahmed', phone='0750')
+        self.company = Company.objects.create(user=self.user, name='Supplier', phone='0770')
+        self.foreign = Customer.objects.create(user=self.other, name='Foreign', phone='0751')
+
+    def assertConsistent(self, entity):
+        entity.refresh_from_db()
+        for field, expected in recompute_aggregates(entity).items():
+            if field != 'paid_window_at':
+                self.assertEqual(getattr(entity, field), expected, field)
+
+    def rows(self, count):
+        return [{'customer_name': 'Ahmed', 'amount': '10.5', 'created_at': '2024-01-05T10:00:00Z'}] * count
+
+    def test_endpoint_imports_valid_rows_and_reports_the_rest(self):
+        rows = [
+            {'customer': self.customer.pk, 'amount': '100', 'due_date': '2030-01-01', 'note': 'Opening balance'},
+            {'company_name': 'Supplier', 'amount': '-20', 'currency': 'usd'},
+            {'customer': self.foreign.pk, 'amount': '5'},
+            {'customer_name': 'Ahmed', 'company_name': 'Supplier', 'amount': '5'},
+            {'customer_name': 'Ahmed', 'amount': 'lots'},
+        ]
+        response = self.client.post('/api/debts/bulk/', rows, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual([error['row'] for error in response.data['errors']], [3, 4, 5])
+
+        self.assertEqual(Debt.objects.get(company=self.company).currency.code, 'USD')
+        self.assertEqual(Event.objects.filter(user=self.user, kind='debt_created', customer__isnull=False).count(), 1)
+        self.assertEqual(Event.objects.filter(user=self.user, kind='debt_created', company__isnull=False).count(), 1)
+        self.assertConsistent(self.customer)
+        self.assertConsistent(self.company)
+        self.assertEqual(self.customer.total_debt, Decimal('100'))
+
+    def test_query_count_does_not_grow_with_rows(self):
+        with CaptureQueriesContext(connection) as small:
+            self.client.post('/api/debts/bulk/', self.rows(5), format='json')
+        with CaptureQueriesContext(connection) as large:
+            self.client.post('/api/debts/bulk/', self.rows(50), format='json')
+        self.assertEqual(len(large), len(small))
+        self.assertEqual(Debt.objects.filter(created_at__year=2024).count(), 55)
+        self.assertConsistent(self.customer)
+
+    def test_command_reads_csv(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as handle:
+            handle.write('customer_name,company_name,amount,due_date\n')
+            handle.write('Ahmed,,25,2030-02-01\n')
+            handle.write(',Supplier,abc,\n')
+        out = StringIO()
+        call_command('import_ledger', handle.name, '--user', 'shop', stdout=out)
+        self.assertIn('Imported 1 debts, rejected 1 rows', out.getvalue())
+        self.assertIn('row 2:', out.getvalue())
+        self.assertConsistent(self.customer)
+        self.assertEqual(self.customer.min_due_date, date(2030, 2, 1))
+
+    def test_malformed_files_are_rejected_with_their_row(self):
+        uploads = {
+            'not-utf8.csv': b'customer_name,amount\nAhmed,10\n\xff\xfe,20\n',
+            'huge-field.csv': b'customer_name,amount\nAhmed,10\nAhmed,' + b'9' * 200000 + b'\n',
+        }
+        for name, content in uploads.items():
+            response = self.client.post('/api/debts/bulk/', {'file': SimpleUploadedFile(name, content)})
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.data['row'], 2)
+
+            with tempfile.NamedTemporaryFile('wb', suffix='.csv', delete=False) as handle:
+                handle.write(content)
+            with self.assertRaisesMessage(CommandError, 'Row 2: cannot read the file'):
+                call_command('import_ledger', handle.name, '--user', 'shop', stdout=StringIO())
+        self.assertFalse(Debt.objects.exists())
+
+
+class LedgerExportTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='shop', password='secret-pass-123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.customer = Customer.objects.create(user=self.user, name='Ahmed', phone='0750')
+        other = User.objects.create_user(username='other', password='secret-pass-123')
+        Debt.objects.create(customer=Customer.objects.create(user=other, name='Foreign', phone='0751'), amount=1)
+        for amount in range(1, 6):
+            Debt.objects.create(customer=self.customer, amount=Decimal(amount), note=f'Debt, {amount}')
+
+    def export(self, url, **params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content)
+
+    def test_csv_is_owned_ordered_and_resumable(self):
+        rows = list(csv.DictReader(io.StringIO(self.export('/api/debts/export/').decode())))
+        self.assertEqual([row['note'] for row in rows], [f'Debt, {amount}' for amount in range(1, 6)])
+
+        resumed = list(csv.DictReader(io.StringIO(self.export('/api/debts/export/', cursor=rows[1]['cursor']).decode())))
+        self.assertEqual([row['id'] for row in resumed], [row['id'] for row in rows[2:]])
+
+    def test_ndjson(self):
+        lines = self.export('/api/entity-activities/export/', fmt='ndjson').decode().splitlines()
+        self.assertEqual(lines, [])
+        lines = self.export('/api/debts/export/', fmt='ndjson', customer=self.customer.pk).decode().splitlines()
+        self.assertEqual([json.loads(line)['amount'] for line in lines], ['1.000', '2.000', '3.000', '4.000', '5.000'])
+
+    def test_invalid_parameters(self):
+        self.assertEqual(self.client.get('/api/audit/export/', {'fmt': 'pdf'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/audit/export/', {'cursor': 'bogus'}).status_code, 400)
+        for values in (['garbage', 1], [{'a': 1}, 1]):
+            self.assertEqual(self.client.get('/api/debts/export/', {'cursor': encode_cursor(values)}).status_code, 400)
+
+    @skipUnless(xlsxwriter, 'XLSX export requires XlsxWriter')
+    def test_xlsx(self):
+        content = self.export('/api/debts/export/', fmt='xlsx')
+        self.assertIn('xl/worksheets/sheet1.xml', zipfile.ZipFile(io.BytesIO(content)).namelist())
+
+    @skipUnless(xlsxwriter, 'XLSX export requires XlsxWriter')
+    @override_settings(EXPORT_XLSX_MAX_ROWS=2)
+    def test_xlsx_is_capped_and_resumable(self):
+        notes, params = [], {'fmt': 'xlsx'}
+        while True:
+            response = self.client.get('/api/debts/export/', params)
+            content = b''.join(response.streaming_content)
+            # Constant-memory workbooks keep their strings inline in the sheet
+            sheet = zipfile.ZipFile(io.BytesIO(content)).read('xl/worksheets/sheet1.xml').decode()
+            notes.append(re.findall(r'Debt, \d', sheet))
+            if not response.has_header('X-Export-Cursor'):
+                break
+            params['cursor'] = response['X-Export-Cursor']
+        self.assertEqual(notes, [['Debt, 1', 'Debt, 2'], ['Debt, 3', 'Debt, 4'], ['Debt, 5']])
+
+class GeneratePaymentPlanTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='shop', password='secret-pass-123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        for name in ('Supplier A', 'Supplier B'):
+            Company.objects.create(user=self.user, name=name, phone='0770')
+
+    def test_plan_is_persisted_and_balances_upserted(self):
+        DailyBalance.objects.create(date=date(2030, 1, 1), available_amount=Decimal('1'))
+        payload = {
+            'daily_balances': {'2030-01-01': '300.00', '2030-01-02': '300.00'},
+            'debts': [
+                {'company': 'Supplier A', 'totalDebt': 1000, 'paid': 0, 'manualPriority': 1},
+                {'company': 'Supplier B', 'totalDebt': 200, 'paid': 50, 'manualPriority': 3},
+            ],
+        }
+        response = self.client.post('/api/generate-plan/', payload, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(PaymentPlan.objects.count(), 2)
+        self.assertEqual(PaymentSchedule.objects.count(), len(response.data['schedules']))
+        self.assertTrue(all(row['id'] and row['payment_plan'] for row in response.data['schedules']))
+        self.assertEqual(DailyBalance.objects.get(date=date(2030, 1, 1)).available_amount, Decimal('300.00'))
+        self.assertEqual(DailyBalance.objects.count(), 2)
+
+
+class JobQueueTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='shop', password='secret-pass-123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        Company.objects.create(user=self.user, name='Supplier A', phone='0770')
+        Customer.objects.create(user=self.user, name='Ahmed', phone='0750')
+
+    def test_reputation_update_is_queued_and_polled(self):
+        response = self.client.post('/api/update-all-reputations/')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(self.client.get(response.data['status_url']).data['status'], 'queued')
+
+        out = StringIO()
+        call_command('run_worker', '--processes', '1', '--once', stdout=out)
+        self.assertIn('Ran 1 jobs', out.getvalue())
+        job = self.client.get(f"/api/jobs/{response.data['job_id']}/").data
+        self.assertEqual(job['status'], 'done')
+        self.assertEqual(job['result']['updated_count'], 1)
+
+    def test_async_plan_generation(self):
+        payload = {'daily_balances': {'2030-01-01': '300.00'},
+                   'debts': [{'company': 'Supplier A', 'totalDebt': 1000, 'paid': 0, 'manualPriority': 1}]}
+        response = self.client.post('/api/generate-plan/?async=1', payload, format='json')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(PaymentPlan.objects.count(), 0)
+
+        self.assertEqual(jobs.work(once=True), 1)
+        job = Job.objects.get(pk=response.data['job_id'])
+        self.assertEqual(job.status, 'done')
+        self.assertEqual(job.result['summary']['total_scheduled'], 300.0)
+        self.assertEqual(PaymentPlan.objects.count(), 1)
+
+    def test_failures_are_recorded_and_jobs_are_private(self):
+        job = jobs.enqueue(self.user, 'generate-plan', {'daily_balances': 'not a dict'})
+        jobs.work(once=True)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('failed', 1))
+        self.assertIn('ValidationError', self.client.get(f'/api/jobs/{job.pk}/').data['error'])
+
+        other = APIClient()
+        other.force_authenticate(User.objects.create_user(username='other', password='secret-pass-123'))
+        self.assertEqual(other.get(f'/api/jobs/{job.pk}/').status_code, 404)
+
+    def test_claim_is_exclusive(self):
+        job = jobs.enqueue(self.user, 'update-reputations')
+        self.assertEqual(jobs.claim('worker-a'), job)
+        self.assertIsNone(jobs.claim('worker-b'))
+
+    def test_stale_jobs_are_requeued_until_the_attempt_cap(self):
+        job = jobs.enqueue(self.user, 'update-reputations')
+        started = timezone.now() - timedelta(hours=2)
+        Job.objects.filter(pk=job.pk).update(status='running', attempts=1, started_at=started)
+
+        # A running worker sweeps for stale jobs on its own, not only at startup
+        with patch.object(jobs, 'REQUEUE_INTERVAL', 0):
+            self.assertEqual(jobs.work(once=True, stale_after=timedelta(hours=1)), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('done', 2))
+
+        Job.objects.filter(pk=job.pk).update(status='running', attempts=3, started_at=started)
+        self.assertEqual(jobs.requeue_stale(timedelta(hours=1), max_attempts=3), (0, 1))
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'failed')
+        self.assertIn('Gave up after 3 attempts', job.error)
+
+    @override_settings(JOBS_RUN_INLINE=True)
+    def test_inline_mode_runs_in_the_request(self):
+        response = self.client.post('/api/update-all-reputations/')
+        self.assertEqual(response.status_code, 202)
+        job = self.client.get(response.data['status_url']).data
+        self.assertEqual(job['status'], 'done')
+        self.assertEqual(job['result']['updated_count'], 1)
+
+
+class SchedulerTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='shop', password='secret-pass-123')
+        self.now = timezone.now()
+        self.late = Customer.objects.create(user=self.user, name='Late')
+        self.paid = Customer.objects.create(user=self.user, name='Paid')
+        self.quiet = Customer.objects.create(user=self.user, name='Quiet')
+        for customer in (self.late, self.paid, self.quiet):
+            Debt.objects.create(customer=customer, amount=Decimal('100'))
+        Debt.objects.create(customer=self.paid, amount=Decimal('-60'), is_settled=True)
+
+    def age(self, customer, days, **filters):
+        """Move a customer's debts back in time, keeping the stored aggregates in step."""
+        then = self.now - timedelta(days=days)
+        Debt.objects.filter(customer=customer, **filters).update(created_at=then)
+        if 'amount__lt' not in filters:
+            Customer.objects.filter(pk=customer.pk).update(oldest_unsettled_at=then)
+
+    def test_only_customers_crossing_the_window_are_refreshed(self):
+        self.age(self.late, 31)
+        self.age(self.paid, 31, amount__lt=0)
+        self.age(self.quiet, 45)
+        SchedulerRun.objects.create(name='reputation-rollover', last_run_at=self.now - timedelta(days=2))
+
+        self.assertEqual(set(window_rollovers(self.now - timedelta(days=2), self.now)), {self.late, self.paid})
+        out = StringIO()
+        call_command('run_scheduler', stdout=out)
+        self.assertIn('Updated reputation for 2 customers', out.getvalue())
+
+        self.late.refresh_from_db()
+        self.assertEqual((self.late.reputation, self.late.reputation_score), ('bad', 10))
+        self.paid.refresh_from_db()
+        self.assertEqual(self.paid.total_paid_30_days, 0)
+        # Crossed before the last run, so already handled then
+        self.quiet.refresh_from_db()
+        self.assertEqual(self.quiet.reputation_score, 70)
+        self.assertGreater(SchedulerRun.objects.get().last_run_at, self.now)
+
+    def test_first_run_refreshes_everyone(self):
+        self.age(self.quiet, 45)
+        call_command('run_scheduler', stdout=StringIO())
+        self.quiet.refresh_from_db()
+        self.assertEqual(self.quiet.reputation, 'bad')
+        self.assertTrue(SchedulerRun.objects.filter(name='reputation-rollover').exists())
+
+
+class DebtWriteTestCase(TestCase):
+    """Every debt operation writes the debt, its owner's aggregates and its journal event exactly once"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='shop', password='secret-pass-123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.customer = Customer.objects.create(user=self.user, name='Ahmed')
+
+    def writes(self, request):
+        with CaptureQueriesContext(connection) as queries:
+            response = request()
+        statements = [query['sql'].split(' ', 1)[0] for query in queries.captured_queries]
+        return response, {verb: statements.count(verb) for verb in ('INSERT', 'UPDATE', 'DELETE') if verb in statements}
+
+    def test_writes_per_operation(self):
+        # Debt row, owner aggregates and journal event - once each
+        response, writes = self.writes(lambda: self.client.post(
+            '/api/debts/', {'customer': self.customer.pk, 'amount': '100.00', 'note': 'Rice'}, format='json'))
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(writes, {'INSERT': 2, 'UPDATE': 1})
+        debt_id = response.data['id']
+
+        response, writes = self.writes(lambda: self.client.put(
+            f'/api/debts/{debt_id}/', {'customer': self.customer.pk, 'amount': '80.00', 'note': 'Rice'}, format='json'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(writes, {'INSERT': 1, 'UPDATE': 2})
+
+        response, writes = self.writes(lambda: self.client.delete(f'/api/debts/{debt_id}/'))
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(writes, {'INSERT': 1, 'UPDATE': 1, 'DELETE': 1})
+
+        self.assertEqual(list(Event.objects.filter(entity_type='debt', entity_id=debt_id)
+                              .order_by('-created_at', '-id').values_list('action', flat=True)),
+                         ['delete', 'update', 'create'])
+        self.customer.refresh_from_db()
+        self.assertEqual(self.customer.total_debt, 0)
+
+
+class PlannerFixturesMixin:
+    def plans(self, seed, count, places):
+        rng = random.Random(seed)
+        unit = Decimal(1).scaleb(-places)
+        plans = []
+        for _ in range(count):
+            total = Decimal(rng.randint(1, 5000000)) * unit
+            paid = (total * Decimal(rng.random() / 2)).quantize(unit)
+            plans.append(PaymentPlan(total_debt=total, paid_amount=paid, remaining_debt=total - paid,
+                                     manual_priority=rng.choice([1, 2, 3, 4])))
+        return plans
+
+    def balances(self, seed, days):
+        rng = random.Random(seed)
+        return {(date(2030, 1, 1) + timedelta(days=offset)).isoformat(): Decimal(rng.randint(-500, 3000000)) / 100
+                for offset in range(days)}
+
+
+class PlannerEngineTestCase(PlannerFixturesMixin, TestCase):
+    def assertEnginesAgree(self, engine):
+        for seed in range(40):
+            places = 3 if seed % 4 == 0 else 2
+            count = random.Random(seed).randint(1, 40)
+            balances = self.balances(seed, 45)
+            expected = PaymentPlanner().schedule_payments(self.plans(seed, count, places), balances, 'decimal')
+            actual = PaymentPlanner().schedule_payments(self.plans(seed, count, places), balances, engine)
+
+            self.assertEqual(
+                [(s.scheduled_date, s.payment_plan.total_debt, s.scheduled_amount) for s in actual['schedules']],
+                [(s.scheduled_date, s.payment_plan.total_debt, s.scheduled_amount) for s in expected['schedules']],
+            )
+            self.assertEqual([(p.paid_amount, p.remaining_debt) for p in actual['payment_plans']],
+                             [(p.paid_amount, p.remaining_debt) for p in expected['payment_plans']])
+            self.assertEqual(actual['total_scheduled'], expected['total_scheduled'])
+
+    def test_fixed_point_engine_matches_decimal(self):
+        self.assertEnginesAgree('fixed')
+
+    def test_unknown_engine(self):
+        with self.assertRaises(ValueError):
+            PaymentPlanner().schedule_payments([], {}, 'abacus')
+
+
+@skipUnless(numpy, 'numpy is not installed')
+class NumpyPlannerParityTestCase(PlannerFixturesMixin, TestCase):
+    def test_numpy_engine_matches_decimal_within_a_cent(self):
+        for seed in range(40):
+            count = random.Random(seed).randint(1, 40)
+            balances = self.balances(seed, 45)
+            expected = PaymentPlanner().schedule_payments(self.plans(seed, count, 2), balances, 'decimal')
+            actual = PaymentPlanner().schedule_payments(self.plans(seed, count, 2), balances, 'numpy')
+
+            # The first funded day starts from identical balances
+            first_day = min((s.scheduled_date for s in expected['schedules']), default=None)
+            shares = {s.payment_plan.total_debt: s.scheduled_amount
+                      for s in expected['schedules'] if s.scheduled_date == first_day}
+            for schedule in actual['schedules']:
+                if schedule.scheduled_date == first_day:
+                    self.assertLessEqual(abs(schedule.scheduled_amount - shares[schedule.payment_plan.total_debt]),
+                                         Decimal('0.01'))
+
+            # Every day hands out whole cents without exceeding the balance or any debt
+            for day, available in balances.items():
+                handed_out = sum(s.scheduled_amount for s in actual['schedules'] if s.scheduled_date.isoformat() == day)
+                self.assertLessEqual(handed_out, max(available, 0))
+            for plan in actual['payment_plans']:
+                self.assertGreaterEqual(plan.remaining_debt, 0)
+                self.assertEqual(plan.paid_amount + plan.remaining_debt, plan.total_debt)
+            self.assertLessEqual(abs(actual['total_scheduled'] - expected['total_scheduled']),
+                                 Decimal('0.01') * count * len(balances))
+
+    def test_sub_cent_balances_match_fixed_engine(self):
+        for seed in range(20):
+            rng = random.Random(seed)
+            debts = [Decimal(rng.randint(1, 9)) / 1000 for _ in range(rng.randint(1, 8))] + \
+                    [Decimal(rng.randint(1000, 500000)) / 1000 for _ in range(rng.randint(0, 4))]
+            plans = lambda: [PaymentPlan(total_debt=debt, paid_amount=0, remaining_debt=debt,
+                                         manual_priority=rng.choice([1, 2, 3, 4])) for debt in debts]
+            balances = {(date(2030, 1, 1) + timedelta(days=offset)).isoformat(): Decimal(rng.randint(1, 2000)) / 100
+                        for offset in range(5)}
+            rng.seed(seed)
+            fixed = PaymentPlanner().schedule_payments(plans(), balances, 'fixed')
+            rng.seed(seed)
+            actual = PaymentPlanner().schedule_payments(plans(), balances, 'numpy')
+
+            for expected, plan in zip(fixed['payment_plans'], actual['payment_plans']):
+                # Never more than the balance rounded to cents, which is what the fixed engine pays
+                self.assertLessEqual(plan.paid_amount, plan.total_debt.quantize(Decimal('0.01')))
+                if plan.total_debt < Decimal('0.01'):
+                    self.assertEqual(plan.paid_amount, expected.paid_amount)
+            self.assertLessEqual(abs(actual['total_scheduled'] - fixed['total_scheduled']),
+                                 Decimal('0.01') * len(debts) * len(balances))
+
+    @override_settings(PAYMENT_PLANNER_ENGINE='numpy')
+    def test_engine_from_settings(self):
+        result = PaymentPlanner().schedule_payments(self.plans(1, 3, 2), {'2030-01-01': Decimal('100.00')})
+        self.assertEqual(result['total_scheduled'], Decimal('100.00'))
+
+
+class PlannerEntityResolutionTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='shop', password='secret-pass-123')
+        self.other = User.objects.create_user(username='other', password='secret-pass-123')
+
+    def debts(self, names):
+        return [{'company': name, 'totalDebt': 100, 'paid': 0} for name in names]
+
+    def test_resolution_is_scoped_to_the_user(self):
+        theirs = Company.objects.create(user=self.other, name='Shared name', phone='1')
+        customer = Customer.objects.create(user=self.user, name='Known customer', phone='2')
+        result = PaymentPlanner().generate_payment_plan(
+            {'2030-01-01': Decimal('50')}, self.debts(['Shared name', 'Known customer']), self.user)
+
+        plans = {plan.company or plan.customer: plan for plan in result['payment_plans']}
+        self.assertIn(customer, plans)
+        self.assertNotIn(theirs, plans)
+        self.assertTrue(Company.objects.filter(user=self.user, name='Shared name').exists())
+
+    def test_query_count_does_not_grow_with_debts(self):
+        for count in (2, 20):
+            names = [f'Supplier {count}-{index}' for index in range(count)]
+            Company.objects.bulk_create([Company(user=self.user, name=name) for name in names[::2]])
+            # Companies, customers for the rest, bulk insert of the new companies, summary drop
+            with self.assertNumQueries(4):
+                result = PaymentPlanner().generate_payment_plan({'2030-01-01': Decimal('50')},
+                                                                self.debts(names), self.user)
+            self.assertEqual(len(result['payment_plans']), count)
+
+    def test_new_companies_reach_the_dashboard(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        self.assertEqual(client.get('/api/dashboard/').data['company_count'], 0)
+        PaymentPlanner().generate_payment_plan({'2030-01-01': Decimal('50')},
+                                               self.debts(['New supplier']), self.user)
+        self.assertEqual(client.get('/api/dashboard/').data['company_count'], 1)
+
+
+class DashboardTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='shop', password='secret-pass-123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.customers = [Customer.objects.create(user=self.user, name=f'Customer {i}', phone=str(i))
+                          for i in range(12)]
+        self.company = Company.objects.create(user=self.user, name='Supplier', phone='0770')
+
+    def assertMatchesRebuild(self):
+        stored = DashboardSummary.objects.get(user=self.user)
+        rebuilt = dashboard.rebuild(self.user)
+        for field in ('total_receivables', 'total_payables', 'reputation_counts', 'top_customers',
+                      'top_companies', 'customer_due_dates', 'company_due_dates'):
+            self.assertEqual(getattr(stored, field), getattr(rebuilt, field), field)
+
+    def test_ledger_writes_keep_summary_current(self):
+        self.client.get('/api/dashboard/')
+        debts = []
+        for index, customer in enumerate(self.customers):
+            debts.append(Debt.objects.create(customer=customer, amount=Decimal(10 * (index + 1)),
+                                             due_date=date(2020, 1, 1) if index % 3 == 0 else date(2099, 1, 1)))
+        Debt.objects.create(company=self.company, amount=Decimal('75'), due_date=date(2020, 6, 1))
+        self.assertMatchesRebuild()
+
+        # The largest debtor pays off and drops out of the top list
+        debts[-1].amount = Decimal('1')
+        debts[-1].due_date = None
+        debts[-1].save()
+        debts[0].delete()
+        self.assertMatchesRebuild()
+
+    def test_endpoint_reads_one_row(self):
+        Debt.objects.create(customer=self.customers[0], amount=Decimal('40'), due_date=date(2020, 1, 1))
+        Debt.objects.create(customer=self.customers[1], amount=Decimal('60'), due_date=date(2099, 1, 1))
+        self.client.get('/api/dashboard/')
+
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/dashboard/?limit=1')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Decimal(response.data['total_receivables']), Decimal('100'))
+        self.assertEqual(response.data['overdue_customers'], 1)
+        self.assertEqual(response.data['customer_count'], 12)
+        self.assertEqual([row['name'] for row in response.data['top_customers']], ['Customer 1'])
+
+    def test_profile_changes_invalidate(self):
+        self.client.get('/api/dashboard/')
+        self.client.delete(f'/api/customers/{self.customers[0].pk}/')
+        self.assertFalse(DashboardSummary.objects.filter(user=self.user).exists())
+        self.assertEqual(self.client.get('/api/dashboard/').data['customer_count'], 11)
+
+    def test_shop_money_writes_keep_summary_current(self):
+        self.client.post('/api/shop-money/', {'current_money': '100.00'})
+        self.client.get('/api/dashboard/')
+        shop_money = ShopMoney.objects.get(user=self.user)
+
+        self.client.put(f'/api/shop-money/{shop_money.pk}/', {'current_money': '250.00'})
+        self.assertEqual(DashboardSummary.objects.get(user=self.user).shop_money, Decimal('250.00'))
+        self.client.patch(f'/api/shop-money/{shop_money.pk}/', {'current_money': '75.50'})
+        self.assertEqual(Decimal(self.client.get('/api/dashboard/').data['shop_money']), Decimal('75.50'))
+        self.client.delete(f'/api/shop-money/{shop_money.pk}/')
+        self.assertEqual(Decimal(self.client.get('/api/dashboard/').data['shop_money']), 0)
+
+
+class QueryPlanTestCase(TestCase):
+    """The hot queries of views.py and models.py must be answered from an index"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='shop', password='secret-pass-123')
+        cls.customers = Customer.objects.bulk_create(
+            [Customer(user=cls.user, name=f'Customer {i}') for i in range(50)])
+        cls.companies = Company.objects.bulk_create(
+            [Company(user=cls.user, name=f'Supplier {i}') for i in range(20)])
+        now = timezone.now()
+        # bulk_create skips the ledger, which is fine for query plans
+        Debt.objects.bulk_create([
+            Debt(customer=cls.customers[i % 50] if i % 3 else None, company=None if i % 3 else cls.companies[i % 20],
+                 amount=Decimal(-10 if i % 4 == 0 else 25), is_settled=i % 5 == 0,
+                 due_date=date(2030, 1, 1) + timedelta(days=i % 90), created_at=now - timedelta(days=i % 60))
+            for i in range(2000)
+        ])
+        plan = PaymentPlan.objects.create(customer=cls.customers[0], total_debt=100, remaining_debt=100)
+        PaymentSchedule.objects.bulk_create([
+            PaymentSchedule(payment_plan=plan, scheduled_date=date(2030, 1, 1) + timedelta(days=i),
+                            scheduled_amount=Decimal('1'))
+            for i in range(200)
+        ])
+        Event.objects.bulk_create([
+            Event(user=cls.user, action='create', kind='debt_created', entity_type='debt', entity_id=i,
+                  customer=cls.customers[i % 50], description='debt')
+            for i in range(1000)
+        ])
+
+    def assertIndexed(self, queryset):
+        if connection.vendor == 'postgresql':
+            # Tiny tables are cheaper to scan - make the planner show whether an index exists at all
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+            plan = queryset.explain()
+            self.assertNotIn('Seq Scan', plan, plan)
+        else:
+            # SQLite reports indexed lookups as SEARCH and full table/index walks as SCAN
+            plan = queryset.explain()
+            self.assertFalse(re.search(r'\bSCAN\b', plan), plan)
+
+    def test_hot_queries_use_indexes(self):
+        customer, company = self.customers[1], self.companies[1]
+        now, today = timezone.now(), date.today()
+        plan = PaymentPlan.objects.get()
+        queries = {
+            'entity debts': Debt.objects.filter(customer_id=customer.pk).order_by('-created_at'),
+            'company debts': Debt.objects.filter(company_id=company.pk).order_by('-created_at'),
+            'user debts': Debt.objects.filter(owned_by(self.user)).order_by('-created_at'),
+            'recent payments': customer.debts.filter(created_at__gte=now - timedelta(days=30), amount__lt=0),
+            'unsettled': customer.debts.filter(is_settled=False),
+            'oldest unsettled': customer.debts.filter(is_settled=False).order_by('created_at')[:1],
+            'company unsettled': company.debts.filter(is_settled=False).order_by('created_at')[:1],
+            'overdue': customer.debts.filter(is_settled=False, due_date__isnull=False, due_date__lt=today),
+            'earliest due date': customer.debts.filter(due_date__isnull=False).order_by('due_date')[:1],
+            'customer list': with_earliest_due_date(Customer.objects.filter(user=self.user), 'customer'),
+            'company list': with_earliest_due_date(Company.objects.filter(user=self.user), 'company'),
+            'top debtors': Customer.objects.filter(user=self.user).order_by('-total_debt')[:10],
+            'activities': Event.objects.filter(customer_id=customer.pk).order_by('-created_at'),
+            'audit log': Event.objects.filter(entity_type='debt', entity_id=7).order_by('-created_at'),
+            'user journal': Event.objects.filter(user=self.user).order_by('-created_at', '-id')[:51],
+            'cold events': archive.cold_rows(Event, timedelta(days=30))[:1000],
+            'cold schedules': archive.cold_rows(PaymentSchedule, timedelta(days=30))[:1000],
+            'plan schedules': plan.schedules.filter(scheduled_date__gte=date(2030, 2, 1)),
+            'schedule range': PaymentSchedule.objects.filter(
+                models.Q(payment_plan__customer__user=self.user) | models.Q(payment_plan__company__user=self.user),
+                scheduled_date__range=(date(2030, 1, 1), date(2030, 1, 31)),
+            ).order_by('scheduled_date', 'id'),
+            'aged unsettled debt': Customer.objects.filter(
+                oldest_unsettled_at__gte=now - timedelta(days=32), oldest_unsettled_at__lt=now - timedelta(days=30)),
+            'aged payments': Debt.objects.filter(
+                amount__lt=0, created_at__gte=now - timedelta(days=32), created_at__lt=now - timedelta(days=30)),
+        }
+        for label, queryset in queries.items():
+            with self.subTest(label):
+                self.assertIndexed(queryset)
@@ -0,0 +1,140 @@
+"""
+Write-through token -> user cache for ExpiringTokenAuthentication.
+
+Every authenticated request resolves its token; the cache keeps the resolved
+(user, token) pair in process memory so repeated requests skip the database.
+Entries are bounded in number (least recently used are dropped first) and in
+age.
+
+Each entry also records the user's revocation version, a counter in the
+shared cache tier (CACHE_URL) that is bumped when one of the user's tokens is
+deleted (logout) or the user is saved or deleted. A hit is only served while
+the counter is unchanged, so logout and deactivation take effect on the next
+request of every process that shares that cache tier.
+
+The price is one cache read per hit, and what it buys depends on the tier:
+
+    locmem://   no I/O, but only the process that served the logout sees it;
+                other processes keep serving a revoked token for up to
+                TOKEN_CACHE_TTL seconds
+    file://     a file read and unpickle per hit; shared by the processes of
+                one box only
+    db://       one query per hit - cheaper than the token/user join it
+                replaces, but no longer free
+    redis://    one round trip per hit; the only tier that revokes across boxes
+
+Deployments that run more than one process should point CACHE_URL at a shared
+tier; otherwise TOKEN_CACHE_TTL is the revocation delay.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+
+def _version_key(user_id):
+    return f'auth_version:{user_id}'
+
+
+def auth_version(user_id):
+    """Current revocation version of the user, initialising a missing counter."""
+    key = _version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        # Start from the clock, so an evicted counter never reuses an old version
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+def revoke(user_id):
+    """Invalidate the user's cached tokens in every process once the transaction commits."""
+    def increment():
+        key = _version_key(user_id)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, time.time_ns(), None)
+    transaction.on_commit(increment)
+
+
+class TokenCache:
+    """Bounded LRU of token key -> (user, token, expires_at, version) with hit/miss counters."""
+
+    def __init__(self, max_size=1000, ttl=60):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the cached (user, token) for `key`, or None on a miss or after a revocation."""
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None and (entry[2] <= time.monotonic() or entry[3] != auth_version(entry[0].pk)):
+            self.evict(key)
+            entry = None
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            if key in self._entries:
+                self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0], entry[1]
+
+    def set(self, key, user, token, version):
+        with self._lock:
+            self._entries[key] = (user, token, time.monotonic() + self.ttl, version)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def evict(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def evict_user(self, user_id):
+        with self._lock:
+            for key in [key for key, entry in self._entries.items() if entry[0].pk == user_id]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else 0,
+            }
+
+
+token_cache = TokenCache(
+    max_size=getattr(settings, 'TOKEN_CACHE_SIZE', 1000),
+    ttl=getattr(settings, 'TOKEN_CACHE_TTL', 60),
+)
+
+
+def evict_token(sender, instance, **kwargs):
+    """post_delete receiver for Token."""
+    token_cache.evict(instance.key)
+    revoke(instance.user_id)
+
+
+def evict_user(sender, instance, **kwargs):
+    """post_save/post_delete receiver for the user model."""
+    token_cache.evict_user(instance.pk)
+    revoke(instance.pk)
@@ -1,11 +1,11 @@
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
-from .views import (UserLoginView, UserLogoutView, UserProfileView, check_auth_status, cors_test,
+from .views import (UserLoginView, UserLogoutView, UserProfileView, check_auth_status, token_cache_stats, cors_test,
                           CustomerViewSet, CompanyViewSet, DebtViewSet, AuditLogViewSet,
                           PaymentPlanViewSet, PaymentScheduleViewSet, DailyBalanceViewSet,
                           ShopMoneyViewSet, EntityActivityViewSet, CurrencyViewSet, generate_payment_plan, get_payment_schedule, 
-                          mark_payment_completed, payment_analytics, update_all_reputations,
-                          update_customer_reputation, check_customer_credit)
+                          mark_payment_completed, payment_analytics, dashboard, update_all_reputations,
+                          update_customer_reputation, check_customer_credit, JobViewSet)
 
 
 router = DefaultRouter()
@@ -19,6 +19,7 @@ router.register(r'payment-schedules', PaymentScheduleViewSet)
 router.register(r'daily-balances', DailyBalanceViewSet)
 router.register(r'shop-money', ShopMoneyViewSet)
 router.register(r'currencies', CurrencyViewSet)
+router.register(r'jobs', JobViewSet, basename='jobs')
 
 
 urlpatterns = [
@@ -27,6 +28,7 @@ urlpatterns = [
     path('auth/logout/', UserLogoutView.as_view(), name='user-logout'),
     path('auth/profile/', UserProfileView.as_view(), name='user-profile'),
     path('auth/status/', check_auth_status, name='auth-status'),
+    path('auth/token-cache/', token_cache_stats, name='token-cache-stats'),
     
     # CORS Test URL
     path('cors-test/', cors_test, name='cors-test'),
@@ -37,6 +39,7 @@ urlpatterns = [
     path('schedule/', get_payment_schedule, name='get-payment-schedule'),
     path('mark-completed/<int:schedule_id>/', mark_payment_completed, name='mark-payment-completed'),
     path('analytics/', payment_analytics, name='payment-analytics'),
+    path('dashboard/', dashboard, name='dashboard'),
     path('update-all-reputations/', update_all_reputations, name='update-all-reputations'),
     path('update-customer-reputation/<int:customer_id>/', update_customer_reputation, name='update-customer-reputation'),
     path('check-customer-credit/<int:customer_id>/', check_customer_credit, name='check-customer-credit'),
@@ -1,24 +1,35 @@
 from rest_framework import viewsets, status
 from rest_framework.decorators import action, api_view, permission_classes
-from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.authtoken.models import Token
 from rest_framework.throttling import AnonRateThrottle
+from rest_framework.utils.encoders import JSONEncoder
 from django.contrib.auth import login, logout
 from django.contrib.auth.models import User
 from django.core.cache import cache
 from django.utils import timezone
 from django.db import models
+from django.http import StreamingHttpResponse
+from django.urls import reverse
 from decimal import Decimal
 from datetime import datetime, timedelta
+import json
 import logging
-from .models import UserProfile, Customer, Company, Debt, AuditLog, PaymentPlan, PaymentSchedule, DailyBalance, ShopMoney, EntityActivity, Currency
+from .models import UserProfile, Customer, Company, Debt, Event, PaymentPlan, PaymentSchedule, DailyBalance, ShopMoney, Currency, Job
 from .serializers import (UserLoginSerializer, UserProfileSerializer, UserUpdateSerializer,
                          CustomerSerializer, CompanySerializer, DebtSerializer, AuditLogSerializer,
                          PaymentPlanSerializer, PaymentScheduleSerializer, DailyBalanceSerializer,
-                         PaymentPlanGenerationSerializer, ShopMoneySerializer, EntityActivitySerializer, CurrencySerializer)
-from .payment_algorithm import PaymentPlanner
+                         PaymentPlanGenerationSerializer, ShopMoneySerializer, EntityActivitySerializer, CurrencySerializer,
+                         JobSerializer)
+from . import archive, credit, importer, jobs, journal, tasks
+from . import dashboard as dashboard_summary
+from . import debts as debt_writes
+from .export import ExportMixin
+from .pagination import KeysetPagination, ScheduleKeysetPagination, keyset_page
+from .response_cache import cached_response
+from .token_cache import token_cache
 
 
 
@@ -154,6 +165,12 @@ def check_auth_status(request):
             'user': None
         })
 
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def token_cache_stats(request):
+    """Size and hit/miss counters of this process's token cache"""
+    return Response(token_cache.stats())
+
 @api_view(['GET', 'POST', 'OPTIONS'])
 @permission_classes([AllowAny])
 def cors_test(request):
@@ -166,15 +183,30 @@ def cors_test(request):
     })
 
 
+def owned_by(user):
+    """Tenant filter for rows hanging off a customer or company, as two indexed IN subqueries"""
+    return (models.Q(customer__in=Customer.objects.filter(user=user).values('pk')) |
+            models.Q(company__in=Company.objects.filter(user=user).values('pk')))
+
+
+def with_earliest_due_date(queryset, owner_field):
+    """Annotate each customer/company with its earliest debt due date in the same SELECT"""
+    earliest = Debt.objects.filter(**{owner_field: models.OuterRef('pk'), 'due_date__isnull': False}) \
+        .order_by('due_date') \
+        .values('due_date')[:1]
+    return queryset.annotate(earliest_due_date=models.Subquery(earliest, output_field=models.DateField()))
+
+
 class CustomerViewSet(viewsets.ModelViewSet):
     queryset = Customer.objects.all()
     serializer_class = CustomerSerializer
 
     def get_queryset(self):
         # Filter customers by the authenticated user
-        return Customer.objects.filter(user=self.request.user)
+        return with_earliest_due_date(Customer.objects.filter(user=self.request.user), 'customer')
 
     @action(detail=True, methods=["get"])
+    @cached_response
     def debts(self, request, pk=None):
         # Verify the customer belongs to the current user
         try:
@@ -188,49 +220,19 @@ class CustomerViewSet(viewsets.ModelViewSet):
         instance = serializer.save(user=self.request.user)
         # Update reputation for new customer
         instance.update_reputation()
-        AuditLog.objects.create(
-            action="create",
-            entity_type="customer",
-            entity_id=instance.id,
-            description=f"Customer {instance.name}",
-        )
-        # Create entity activity
-        EntityActivity.objects.create(
-            customer=instance,
-            activity_type='profile_created',
-            description=f"Customer profile created: {instance.name}",
-        )
+        journal.record(self.request.user, 'profile_created', instance, f"Customer profile created: {instance.name}")
+        dashboard_summary.invalidate(self.request.user)
 
     def perform_update(self, serializer):
         instance = serializer.save()
         # Update reputation when customer is updated
         instance.update_reputation()
-        AuditLog.objects.create(
-            action="update",
-            entity_type="customer",
-            entity_id=instance.id,
-            description=f"Customer {instance.name} updated",
-        )
-        # Create entity activity
-        EntityActivity.objects.create(
-            customer=instance,
-            activity_type='profile_updated',
-            description=f"Customer profile updated: {instance.name}",
-        )
+        journal.record(self.request.user, 'profile_updated', instance, f"Customer profile updated: {instance.name}")
+        dashboard_summary.invalidate(self.request.user)
 
     def perform_destroy(self, instance):
-        AuditLog.objects.create(
-            action="delete",
-            entity_type="customer",
-            entity_id=instance.id,
-            description=f"Customer {instance.name}",
-        )
-        # Create entity activity
-        EntityActivity.objects.create(
-            customer=instance,
-            activity_type='profile_deleted',
-            description=f"Customer profile deleted: {instance.name}",
-        )
+        journal.record(self.request.user, 'profile_deleted', instance, f"Customer profile deleted: {instance.name}")
+        dashboard_summary.invalidate(self.request.user)
         return super().perform_destroy(instance)
 
 
@@ -240,9 +242,10 @@ class CompanyViewSet(viewsets.ModelViewSet):
 
     def get_queryset(self):
         # Filter companies by the authenticated user
-        return Company.objects.filter(user=self.request.user)
+        return with_earliest_due_date(Company.objects.filter(user=self.request.user), 'company')
 
     @action(detail=True, methods=["get"])
+    @cached_response
     def debts(self, request, pk=None):
         # Verify the company belongs to the current user
         try:
@@ -254,60 +257,32 @@ class CompanyViewSet(viewsets.ModelViewSet):
 
     def perform_create(self, serializer):
         instance = serializer.save(user=self.request.user)
-        AuditLog.objects.create(
-            action="create",
-            entity_type="company",
-            entity_id=instance.id,
-            description=f"Company {instance.name}",
-        )
-        # Create entity activity
-        EntityActivity.objects.create(
-            company=instance,
-            activity_type='profile_created',
-            description=f"Company profile created: {instance.name}",
-        )
+        journal.record(self.request.user, 'profile_created', instance, f"Company profile created: {instance.name}")
+        dashboard_summary.invalidate(self.request.user)
 
     def perform_update(self, serializer):
         instance = serializer.save()
-        AuditLog.objects.create(
-            action="update",
-            entity_type="company",
-            entity_id=instance.id,
-            description=f"Company {instance.name} updated",
-        )
-        # Create entity activity
-        EntityActivity.objects.create(
-            company=instance,
-            activity_type='profile_updated',
-            description=f"Company profile updated: {instance.name}",
-        )
+        journal.record(self.request.user, 'profile_updated', instance, f"Company profile updated: {instance.name}")
+        dashboard_summary.invalidate(self.request.user)
 
     def perform_destroy(self, instance):
-        AuditLog.objects.create(
-            action="delete",
-            entity_type="company",
-            entity_id=instance.id,
-            description=f"Company {instance.name}",
-        )
-        # Create entity activity
-        EntityActivity.objects.create(
-            company=instance,
-            activity_type='profile_deleted',
-            description=f"Company profile deleted: {instance.name}",
-        )
+        journal.record(self.request.user, 'profile_deleted', instance, f"Company profile deleted: {instance.name}")
+        dashboard_summary.invalidate(self.request.user)
         return super().perform_destroy(instance)
 
 
-class DebtViewSet(viewsets.ModelViewSet):
+class DebtViewSet(ExportMixin, viewsets.ModelViewSet):
     queryset = Debt.objects.all().order_by('-created_at')
     serializer_class = DebtSerializer
+    pagination_class = KeysetPagination
+    export_name = 'debts'
+    export_fields = ('id', 'customer_id', 'company_id', 'amount', 'currency__code', 'note', 'is_settled',
+                     'due_date', 'created_at', 'updated_at')
     
     def get_queryset(self):
         # Filter debts by user - only show debts for customers/companies owned by the current user
         user = self.request.user
-        queryset = Debt.objects.filter(
-            models.Q(customer__user=user) | models.Q(company__user=user)
-        ).order_by('-created_at')
+        queryset = Debt.objects.filter(owned_by(user)).order_by('-created_at', '-id')
         
         customer_id = self.request.query_params.get('customer')
         company_id = self.request.query_params.get('company')
@@ -319,6 +294,34 @@ class DebtViewSet(viewsets.ModelViewSet):
             
         return queryset
 
+    @action(detail=False, methods=["post"])
+    def bulk(self, request):
+        """
+        Import many debts at once.
+
+        Accepts a JSON list of rows, {"rows": [...]}, or a CSV/NDJSON upload in
+        the "file" field. Valid rows are created, the others are reported.
+        """
+        upload = request.FILES.get('file')
+        if upload is not None:
+            rows = importer.read_upload(upload, request.data.get('format'))
+        else:
+            rows = request.data.get('rows') if isinstance(request.data, dict) else request.data
+            if not isinstance(rows, list):
+                return Response({'error': 'Expected a list of rows or a file upload'}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            report = importer.import_debts(request.user, rows)
+        except importer.MalformedFile as exc:
+            return Response({'error': str(exc), 'row': exc.row}, status=status.HTTP_400_BAD_REQUEST)
+        except ValueError as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        if report.created:
+            response_status = status.HTTP_201_CREATED
+        else:
+            response_status = status.HTTP_400_BAD_REQUEST if report.errors else status.HTTP_200_OK
+        return Response({'created': report.created, 'errors': report.errors}, status=response_status)
+
     def perform_create(self, serializer):
         customer = serializer.validated_data.get('customer')
         company = serializer.validated_data.get('company')
@@ -326,138 +329,28 @@ class DebtViewSet(viewsets.ModelViewSet):
             raise ValueError("Either customer or company must be provided")
         if customer and company:
             raise ValueError("Provide only one of customer or company")
-        instance = serializer.save()
-        
-        # Ensure total_debt is updated after debt creation
-        if customer:
-            customer.update_total_debt()
-        elif company:
-            company.update_total_debt()
-        
-        # Create audit log for the debt
-        AuditLog.objects.create(
-            action="create",
-            entity_type="debt",
-            entity_id=instance.id,
-            description=instance.note or "",
-            amount=instance.amount,
-        )
-        
-        # Create entity activity for the associated customer or company
-        if customer:
-            EntityActivity.objects.create(
-                customer=customer,
-                activity_type='debt_created',
-                description=f"Debt added: {instance.note or 'No description'}",
-                amount=instance.amount,
-                related_object_type='debt',
-                related_object_id=instance.id,
-            )
-        elif company:
-            EntityActivity.objects.create(
-                company=company,
-                activity_type='debt_created',
-                description=f"Debt added: {instance.note or 'No description'}",
-                amount=instance.amount,
-                related_object_type='debt',
-                related_object_id=instance.id,
-            )
+        # Debt.save() posts to the ledger; the debt, aggregates and log rows are written once, atomically
+        debt_writes.create(self.request.user, serializer)
 
     def perform_destroy(self, instance):
-        # Store references before deletion
-        customer = instance.customer
-        company = instance.company
-        
-        # Create audit log for the debt
-        AuditLog.objects.create(
-            action="delete",
-            entity_type="debt",
-            entity_id=instance.id,
-            description=instance.note or "",
-            amount=instance.amount,
-        )
-        
-        # Create entity activity for the associated customer or company
-        if customer:
-            EntityActivity.objects.create(
-                customer=customer,
-                activity_type='debt_deleted',
-                description=f"Debt deleted: {instance.note or 'No description'}",
-                amount=instance.amount,
-                related_object_type='debt',
-                related_object_id=instance.id,
-            )
-        elif company:
-            EntityActivity.objects.create(
-                company=company,
-                activity_type='debt_deleted',
-                description=f"Debt deleted: {instance.note or 'No description'}",
-                amount=instance.amount,
-                related_object_type='debt',
-                related_object_id=instance.id,
-            )
-        
-        # Delete the debt first
-        super().perform_destroy(instance)
-        
-        # Update total_debt after deletion
-        if customer:
-            customer.update_total_debt()
-        elif company:
-            company.update_total_debt()
+        debt_writes.delete(self.request.user, instance)
 
     def perform_update(self, serializer):
-        instance = serializer.save()
-        
-        # The Debt.save() method will automatically update total_debt
-        # But we need to ensure it's called by saving the instance again
-        instance.save()
-        
-        # Create audit log for the debt update
-        AuditLog.objects.create(
-            action="create",  # Using "create" for updates to maintain consistency
-            entity_type="debt",
-            entity_id=instance.id,
-            description=f"Debt updated: {instance.note or 'No description'}",
-            amount=instance.amount,
-        )
-        
-        # Create entity activity for the associated customer or company
-        if instance.customer:
-            EntityActivity.objects.create(
-                customer=instance.customer,
-                activity_type='debt_updated',
-                description=f"Debt updated: {instance.note or 'No description'}",
-                amount=instance.amount,
-                related_object_type='debt',
-                related_object_id=instance.id,
-            )
-        elif instance.company:
-            EntityActivity.objects.create(
-                company=instance.company,
-                activity_type='debt_updated',
-                description=f"Debt updated: {instance.note or 'No description'}",
-                amount=instance.amount,
-                related_object_type='debt',
-                related_object_id=instance.id,
-            )
-
-
-class AuditLogViewSet(viewsets.ReadOnlyModelViewSet):
-    queryset = AuditLog.objects.all()
+        debt_writes.update(self.request.user, serializer)
+
+
+class AuditLogViewSet(ExportMixin, viewsets.ReadOnlyModelViewSet):
+    """The event journal as an audit log"""
+    queryset = Event.objects.all()
     serializer_class = AuditLogSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
+    export_name = 'audit-log'
+    export_fields = ('id', 'action', 'entity_type', 'entity_id', 'description', 'amount', 'created_at')
     
     def get_queryset(self):
-        # Filter audit logs by user - only show logs for entities owned by the current user
-        user = self.request.user
-        queryset = AuditLog.objects.filter(
-            models.Q(entity_type='customer', entity_id__in=Customer.objects.filter(user=user).values_list('id', flat=True)) |
-            models.Q(entity_type='company', entity_id__in=Company.objects.filter(user=user).values_list('id', flat=True)) |
-            models.Q(entity_type='debt', entity_id__in=Debt.objects.filter(
-                models.Q(customer__user=user) | models.Q(company__user=user)
-            ).values_list('id', flat=True))
-        )
+        # Filter the journal by owner - a single indexed equality, walked by (created_at, id)
+        queryset = archive.scope(Event, self.request).filter(user=self.request.user)
         
         entity_type = self.request.query_params.get('entity_type')
         entity_id = self.request.query_params.get('entity_id')
@@ -467,7 +360,7 @@ class AuditLogViewSet(viewsets.ReadOnlyModelViewSet):
         if entity_id:
             queryset = queryset.filter(entity_id=entity_id)
             
-        return queryset.order_by('-created_at')
+        return queryset.order_by('-created_at', '-id')
 
 
 class PaymentPlanViewSet(viewsets.ModelViewSet):
@@ -478,16 +371,18 @@ class PaymentPlanViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         # Filter payment plans by user - only show plans for customers/companies owned by the current user
         user = self.request.user
-        return PaymentPlan.objects.filter(
-            models.Q(customer__user=user) | models.Q(company__user=user),
-            is_active=True
-        ).order_by('manual_priority', 'remaining_debt')
+        return PaymentPlan.objects.filter(owned_by(user), is_active=True).order_by('manual_priority', 'remaining_debt')
 
 
-class PaymentScheduleViewSet(viewsets.ModelViewSet):
+class PaymentScheduleViewSet(ExportMixin, viewsets.ModelViewSet):
     queryset = PaymentSchedule.objects.all()
     serializer_class = PaymentScheduleSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = ScheduleKeysetPagination
+    export_name = 'payment-schedules'
+    export_fields = ('id', 'payment_plan_id', 'payment_plan__customer_id', 'payment_plan__company_id',
+                     'scheduled_date', 'scheduled_amount', 'actual_amount', 'is_paid', 'paid_at')
+    export_ordering = ('scheduled_date', 'id')
 
     def get_queryset(self):
         import logging
@@ -496,9 +391,9 @@ class PaymentScheduleViewSet(viewsets.ModelViewSet):
         
         # Filter payment schedules by user - only show schedules for customers/companies owned by the current user
         user = self.request.user
-        queryset = PaymentSchedule.objects.filter(
+        queryset = archive.scope(PaymentSchedule, self.request).filter(
             models.Q(payment_plan__customer__user=user) | models.Q(payment_plan__company__user=user)
-        ).order_by('scheduled_date')
+        ).order_by('scheduled_date', 'id')
         
         # Handle query parameters for filtering
         customer_id = self.request.query_params.get('customer')
@@ -554,10 +449,19 @@ class ShopMoneyViewSet(viewsets.ModelViewSet):
             serializer = self.get_serializer(data=request.data)
         
         if serializer.is_valid():
-            serializer.save(user=request.user)
+            shop_money = serializer.save(user=request.user)
+            dashboard_summary.record_shop_money(request.user, shop_money.current_money)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    def perform_update(self, serializer):
+        shop_money = serializer.save()
+        dashboard_summary.record_shop_money(self.request.user, shop_money.current_money)
+
+    def perform_destroy(self, instance):
+        instance.delete()
+        dashboard_summary.record_shop_money(self.request.user, 0)
+
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
@@ -567,7 +471,7 @@ def generate_payment_plan(request):
     
     Expected input:
     {
-        "dailyBalances": {
+        "daily_balances": {
             "2025-01-15": 1000,
             "2025-01-16": 1500,
             "2025-01-17": 800
@@ -592,50 +496,11 @@ def generate_payment_plan(request):
     if not serializer.is_valid():
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
-    data = serializer.validated_data
-    daily_balances = {k: Decimal(str(v)) for k, v in data['dailyBalances'].items()}
-    debts = data['debts']
-    
-    # Generate payment plan using algorithm
-    planner = PaymentPlanner()
-    result = planner.generate_payment_plan(daily_balances, debts)
-    
-    # Save payment plans to database
-    saved_plans = []
-    for plan in result['payment_plans']:
-        plan.save()
-        saved_plans.append(plan)
-    
-    # Save payment schedules to database
-    saved_schedules = []
-    for schedule in result['schedules']:
-        schedule.save()
-        saved_schedules.append(schedule)
-    
-    # Save daily balances
-    for date_str, amount in daily_balances.items():
-        date_obj = datetime.strptime(date_str, '%Y-%m-%d').date()
-        balance, created = DailyBalance.objects.get_or_create(
-            date=date_obj,
-            defaults={'available_amount': amount}
-        )
-        if not created:
-            balance.available_amount = amount
-            balance.save()
-    
-    # Return response with serialized data
-    response_data = {
-        'payment_plans': PaymentPlanSerializer(saved_plans, many=True).data,
-        'schedules': PaymentScheduleSerializer(saved_schedules, many=True).data,
-        'summary': {
-            'total_scheduled': float(result['total_scheduled']),
-            'total_available': float(result['total_available']),
-            'utilization_rate': float(result['utilization_rate']),
-            'days_planned': len(daily_balances),
-            'debts_planned': len(saved_plans)
-        }
-    }
+    # ?async=1 runs the generation on the background worker instead
+    if request.query_params.get('async') == '1':
+        return _job_accepted(request, jobs.enqueue(request.user, 'generate-plan', serializer.validated_data))
     
+    response_data = tasks.generate_plan(request.user, serializer.validated_data)
     return Response(response_data, status=status.HTTP_201_CREATED)
 
 
@@ -650,15 +515,20 @@ def get_payment_schedule(request):
     - end_date: End date (YYYY-MM-DD)
     - entity_id: Filter by specific customer/company ID
     - entity_type: 'customer' or 'company'
+    - page_size: Return one page ordered by (scheduled_date, id) plus a next_cursor
+    - cursor: next_cursor of the previous page
+    - stream: '1' to stream every schedule as NDJSON instead
     """
     start_date = request.query_params.get('start_date')
     end_date = request.query_params.get('end_date')
     entity_id = request.query_params.get('entity_id')
     entity_type = request.query_params.get('entity_type')
+    cursor = request.query_params.get('cursor')
+    page_size = request.query_params.get('page_size')
     
     # Filter payment schedules by user - only show schedules for customers/companies owned by the current user
     user = request.user
-    queryset = PaymentSchedule.objects.filter(
+    queryset = archive.scope(PaymentSchedule, request).filter(
         models.Q(payment_plan__customer__user=user) | models.Q(payment_plan__company__user=user)
     )
     
@@ -672,12 +542,34 @@ def get_payment_schedule(request):
         elif entity_type == 'company':
             queryset = queryset.filter(payment_plan__company_id=entity_id)
     
-    schedules = queryset.order_by('scheduled_date')
+    schedules = queryset.select_related('payment_plan__customer', 'payment_plan__company') \
+        .order_by('scheduled_date', 'id')
+    
+    if request.query_params.get('stream') == '1':
+        return StreamingHttpResponse(
+            _stream_schedules(schedules),
+            content_type='application/x-ndjson',
+        )
+    
+    next_cursor = None
+    if cursor or page_size:
+        try:
+            page_size = min(int(page_size or 50), 500)
+            if page_size < 1:
+                raise ValueError
+            schedules, next_cursor = keyset_page(schedules, ['scheduled_date', 'id'], cursor, page_size)
+        except ValueError:
+            return Response({'error': 'Invalid cursor or page_size'}, status=status.HTTP_400_BAD_REQUEST)
     serializer = PaymentScheduleSerializer(schedules, many=True)
     
-    # Calculate summary statistics
-    total_scheduled = sum(s.scheduled_amount for s in schedules)
-    total_paid = sum(s.actual_amount for s in schedules if s.is_paid)
+    # Calculate summary statistics for the whole range in one query (per table)
+    totals = archive.aggregate(queryset,
+        scheduled=models.Sum('scheduled_amount'),
+        paid=models.Sum('actual_amount', filter=models.Q(is_paid=True)),
+        days=models.Count('scheduled_date', distinct=True),
+    )
+    total_scheduled = totals['scheduled'] or Decimal('0')
+    total_paid = totals['paid'] or Decimal('0')
     pending_amount = total_scheduled - total_paid
     
     response_data = {
@@ -687,13 +579,21 @@ def get_payment_schedule(request):
             'total_paid': float(total_paid),
             'pending_amount': float(pending_amount),
             'completion_rate': float(total_paid / total_scheduled) if total_scheduled > 0 else 0,
-            'total_days': len(set(s.scheduled_date for s in schedules))
+            'total_days': totals['days']
         }
     }
+    if cursor or page_size:
+        response_data['next_cursor'] = next_cursor
     
     return Response(response_data)
 
 
+def _stream_schedules(schedules):
+    """Yield one NDJSON line per schedule without materializing the queryset"""
+    for schedule in schedules.iterator(chunk_size=1000):
+        yield json.dumps(PaymentScheduleSerializer(schedule).data, cls=JSONEncoder) + '\n'
+
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def mark_payment_completed(request, schedule_id):
@@ -722,20 +622,16 @@ def mark_payment_completed(request, schedule_id):
     plan.remaining_debt -= actual_amount
     plan.save()
     
-    # Create audit log
-    AuditLog.objects.create(
-        action="create",
-        entity_type="payment",
-        entity_id=schedule.id,
-        description=f"Payment completed for {plan.customer.name if plan.customer else plan.company.name}",
-        amount=actual_amount
-    )
+    journal.record(request.user, 'payment_made', schedule,
+                   f"Payment completed for {plan.customer.name if plan.customer else plan.company.name}",
+                   actual_amount)
     
     return Response(PaymentScheduleSerializer(schedule).data)
 
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@cached_response
 def payment_analytics(request):
     """
     Get analytics and insights about payment plans.
@@ -746,7 +642,7 @@ def payment_analytics(request):
     
     # Filter payment schedules by user - only show schedules for customers/companies owned by the current user
     user = request.user
-    queryset = PaymentSchedule.objects.filter(
+    queryset = archive.scope(PaymentSchedule, request).filter(
         models.Q(payment_plan__customer__user=user) | models.Q(payment_plan__company__user=user)
     )
     if start_date:
@@ -754,34 +650,48 @@ def payment_analytics(request):
     if end_date:
         queryset = queryset.filter(scheduled_date__lte=end_date)
     
-    # Calculate analytics
-    total_scheduled = sum(s.scheduled_amount for s in queryset)
-    total_paid = sum(s.actual_amount for s in queryset if s.is_paid)
+    # Calculate analytics in the database
+    paid = models.Q(is_paid=True)
+    totals = archive.aggregate(queryset,
+        scheduled=models.Sum('scheduled_amount'),
+        paid=models.Sum('actual_amount', filter=paid),
+    )
+    total_scheduled = totals['scheduled'] or Decimal('0')
+    total_paid = totals['paid'] or Decimal('0')
     pending_amount = total_scheduled - total_paid
     
-    # Payment completion rate by priority
+    # Payment completion rate by priority - one GROUP BY manual_priority
+    by_priority = archive.grouped(
+        queryset, 'payment_plan__manual_priority',
+        scheduled=models.Sum('scheduled_amount'),
+        paid=models.Sum('actual_amount', filter=paid),
+    )
     priority_stats = {}
     for priority in [1, 2, 3]:
-        priority_schedules = queryset.filter(payment_plan__manual_priority=priority)
-        priority_scheduled = sum(s.scheduled_amount for s in priority_schedules)
-        priority_paid = sum(s.actual_amount for s in priority_schedules if s.is_paid)
+        row = by_priority.get(priority, {})
+        priority_scheduled = row.get('scheduled') or Decimal('0')
+        priority_paid = row.get('paid') or Decimal('0')
         priority_stats[f'priority_{priority}'] = {
             'scheduled': float(priority_scheduled),
             'paid': float(priority_paid),
             'completion_rate': float(priority_paid / priority_scheduled) if priority_scheduled > 0 else 0
         }
     
-    # Daily utilization
+    # Daily utilization - one GROUP BY scheduled_date joined to the daily balances
     daily_balances = DailyBalance.objects.all()
     if start_date:
         daily_balances = daily_balances.filter(date__gte=start_date)
     if end_date:
         daily_balances = daily_balances.filter(date__lte=end_date)
     
+    scheduled_by_date = {
+        day: row['scheduled']
+        for day, row in archive.grouped(queryset, 'scheduled_date', scheduled=models.Sum('scheduled_amount')).items()
+    }
+    
     daily_utilization = []
     for balance in daily_balances:
-        day_schedules = queryset.filter(scheduled_date=balance.date)
-        day_scheduled = sum(s.scheduled_amount for s in day_schedules)
+        day_scheduled = scheduled_by_date.get(balance.date) or Decimal('0')
         utilization_rate = float(day_scheduled / balance.available_amount) if balance.available_amount > 0 else 0
         
         daily_utilization.append({
@@ -805,25 +715,58 @@ def payment_analytics(request):
     return Response(response_data)
 
 
-@api_view(['POST'])
+@api_view(['GET'])
 @permission_classes([IsAuthenticated])
-def update_all_reputations(request):
+def dashboard(request):
     """
-    Update reputation scores for all customers based on their payment behavior.
+    Dashboard figures for the current user from the materialized summary.
+    
+    Query params:
+        limit: Number of top customers/companies to return (default 5)
     """
-    customers = Customer.objects.filter(user=request.user)
-    updated_count = 0
+    try:
+        limit = min(int(request.query_params.get('limit', 5)), dashboard_summary.TOP_DEBTORS)
+    except ValueError:
+        return Response({'error': 'limit must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
     
-    for customer in customers:
-        customer.update_reputation()
-        updated_count += 1
+    summary = dashboard_summary.summary_for(request.user)
+    reputation_counts = {label: summary.reputation_counts.get(label, 0)
+                         for label, _ in Customer.REPUTATION_CHOICES}
     
     return Response({
-        'message': f'Updated reputation for {updated_count} customers',
-        'updated_count': updated_count
+        'total_receivables': summary.total_receivables,
+        'total_payables': summary.total_payables,
+        'shop_money': summary.shop_money,
+        'customer_count': summary.customer_count,
+        'company_count': summary.company_count,
+        'overdue_customers': dashboard_summary.overdue_count(summary.customer_due_dates),
+        'overdue_companies': dashboard_summary.overdue_count(summary.company_due_dates),
+        'reputation_distribution': reputation_counts,
+        'top_customers': summary.top_customers[:max(limit, 0)],
+        'top_companies': summary.top_companies[:max(limit, 0)],
+        'updated_at': summary.updated_at,
     })
 
 
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def update_all_reputations(request):
+    """
+    Queue a reputation update for all customers based on their payment behavior.
+    
+    Answers 202 with the job to poll at /api/jobs/<id>/.
+    """
+    return _job_accepted(request, jobs.enqueue(request.user, 'update-reputations'))
+
+
+def _job_accepted(request, job):
+    return Response({
+        'job_id': job.pk,
+        'status': job.status,
+        'status_url': request.build_absolute_uri(reverse('jobs-detail', args=[job.pk])),
+    }, status=status.HTTP_202_ACCEPTED)
+
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def update_customer_reputation(request, customer_id):
@@ -833,6 +776,7 @@ def update_customer_reputation(request, customer_id):
     try:
         customer = Customer.objects.get(id=customer_id, user=request.user)
         customer.update_reputation()
+        dashboard_summary.invalidate(request.user)
         
         return Response({
             'message': f'Updated reputation for {customer.name}',
@@ -853,17 +797,17 @@ def check_customer_credit(request, customer_id):
     """
     try:
         customer = Customer.objects.get(id=customer_id, user=request.user)
-        can_receive, reason = customer.can_receive_new_debt()
+        decision = credit.decide(customer)
         
         return Response({
             'customer_id': customer.id,
             'customer_name': customer.name,
-            'can_receive_new_debt': can_receive,
-            'reason': reason,
+            'can_receive_new_debt': decision.allowed,
+            'reason': decision.reason,
             'reputation': customer.reputation,
             'reputation_score': customer.reputation_score,
             'total_paid_30_days': customer.total_paid_30_days,
-            'current_debt': sum(d.amount for d in customer.debts.filter(is_settled=False))
+            'current_debt': decision.current_debt
         })
     except Customer.DoesNotExist:
         return Response({'error': 'Customer not found'}, status=status.HTTP_404_NOT_FOUND)
@@ -878,18 +822,25 @@ class CurrencyViewSet(viewsets.ReadOnlyModelViewSet):
     def get_queryset(self):
         return Currency.objects.filter(is_active=True).order_by('code')
 
+    @cached_response
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
 
-class EntityActivityViewSet(viewsets.ReadOnlyModelViewSet):
-    queryset = EntityActivity.objects.all()
+class EntityActivityViewSet(ExportMixin, viewsets.ReadOnlyModelViewSet):
+    """The event journal as the activity feed of customers and companies"""
+    queryset = Event.objects.all()
     serializer_class = EntityActivitySerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
+    export_name = 'activities'
+    export_fields = ('id', 'customer_id', 'company_id', 'kind', 'entity_type', 'entity_id', 'description',
+                     'amount', 'created_at')
 
     def get_queryset(self):
-        # Filter entity activities by user - only show activities for customers/companies owned by the current user
-        user = self.request.user
-        queryset = EntityActivity.objects.filter(
-            models.Q(customer__user=user) | models.Q(company__user=user)
-        ).order_by('-created_at')
+        # Events of the user's customers and companies
+        queryset = archive.scope(Event, self.request).filter(
+            models.Q(customer__isnull=False) | models.Q(company__isnull=False), user=self.request.user)
         
         customer_id = self.request.query_params.get('customer_id')
         company_id = self.request.query_params.get('company_id')
@@ -899,4 +850,19 @@ class EntityActivityViewSet(viewsets.ReadOnlyModelViewSet):
         if company_id:
             queryset = queryset.filter(company_id=company_id)
             
-        return queryset.order_by('-created_at')
+        return queryset.order_by('-created_at', '-id')
+
+
+class JobViewSet(viewsets.ReadOnlyModelViewSet):
+    """Status and result of the user's background jobs"""
+    queryset = Job.objects.all()
+    serializer_class = JobSerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
+
+    def get_queryset(self):
+        queryset = Job.objects.filter(user=self.request.user)
+        status_filter = self.request.query_params.get('status')
+        if status_filter:
+            queryset = queryset.filter(status=status_filter)
+        return queryset.order_by('-created_at', '-id')
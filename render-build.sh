@@ -5,8 +5,9 @@ set -o errexit
 # Install dependencies
 pip install -r requirements.txt
 
-# Run migrations
+# Run migrations and create the table behind CACHE_URL=db://cache_table
 python manage.py migrate
+python manage.py createcachetable
 
 # Collect static files
 python manage.py collectstatic --noinput
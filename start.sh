@@ -6,11 +6,19 @@ echo "Starting Django application..."
 # Install dependencies
 pip install -r requirements.txt
 
-# Run migrations
+# Every process below shares the cache through the database unless CACHE_URL says otherwise
+export CACHE_URL="${CACHE_URL:-db://cache_table}"
+
+# Run migrations and create the cache table
 python manage.py migrate --settings=backend.settings_production
+python manage.py createcachetable --settings=backend.settings_production
 
 # Collect static files
 python manage.py collectstatic --noinput --settings=backend.settings_production
 
+# Background jobs and the nightly reputation rollover run next to the web server
+python manage.py run_worker --processes 2 --settings=backend.settings_production &
+python manage.py run_scheduler --every 86400 --settings=backend.settings_production &
+
 # Start the application
 exec gunicorn backend.wsgi:application --bind 0.0.0.0:$PORT --settings=backend.settings_production